@@ -1,5 +1,12 @@
 import os
-from utils.test_runner import run_pytest
+import sys
+from sandbox.sandbox import get_sandbox_pool
+from utils.flaky import FlakyDetector, get_flaky_verdicts, quarantine, test_fingerprints
+from utils.mutation import MutationTester
+from utils.pytest_plugin import definition_name, definition_outcomes, summarize
+from utils.pytest_pool import get_pool
+from utils.sharding import DurationHistory, run_sharded
+from utils.tracing import traced
 
 
 class ExecutorAgent:
@@ -12,18 +19,133 @@ class ExecutorAgent:
         self.config = config
         self.llm = llm
         self.test_prefix = config.get("test_file_prefix", "generated_tests/unit_test")
+        # Duration history outlives the test file when the pipeline keeps it per module (state_prefix)
+        self.state_prefix = config.get("state_prefix") or self.test_prefix
+        # pytest_timeout bounds each pytest process; pytest_test_timeout each single test
+        self.timeout = float(config.get("pytest_timeout", 20))
+        self.test_timeout = float(config.get("pytest_test_timeout", 10)) or None
+        workers = int(config.get("pytest_workers", min(4, os.cpu_count() or 1)))
+        # Large suites are split into shards balanced by past per-test durations
+        self.shards = int(config.get("pytest_shards", workers))
+        self.min_shard_seconds = float(config.get("pytest_shard_seconds", 0.5))
+        # Line and branch coverage of the module under test, when its file is known
+        self.coverage_source = config.get("module_file") if config.get("coverage", True) else None
+        # Mutation testing of the final suite; its run records which tests execute each line
+        self.mutation = bool(config.get("mutation", True)) and bool(config.get("module_file"))
+        self.mutation_max_mutants = int(config.get("mutation_max_mutants", 100)) or None
+        self.mutation_workers = int(config.get("mutation_workers", workers))
+        # Flaky-test detection: reruns of the suite in shuffled order (0 turns it off)
+        self.flaky_runs = int(config.get("flaky_runs", 0))
+        self.flaky_workers = int(config.get("flaky_workers", workers))
+        self.flaky_action = config.get("flaky_action", "quarantine")
+        # Warm worker (or sandbox) pool shared by every ExecutorAgent in the process
+        self.pool = None
+        if config.get("sandbox", sys.platform.startswith("linux")):
+            # Sandboxes are single-use: keep spares so back-to-back runs never wait for one to start
+            self.pool = get_sandbox_pool(
+                size=int(config.get("sandbox_pool_size", 2 * workers)),
+                limits=config.get("sandbox_limits"),
+                namespaces=bool(config.get("sandbox_namespaces", True)),
+            )
+        elif config.get("pytest_pool", True):
+            self.pool = get_pool(
+                size=workers,
+                max_runs=int(config.get("pytest_worker_max_runs", 50)),
+            )
 
-    def __call__(self, test_code: str):
+    @traced("executor")
+    def __call__(self, test_code: str, max_failures: int | None = None):
+        test_file = self.write(test_code)
+        result = self.run(test_file, max_failures=max_failures, coverage_contexts=self.mutation)
+        return self.report(test_file, test_code, result)
+
+    def adopt(self, test_code: str, result):
+        """
+        Report of test_code from a run made elsewhere (e.g. a speculative candidate's
+        own file): written to the test file, but not run again.
+        """
+        return self.report(self.write(test_code), test_code, result)
+
+    def write(self, test_code: str) -> str:
         os.makedirs(os.path.dirname(self.test_prefix), exist_ok=True)
         test_file = f"{self.test_prefix}.py"
-
         with open(test_file, "w") as f:
             f.write(test_code)
+        return test_file
 
-        result = run_pytest(test_file)
-
+    @staticmethod
+    def report(test_file: str, test_code: str, result):
+        tests = result.get("tests", [])
         return {
             "test_file": test_file,
             "test_results": result,
             "test_code": test_code,
+            "failures": [t for t in tests if t["outcome"] in ("failed", "error")],
+            "slowest": sorted(tests, key=lambda t: t.get("duration", 0.0), reverse=True)[:5],
+            "coverage": result.get("coverage"),
         }
+
+    def run(self, test_file: str, record: bool = True, max_failures: int | None = None,
+            coverage_contexts: bool = False):
+        """
+        Run one test file, sharded when it is large enough; record=False leaves the duration history alone.
+        With max_failures, each shard stops once that many of its tests have failed.
+        """
+        return run_sharded(
+            test_file, self.shards, pool=self.pool, timeout=self.timeout, coverage_source=self.coverage_source,
+            test_timeout=self.test_timeout, history=DurationHistory.for_test_file(f"{self.state_prefix}.py") if record else None,
+            min_shard_seconds=self.min_shard_seconds, max_failures=max_failures, coverage_contexts=coverage_contexts,
+        )
+
+    def mutation_test(self, test_report, source_code: str):
+        """
+        Mutation report (see MutationTester.run) of the suite in test_report, or
+        None when mutation testing is off or no test passed.
+        """
+        results = test_report["test_results"]
+        if not self.mutation or not any(t["outcome"] == "passed" for t in results.get("tests", [])):
+            return None
+        tester = MutationTester(pool=self.pool, workers=self.mutation_workers, timeout=self.timeout,
+                                test_timeout=self.test_timeout, max_mutants=self.mutation_max_mutants)
+        module_name = os.path.splitext(os.path.basename(self.config["module_file"]))[0]
+        return tester.run(source_code, module_name, test_report["test_file"], results)
+
+    def stabilize(self, test_report, analysis=None, only_failing: bool = False):
+        """
+        Rerun the suite in test_report flaky_runs times in shuffled order (see
+        FlakyDetector) and set test_report["flaky"]; only_failing restricts the
+        check to the tests that failed. With flaky_action "quarantine", flaky
+        tests are marked skipped in the test file and test_code and count as
+        skipped in the results; with "flag" they are only reported.
+        Returns the report, or None when detection is off.
+        """
+        if not self.flaky_runs:
+            return None
+        results = test_report["test_results"]
+        observed = definition_outcomes(results.get("tests", []))
+        names = [name for name, outcome in observed.items()
+                 if outcome == "failed" or (outcome == "passed" and not only_failing)]
+        if not names:
+            return None
+        fingerprints = test_fingerprints(test_report["test_code"], (analysis or {}).get("units") or [])
+        detector = FlakyDetector(pool=self.pool, runs=self.flaky_runs, workers=self.flaky_workers,
+                                 timeout=self.timeout, test_timeout=self.test_timeout,
+                                 verdicts=get_flaky_verdicts(self.config))
+        report = detector.check(test_report["test_file"], fingerprints, observed, names)
+        report["action"] = self.flaky_action
+        test_report["flaky"] = report
+
+        flaky = report["flaky"]
+        if flaky and self.flaky_action == "quarantine":
+            test_code = quarantine(test_report["test_code"], flaky)
+            with open(test_report["test_file"], "w") as f:
+                f.write(test_code)
+            test_report["test_code"] = test_code
+            for test in results.get("tests", []):
+                name = definition_name(test["nodeid"])
+                if name in flaky:
+                    test.update(outcome="skipped", message=f"Quarantined as flaky: {flaky[name]}")
+            results["summary"] = summarize(results["tests"])
+            test_report["failures"] = [t for t in results["tests"] if t["outcome"] in ("failed", "error")]
+            results["passed"] = results["passed"] or not test_report["failures"]
+        return report
@@ -1,7 +1,19 @@
+from utils.prompt_builder import (
+    PRIORITY_FAILURES,
+    PRIORITY_SIGNATURES,
+    PRIORITY_TRACEBACKS,
+    PromptBuilder,
+    prompt_budget,
+)
+from utils.coverage_gaps import describe_coverage
+from utils.model_router import route
+from utils.tracing import traced
+
+
 class ReviewerAgent:
     """
     ReviewerAgent:
-    Evaluates test quality using LLM reasoning and pytest results.
+    Evaluates test quality using LLM reasoning and structured pytest results.
     """
 
     def __init__(self, config, llm):
@@ -9,6 +21,7 @@ class ReviewerAgent:
         self.llm = llm
         self.temperature = config.get("llm_temperature", 0.3)
 
+    @traced("reviewer")
     def __call__(self, test_report, analysis=None):
         analysis = analysis or {}
         test_output = test_report.get("test_results", {})
@@ -16,44 +29,92 @@ class ReviewerAgent:
         stdout = test_output.get("stdout", "")
         stderr = test_output.get("stderr", "")
         passed = test_output.get("passed", False)
+        tests = test_output.get("tests", [])
+        summary = test_output.get("summary", {})
+        failures = test_report.get("failures") or [t for t in tests if t["outcome"] in ("failed", "error")]
+        slowest = test_report.get("slowest") or []
+        coverage = test_report.get("coverage", test_output.get("coverage"))
+        mutation = test_report.get("mutation")
+        flaky = test_report.get("flaky")
 
         func_names = [f["name"] for f in analysis.get("functions", [])] if analysis else []
         func_summary = ", ".join(func_names) if func_names else "unknown functions"
 
-        prompt = f"""
-        You are a senior QA engineer reviewing automated test generation.
-        Analyze the following pytest output and generated test code.
-
-        === FUNCTIONS UNDER TEST ===
-        {func_summary}
-
-        === GENERATED TEST CODE ===
-        {test_code[:1200]}
-
-        === PYTEST OUTPUT ===
-        STDOUT:
-        {stdout[:1000]}
-        STDERR:
-        {stderr[:500]}
-
-        Provide:
-        1. A short summary of test performance
-        2. A score (0.0–1.0)
-        3. Clear, actionable recommendations for improvement
-        """
+        builder = PromptBuilder(prompt_budget(self.config, "reviewer"))
+        builder.text("""
+            You are a senior QA engineer reviewing automated test generation.
+            Analyze the following pytest results and generated test code.
+            """)
+        builder.text(func_summary, title="FUNCTIONS UNDER TEST", priority=PRIORITY_SIGNATURES, truncate="head")
+        builder.code("GENERATED TEST CODE", test_code)
+        if tests:
+            results = self.format_results(summary, failures, slowest, coverage, mutation, flaky)
+            builder.text(results, title="PYTEST RESULTS", priority=PRIORITY_FAILURES, truncate="head")
+        else:
+            # No per-test records (e.g. pytest never started): fall back to the tail of the raw output
+            builder.text(stdout, title="PYTEST STDOUT", priority=PRIORITY_FAILURES, truncate="tail")
+            builder.text(stderr, title="PYTEST STDERR", priority=PRIORITY_TRACEBACKS, truncate="tail")
+        builder.text("""
+            Provide:
+            1. A short summary of test performance
+            2. A score (0.0–1.0)
+            3. Clear, actionable recommendations for improvement
+            """)
+        prompt = builder.build()
 
         try:
-            response = self.llm.generate_content(prompt)
+            response = route(self.llm, "review").generate_content(prompt)
             review_text = response.text.strip()
         except Exception as e:
             review_text = f"⚠️ Review generation failed: {e}"
 
-        score = 0.9 if passed else 0.6
+        # Share of executed tests that passed; skipped tests don't count either way
+        executed = summary.get("total", 0) - summary.get("skipped", 0)
+        score = summary.get("passed", 0) / executed if executed else 0.0
+        # Passing tests that check nothing kill no mutants: weigh by the share they kill
+        if mutation and mutation.get("score") is not None:
+            score *= mutation["score"]
+        score = round(score, 3)
 
         return {
             "summary": review_text,
             "score": score,
             "passed": passed,
+            "results": summary,
+            "coverage": coverage,
+            "mutation": mutation,
+            "flaky": flaky,
+            "failures": [
+                {"nodeid": t["nodeid"], "outcome": t["outcome"], "location": t.get("location"),
+                 "message": t.get("message")}
+                for t in failures
+            ],
+            "slowest": [{"nodeid": t["nodeid"], "duration": t["duration"]} for t in slowest],
             "stdout_excerpt": stdout[:500],
             "stderr_excerpt": stderr[:300],
         }
+
+    @staticmethod
+    def format_results(summary, failures, slowest, coverage=None, mutation=None, flaky=None):
+        lines = [
+            f"{summary.get('passed', 0)} passed, {summary.get('failed', 0)} failed, "
+            f"{summary.get('error', 0)} errors, {summary.get('skipped', 0)} skipped "
+            f"in {summary.get('duration', 0.0):.2f}s",
+            describe_coverage(coverage),
+        ]
+        if mutation and mutation.get("mutants"):
+            lines.append(f"Mutation score: {mutation['score']:.0%} ({mutation['killed']}/{mutation['mutants']} "
+                         f"mutants killed, {mutation['no_coverage']} never executed by a test)")
+            for mutant in mutation["survivors"][:5]:
+                lines.append(f"- SURVIVED line {mutant['line']} ({mutant['operator']}): {mutant['description']}")
+        if flaky and flaky.get("flaky"):
+            verb = "quarantined" if flaky.get("action") == "quarantine" else "flagged"
+            for name, reason in sorted(flaky["flaky"].items())[:10]:
+                lines.append(f"- FLAKY ({verb}) {name}: {reason}")
+        for test in failures[:10]:
+            location = test.get("location") or {}
+            lines.append(f"- {test['outcome'].upper()} {test['nodeid']} "
+                         f"(line {location.get('line')}): {test.get('message')}")
+        if slowest:
+            lines.append("Slowest: " + ", ".join(f"{t['nodeid']} {t['duration']:.2f}s" for t in slowest[:3]))
+        return "\n".join(lines)
@@ -1,73 +1,753 @@
-from langgraph.graph import StateGraph, END
+import ast
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from agents.executor_agent import ExecutorAgent
+from utils.context_cache import cached_context
 from utils.lint_checker import check_code_style
-from utils.test_runner import run_pytest
+from utils.manifest import FingerprintManifest
+from utils.model_router import complexity, route
+from utils.coverage_gaps import format_gaps, uncovered_by_unit
+from utils.prompt_builder import (
+    PRIORITY_CONTEXT,
+    PRIORITY_EXAMPLES,
+    PRIORITY_FAILURES,
+    PRIORITY_SIGNATURES,
+    PRIORITY_TRACEBACKS,
+    PromptBuilder,
+    prompt_budget,
+    skeleton,
+)
+from utils.progress import emit, is_listening
+from utils.pytest_plugin import definition_name, definition_outcomes
+from utils.test_index import adapt_tests, get_test_index
+from utils.tracing import current_span, propagate, traced
+from utils.merging import (
+    collect_test_names, extract_tests, merge_test_modules, replace_definitions, source_segment, strip_code_fences,
+)
 
 
 class TestWriterAgent:
     """
     TestWriterAgent:
     Uses an LLM to generate pytest tests.
-    Automatically re-generates if lint/style checks fail.
+    Automatically re-generates if lint/style checks fail, repairs only the
+    failing test functions when the suite runs red, and once it is green asks
+    for more tests aimed at the lines and branches it leaves uncovered.
     """
 
     def __init__(self, config, llm):
         self.config = config
         self.llm = llm
         self.max_attempts = int(config.get("max_attempts", 3))
+        # Stop a run after this many failures when a repair round will follow (0 = run the whole suite)
+        self.fail_fast = int(config.get("fail_fast", 0)) or None
+        self.unit_concurrency = int(config.get("unit_concurrency", 4))
+        # Only units whose AST fingerprint changed get new tests when incremental is on
+        self.incremental = bool(config.get("incremental", True))
+        self.test_file = f"{config.get('test_file_prefix', 'generated_tests/unit_test')}.py"
+        # Accepted tests and their manifest, kept where the next run of the module finds them
+        self.state_file = f"{config.get('state_prefix') or os.path.splitext(self.test_file)[0]}.py"
+        self.executor = ExecutorAgent(config, llm)
+        # K > 1 races K candidate suites and keeps the first one that passes
+        self.candidates = max(1, int(config.get("candidates", 1)))
+        # Coverage loop: stop at the target, after coverage_rounds, or once a round gains too little per LLM call
+        self.coverage_target = float(config.get("coverage_target", 0.9)) * 100
+        self.coverage_rounds = int(config.get("coverage_rounds", 2)) if config.get("coverage", True) else 0
+        self.coverage_min_gain = float(config.get("coverage_min_gain", 1.0))
+        # Index of accepted tests from past runs: near-duplicates reuse them, close matches become examples
+        self.test_index = get_test_index(config)
+        self.reuse_threshold = float(config.get("test_index_reuse_threshold", 0.97))
+        self.example_threshold = float(config.get("test_index_example_threshold", 0.75))
+        self.example_count = int(config.get("test_index_examples", 2))
+        self.run_stats = {}
+        # Executor report of the final suite's last run, or None when the writer never ran it
+        self.test_report = None
 
-    def build_graph(self):
-        g = StateGraph()
-        g.add_node("generate", self.generate_tests)
-        g.add_node("check", self.check_tests)
-        g.add_node("run", self.run_tests)
+    def run_loop(self, state):
+        """
+        generate -> check (regenerate until the checks pass) -> run, then
+        repair -> run while the suite is red and attempts remain, and
+        cover -> run while it is green and coverage rounds still pay off.
+        Each step returns the state keys it changes; one that changes the suite
+        without running it sets test_report to None, and only then does the loop
+        run pytest. When max_attempts generations in a row fail the checks, the
+        loop stops with their issues.
+        """
+        if not self.generate_checked(state):
+            return state
+        if state.get("test_report") is None:
+            state.update(self.run_tests(state))
+        while True:
+            if self.should_repair(state):
+                repaired = self.repair_tests(state)
+                if repaired is None:
+                    # No failure tied to a single test: a fresh suite, checked like the first one
+                    regenerated = dict(state)
+                    if not self.generate_checked(regenerated):
+                        # Keep the suite that ran, and its results
+                        state["issues"] = regenerated["issues"]
+                        return state
+                    state = regenerated
+                else:
+                    state.update(repaired)
+            elif self.should_cover(state):
+                state.update(self.cover_tests(state))
+            else:
+                return state
+            if state.get("test_report") is None:
+                state.update(self.run_tests(state))
+
+    def generate_checked(self, state):
+        """
+        Generate a suite, regenerating until it passes the static checks, at most
+        max_attempts times (an LLM outage or a check's false positive would
+        otherwise regenerate forever). Returns whether the last suite passed.
+        """
+        for _ in range(max(1, self.max_attempts)):
+            generated = self.generate_tests(state)
+            state.update(generated)
+            if "passed" not in generated:
+                # Speculative candidates come back already checked
+                state.update(self.check_tests(state))
+            if state["passed"]:
+                return True
+        current_span().set(check_failures=max(1, self.max_attempts))
+        return False
+
+    def should_repair(self, res):
+        return not res["test_results"]["passed"] and res["attempt"] < self.max_attempts
 
-        g.add_edge("generate", "check")
-        g.add_edge("check", "generate", condition=lambda res: not res["passed"])
-        g.add_edge("check", "run", condition=lambda res: res["passed"])
-        g.add_edge("run", END)
-        return g
+    def should_cover(self, res):
+        coverage = res["test_results"].get("coverage")
+        if not coverage or not res["test_results"]["passed"] or res.get("coverage_round", 0) >= self.coverage_rounds:
+            return False
+        if coverage["percent"] >= self.coverage_target:
+            return False
+        if not coverage["missing_lines"] and not coverage["missing_branches"]:
+            return False
+        history = res.get("coverage_history") or []
+        if history and res.get("coverage_calls"):
+            # Gain of the last round per LLM call it took
+            return (coverage["percent"] - history[-1]) / res["coverage_calls"] >= self.coverage_min_gain
+        return True
 
+    @traced("writer")
     def __call__(self, source_code, analysis):
         """
         Orchestrates the generation-check-run flow.
         """
-        graph = self.build_graph()
-        state = {"source_code": source_code, "analysis": analysis}
-        result = graph.run(state)
+        result = self.run_loop({"source_code": source_code, "analysis": analysis})
+        report = result.get("test_report")
+        self.test_report = report if report is not None and report["test_code"] == result.get("test_code") else None
+        self.record_accepted_tests(result)
+        self.save_state(result)
+        # Red pytest runs and coverage rounds of the generate -> repair/cover loop, for the run history
+        self.run_stats = {
+            "attempts": result.get("attempt", 0),
+            "coverage_rounds": result.get("coverage_round", 0),
+            # Static-check issues the loop gave up on (empty when the last suite passed them)
+            "check_issues": result.get("issues") or [],
+        }
         return result.get("test_code")
 
-    # === LangGraph nodes ===
+    def save_state(self, result):
+        """
+        Keep the final suite as the file the next run reuses tests from, and record
+        in the manifest which of its tests belong to each unit. Only units whose
+        tests all passed in the final run are recorded as reusable.
+        """
+        if not self.incremental or not result.get("passed") or not result.get("test_code"):
+            return  # off, or the static checks rejected the suite: keep the previous state
+        if os.path.abspath(self.state_file) != os.path.abspath(self.test_file):
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            temporary = f"{self.state_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(result["test_code"])
+            os.replace(temporary, self.state_file)
+
+        units = result["analysis"].get("units") or []
+        if not units or "test_results" not in result:
+            return
+        present = set(collect_test_names(result["test_code"]))
+        outcomes = definition_outcomes(result["test_results"].get("tests", []))
+        manifest = FingerprintManifest.for_test_file(self.state_file)
+        for unit in units:
+            names = [name for name in (result.get("names_by_unit") or {}).get(unit["name"], []) if name in present]
+            # A unit with no tests, or with any failing (or quarantined) one, is regenerated next time
+            manifest.record(unit, names if names and all(outcomes.get(name) == "passed" for name in names) else [])
+        manifest.prune([unit["name"] for unit in units])
+        manifest.save()
+
+    # === Loop steps ===
+    @traced("writer.generate")
     def generate_tests(self, state):
+        if self.candidates > 1:
+            return self.generate_speculative(state)
+        return dict(self.compose_tests(state), test_report=None)
+
+    def compose_tests(self, state, temperature: float | None = None, stop: threading.Event | None = None):
+        """
+        Generate tests one unit at a time, in parallel, and merge them into one file.
+        Falls back to a single prompt for modules without functions or classes.
+        Once `stop` is set, units not yet sent to the LLM are skipped and the
+        result is marked "cancelled".
+        """
         source_code = state["source_code"]
         analysis = state["analysis"]
+        units = analysis.get("units") or []
+
+        if not units:
+            test_code, routed = self.write_unit(state, source_code, temperature=temperature)
+            return {"test_code": test_code, "routed": [dict(routed, tests=collect_test_names(test_code))]}
+
+        manifest = FingerprintManifest.for_test_file(self.state_file) if self.incremental else None
+        reused = self.reuse_unchanged_tests(units, manifest)
+        # Units covered by the analyzer's offline baseline tests never reach the LLM
+        baseline = {unit["name"]: unit["baseline"] for unit in units
+                    if unit.get("baseline") and unit["name"] not in reused}
+        pending = [unit for unit in units if unit["name"] not in reused and unit["name"] not in baseline]
+
+        # Near-duplicates of indexed units take their adapted tests; the rest get the closest as examples
+        indexed, examples = {}, {}
+        for unit in pending:
+            kind, found = self.similar_tests(unit)
+            if kind == "reuse":
+                indexed[unit["name"]] = found
+            elif found:
+                examples[unit["name"]] = found
+        pending = [unit for unit in pending if unit["name"] not in indexed]
+        current_span().set(units=len(units), reused_units=len(reused), baseline_units=len(baseline),
+                           indexed_units=len(indexed), example_units=len(examples))
 
-        prompt = f"""
-        You are a Python testing assistant.
-        Generate clean, minimal pytest tests for the following code.
-        Use only pytest (no unittest), and focus on key behaviors.
+        def write(unit):
+            if stop is not None and stop.is_set():
+                return None
+            return self.write_unit(state, unit["source"], unit["name"], temperature, examples.get(unit["name"]),
+                                   unit.get("baseline_example"))
 
-        === SOURCE ANALYSIS ===
-        {analysis['summary']}
+        with ThreadPoolExecutor(max_workers=self.unit_concurrency) as pool:
+            written = dict(zip([unit["name"] for unit in pending], pool.map(propagate(write), pending)))
+        if stop is not None and stop.is_set():
+            return {"test_code": "", "cancelled": True, "routed": []}
+        outputs = {name: tests for name, (tests, _) in written.items()}
 
-        === SOURCE CODE ===
-        {source_code[:2000]}
+        chunks = [(unit["name"], reused.get(unit["name"]) or baseline.get(unit["name"])
+                   or indexed.get(unit["name"]) or outputs[unit["name"]])
+                  for unit in units]
+        names_by_unit = {}
+        generated_code = merge_test_modules(chunks, names_by_label=names_by_unit)
 
-        === OUTPUT FORMAT ===
-        Only provide valid Python test code using pytest.
+        return {"test_code": generated_code, "reused_units": sorted(reused), "baseline_units": sorted(baseline),
+                "indexed_units": sorted(indexed), "names_by_unit": names_by_unit,
+                "routed": [dict(routed, tests=names_by_unit.get(name, [])) for name, (_, routed) in written.items()]}
+
+    def generate_speculative(self, state):
+        """
+        Request several candidate suites at once (at different temperatures), lint and
+        run each as soon as it arrives, and keep the first fully passing one, or the one
+        with the most passing tests. The others stop before their next unit's LLM call;
+        calls already in flight finish in the background, and their suites are never
+        executed. The winner's checks and pytest run stand as the suite's own. A
+        candidate that raises is skipped; when all do, one suite is composed as usual.
         """
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.candidates)
+        futures = [
+            pool.submit(propagate(self.evaluate_candidate), index, temperature, state, stop)
+            for index, temperature in enumerate(self.candidate_temperatures())
+        ]
 
+        best, errors = None, 0
         try:
-            response = self.llm.generate_content(prompt)
-            generated_code = response.text.strip()
+            for future in as_completed(futures):
+                try:
+                    candidate = future.result()
+                except Exception:
+                    # A candidate whose executor, sandbox or file failed ranks below every other
+                    errors += 1
+                    continue
+                if best is None or self.candidate_rank(candidate) > self.candidate_rank(best):
+                    best = candidate
+                if candidate["test_results"].get("passed"):
+                    break
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        current_span().set(candidate_errors=errors)
+        if best is None:
+            # Every candidate failed: one plain suite, run by the loop like any other
+            return dict(self.compose_tests(state), test_report=None)
+
+        generated = {
+            "test_code": best["test_code"],
+            "passed": best["passed"],
+            "issues": best["issues"],
+            "names_by_unit": best["names_by_unit"],
+            "baseline_units": best["baseline_units"],
+            "indexed_units": best["indexed_units"],
+            "candidate": {"index": best["index"], "temperature": best["temperature"],
+                          "summary": best["test_results"].get("summary")},
+            "test_report": None,
+        }
+        if not best["passed"]:
+            return dict(generated, routed=best["routed"])
+        # Only the winner's suite ran for real, so only its models learn from the outcome
+        report = self.executor.adopt(best["test_code"], best["test_results"])
+        return dict(generated, **self.take_report(dict(state, routed=best["routed"]), report))
+
+    def candidate_temperatures(self):
+        """Spread candidates from the configured temperature up to 1.0 unless given explicitly."""
+        temperatures = self.config.get("candidate_temperatures")
+        if temperatures:
+            return [float(t) for t in temperatures][:self.candidates]
+        base = float(self.config.get("temperature", 0.3))
+        top = max(base, 1.0)
+        return [round(base + (top - base) * i / (self.candidates - 1), 2) for i in range(self.candidates)]
+
+    @staticmethod
+    def candidate_rank(candidate):
+        summary = candidate["test_results"].get("summary") or {}
+        return (bool(candidate["test_results"].get("passed")), summary.get("passed", 0), -summary.get("failed", 0))
+
+    def evaluate_candidate(self, index, temperature, state, stop):
+        composed = self.compose_tests(state, temperature=temperature, stop=stop)
+        candidate = {
+            "index": index,
+            "temperature": temperature,
+            "test_code": composed["test_code"],
+            "routed": composed.get("routed", []),
+            "names_by_unit": composed.get("names_by_unit", {}),
+            "baseline_units": composed.get("baseline_units", []),
+            "indexed_units": composed.get("indexed_units", []),
+            "passed": False,
+            "issues": [],
+            "test_results": {"passed": False},
+        }
+
+        if composed.get("cancelled"):
+            return candidate
+        candidate["passed"], candidate["issues"] = self.validate(candidate["test_code"], state)
+        if not candidate["passed"] or stop.is_set():
+            return candidate
+
+        # Each candidate gets its own file next to the module so they can run side by side
+        candidate_file = f"{os.path.splitext(self.test_file)[0]}_candidate{index}.py"
+        with open(candidate_file, "w", encoding="utf-8") as f:
+            f.write(candidate["test_code"])
+        try:
+            # With the main run's coverage contexts, since the winner's run stands in for it
+            candidate["test_results"] = self.executor.run(candidate_file, record=False,
+                                                          coverage_contexts=self.executor.mutation)
+        finally:
+            os.remove(candidate_file)
+        return candidate
+
+    def reuse_unchanged_tests(self, units, manifest):
+        """Pull tests for units whose fingerprint is unchanged out of the last accepted test file."""
+        if manifest is None or not os.path.exists(self.state_file):
+            return {}
+
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            existing_code = f.read()
+
+        reused = {}
+        for unit in units:
+            names = manifest.reusable_tests(unit)
+            chunk = extract_tests(existing_code, names) if names else None
+            if chunk is not None:
+                reused[unit["name"]] = chunk
+        return reused
+
+    def similar_tests(self, unit):
+        """
+        ("reuse", adapted tests) when an indexed unit is a near-duplicate of this one,
+        else ("examples", [matching items]) for the few-shot section (possibly empty).
+        """
+        if self.test_index is None:
+            return "examples", []
+        module_name = self.config.get("module_name", "module_under_test")
+        try:
+            matches = self.test_index.query(unit["source"], k=max(1, self.example_count))
         except Exception as e:
-            generated_code = f"# Error generating tests: {e}"
+            print(f"⚠️ Test index lookup failed: {e}")
+            return "examples", []
+
+        if matches and matches[0][0] >= self.reuse_threshold:
+            item = matches[0][1]
+            try:
+                return "reuse", adapt_tests(item["tests"], item["name"], unit["name"],
+                                            item["module_name"], module_name)
+            except SyntaxError:
+                pass
+        return "examples", [item for similarity, item in matches if similarity >= self.example_threshold]
+
+    def record_accepted_tests(self, result):
+        """Index the tests of every unit whose tests all passed in the final run (LLM-written ones only)."""
+        units = result.get("analysis", {}).get("units") or []
+        names_by_unit = result.get("names_by_unit") or {}
+        if self.test_index is None or not units or not names_by_unit or "test_results" not in result:
+            return
+
+        outcomes = definition_outcomes(result["test_results"].get("tests", []))
+        skip = set(result.get("baseline_units") or []) | set(result.get("indexed_units") or [])
+        module_name = self.config.get("module_name", "module_under_test")
+
+        recorded = 0
+        for unit in units:
+            names = names_by_unit.get(unit["name"])
+            if unit["name"] in skip or not names or not all(outcomes.get(name) == "passed" for name in names):
+                continue
+            tests = extract_tests(result["test_code"], names)
+            if tests:
+                self.test_index.add(unit["source"], tests, unit["name"], module_name)
+                recorded += 1
+        if recorded:
+            self.test_index.save()
+        current_span().set(indexed=recorded)
 
-        return {"test_code": generated_code}
+    def write_unit(self, state, code: str, target: str | None = None, temperature: float | None = None,
+                   examples=None, baseline=None):
+        """
+        Generate one unit's tests on the model routed to for its complexity; a failed
+        run (or failed static checks) moves the unit one model up. Returns the tests
+        and a record of which model wrote them, to learn from once they have run.
+        """
+        bucket = complexity(code)
+        escalation = state.get("attempt", 0) + bool(state.get("issues"))
+        llm = route(self.llm, "generate", bucket, escalation)
+        start = time.perf_counter()
+        tests = self.generate_unit_tests(code, state["analysis"], target, temperature, state.get("issues"), examples,
+                                         self.module_context(state, code, llm), llm, baseline)
+        return tests, {"unit": target or "<module>", "complexity": bucket, "model": getattr(llm, "model", None),
+                       "attempt": state.get("attempt", 0), "latency_s": round(time.perf_counter() - start, 4)}
+
+    def generate_unit_tests(self, code: str, analysis: dict, target: str | None = None,
+                            temperature: float | None = None, issues=None, examples=None, context=None, llm=None,
+                            baseline=None):
+        module_name = self.config.get("module_name", "module_under_test")
+        code_ref = "the module source above" if context is not None else "the following code"
+        focus = f"`{target}` in {code_ref}" if target else code_ref
 
+        builder = PromptBuilder(prompt_budget(self.config, "writer"))
+        builder.text(f"""
+            You are a Python testing assistant.
+            Generate clean, minimal pytest tests for {focus}.
+            Use only pytest (no unittest), and focus on key behaviors.
+            """)
+        builder.text(analysis["summary"], title="SOURCE ANALYSIS", priority=PRIORITY_CONTEXT, truncate="head")
+        if context is None:
+            builder.code("SOURCE CODE", code)
+        # Accepted tests of similar code from past runs, dropped first when the budget is tight
+        for item in examples or []:
+            builder.text(f"{item['source']}\n\n# Tests that passed for it:\n{item['tests']}",
+                         title="SIMILAR TESTED CODE", priority=PRIORITY_EXAMPLES, truncate="head")
+        # Offline tests that run the unit but check too little on their own: a starting point to extend
+        if baseline:
+            builder.text(baseline, title="BASELINE TESTS (EXTEND WITH REAL ASSERTIONS)", priority=PRIORITY_EXAMPLES,
+                         truncate="head")
+        builder.text(f"""
+            Only provide valid Python test code using pytest.
+            Import the code under test from the `{module_name}` module; do not redefine it.
+            """, title="OUTPUT FORMAT")
+        # Static-validation findings from the previous attempt, so the retry can avoid them
+        if issues:
+            builder.text("\n".join(issues), title="ISSUES IN THE PREVIOUS ATTEMPT", priority=PRIORITY_FAILURES,
+                         truncate="head")
+        prompt = builder.build()
+
+        kwargs = {} if temperature is None else {"generation_config": {"temperature": temperature}}
+        if context is not None:
+            kwargs["context"] = context
+        if is_listening():
+            # Stream the tests to whoever is watching (e.g. the UI) as they are written
+            kwargs["on_chunk"] = lambda text: emit("llm.chunk", unit=target, text=text)
+        try:
+            response = (llm or self.llm).generate_content(prompt, **kwargs)
+            return strip_code_fences(response.text)
+        except Exception as e:
+            return f"# Error generating tests: {e}"
+
+    @traced("writer.check")
     def check_tests(self, state):
-        ok, issues = check_code_style(state["test_code"])
+        ok, issues = self.validate(state["test_code"], state)
+        current_span().set(passed=ok, issues=len(issues))
         return {"passed": ok, "issues": issues, "test_code": state["test_code"]}
 
+    def validate(self, test_code, state):
+        """Static checks against the analyzer's symbols; rejects bad generations before pytest."""
+        return check_code_style(test_code, state["analysis"], self.config.get("module_name", "module_under_test"))
+
+    @traced("writer.run")
     def run_tests(self, state):
-        result = run_pytest(state["test_code"])
-        return {"test_code": state["test_code"], "test_results": result}
+        # Attempts count red runs; a red run with repairs left only needs enough failures to start repairing
+        attempt = state.get("attempt", 0) + 1
+        fail_fast = self.fail_fast if attempt < self.max_attempts else None
+        emit("pytest", attempt=attempt, fail_fast=fail_fast)
+        return self.take_report(state, self.executor(state["test_code"], max_failures=fail_fast))
+
+    def take_report(self, state, report):
+        """
+        State keys for a pytest run of the suite, wherever it ran. Only a red run
+        counts as an attempt, so green coverage runs neither use up max_attempts
+        nor move later units to bigger models.
+        """
+        if not report["test_results"].get("passed"):
+            # A test that fails only some of the time is quarantined rather than repaired
+            self.executor.stabilize(report, state["analysis"], only_failing=True)
+        self.record_routing(state.get("routed") or [], report["test_results"].get("tests", []))
+        return {
+            "test_code": report["test_code"],
+            "test_results": report["test_results"],
+            "test_report": report,
+            "attempt": state.get("attempt", 0) + (not report["test_results"].get("passed")),
+            "routed": [],
+        }
+
+    def record_routing(self, routed, tests):
+        """Tell the model router whether the tests each routed model wrote have passed."""
+        record = getattr(self.llm, "record_outcomes", None)
+        if record is None or not routed:
+            return
+        ran, failing = set(), set()
+        for test in tests:
+            name = definition_name(test["nodeid"])
+            ran.add(name)
+            if test["outcome"] in ("failed", "error"):
+                failing.add(name)
+        outcomes = []
+        for entry in routed:
+            # Units whose tests didn't all run (fail-fast, or none were written) teach nothing
+            if None in failing or (entry["tests"] and set(entry["tests"]) <= ran):
+                passed = None not in failing and not set(entry["tests"]) & failing
+                outcomes.append({key: entry[key] for key in ("unit", "complexity", "model", "attempt", "latency_s")}
+                                | {"passed": passed})
+        record(outcomes, self.config.get("run_id"), self.config.get("module_name"))
+
+    @traced("writer.repair")
+    def repair_tests(self, state):
+        """
+        Send only the failing test functions, with their tracebacks and the source
+        units they exercise, back to the LLM (one call per test, in parallel) and
+        patch the fixed definitions into the file.
+        Returns None when a failure can't be tied to a test function, or no fix
+        came back usable, for the loop to regenerate the whole suite instead.
+        """
+        test_code = state["test_code"]
+        failures = [t for t in state["test_results"].get("tests", []) if t["outcome"] in ("failed", "error")]
+
+        try:
+            tree = ast.parse(test_code)
+        except SyntaxError:
+            return None
+
+        lines = test_code.splitlines()
+        definitions = {
+            node.name: node for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        }
+
+        targets = {}
+        for failure in failures:
+            name = definition_name(failure["nodeid"])
+            if name not in definitions:
+                # Collection/import errors: there is no single test to repair
+                return None
+            targets.setdefault(name, []).append(failure)
+        if not targets:
+            # Red run without per-test failures (e.g. a timeout)
+            return None
+
+        routed = []
+        with ThreadPoolExecutor(max_workers=self.unit_concurrency) as pool:
+            fixes = list(pool.map(
+                propagate(lambda item: self.repair_test(
+                    item[0], source_segment(lines, definitions[item[0]]), item[1], state, set(definitions), routed
+                )),
+                targets.items(),
+            ))
+
+        replacements, imports = {}, []
+        for fixed_definitions, fixed_imports in filter(None, fixes):
+            replacements.update(fixed_definitions)
+            imports.extend(fixed_imports)
+
+        if not replacements:
+            # Rerunning the unchanged suite would only repeat the same failures
+            return None
+        return {"test_code": replace_definitions(test_code, replacements, imports), "repaired": sorted(replacements),
+                "routed": [entry for entry in routed if entry["tests"][0] in replacements], "test_report": None}
+
+    @traced("writer.cover")
+    def cover_tests(self, state):
+        """
+        Ask for tests aimed only at the lines and branches the green suite leaves
+        uncovered (one call per unit with gaps, in parallel). New tests that fail
+        are dropped, so a coverage round never turns the suite red. The merged suite's
+        run is the round's test report, unless dropping tests changed the suite.
+        """
+        test_code = state["test_code"]
+        coverage = state["test_results"]["coverage"]
+        gaps = uncovered_by_unit(state["source_code"], coverage)
+        units = {unit["name"]: unit for unit in state["analysis"].get("units") or []}
+        targets = [name for name in gaps if name in units]
+        current_span().set(coverage=coverage["percent"], units=len(targets))
+
+        progress = {
+            "coverage_history": (state.get("coverage_history") or []) + [coverage["percent"]],
+            # Gaps only in module-level code: nothing a unit prompt can target, so stop here
+            "coverage_round": state.get("coverage_round", 0) + 1 if targets else self.coverage_rounds,
+            "coverage_calls": len(targets),
+            "test_code": test_code,
+        }
+        if not targets:
+            return progress
+
+        existing = collect_test_names(test_code)
+        cover = propagate(lambda name: self.cover_unit(name, units[name]["source"], gaps[name], state, existing))
+        with ThreadPoolExecutor(max_workers=self.unit_concurrency) as pool:
+            chunks = [(name, code) for name, code in zip(targets, pool.map(cover, targets)) if code]
+        if not chunks:
+            return progress
+
+        added = {}
+        merged = merge_test_modules([("existing", test_code)] + chunks, names_by_label=added)
+        if not self.validate(merged, state)[0]:
+            return progress
+
+        report = self.executor(merged)
+        failing = {definition_name(t["nodeid"]) for t in report["failures"]}
+        if None in failing or failing & set(existing):
+            return progress  # collection errors, or the additions broke existing tests
+        # The new tests belong to the unit they were written for, for the manifest
+        names_by_unit = {unit: list(names) for unit, names in (state.get("names_by_unit") or {}).items()}
+        for name, _ in chunks:
+            names = names_by_unit.setdefault(name, [])
+            names.extend(n for n in added.get(name, []) if n not in failing and n not in names)
+        if not failing:
+            return dict(progress, names_by_unit=names_by_unit, **self.take_report(state, report))
+        kept = extract_tests(merged, [name for name in collect_test_names(merged) if name not in failing])
+        merged = merge_test_modules([("covered", kept)]) if kept else None
+        return dict(progress, test_code=merged or test_code, names_by_unit=names_by_unit, test_report=None)
+
+    def cover_unit(self, name, unit_source, gaps, state, existing_names):
+        module_name = self.config.get("module_name", "module_under_test")
+        builder = PromptBuilder(prompt_budget(self.config, "writer"))
+        builder.text(f"""
+            You are a Python testing assistant.
+            The pytest suite for `{name}` from the `{module_name}` module never executes the
+            lines and branches listed below. Write additional pytest tests that do.
+            """)
+        builder.text(format_gaps(state["source_code"], gaps), title="UNCOVERED LINES AND BRANCHES",
+                     priority=PRIORITY_SIGNATURES, truncate="head")
+        llm = route(self.llm, "generate", complexity(unit_source))
+        context = self.module_context(state, skeleton(unit_source), llm)
+        if context is None:
+            builder.code("SIGNATURES", unit_source, signature_priority=PRIORITY_CONTEXT, body_priority=None)
+        builder.text(", ".join(existing_names), title="EXISTING TESTS (DO NOT REPEAT)",
+                     priority=PRIORITY_TRACEBACKS, truncate="head")
+        builder.text(f"""
+            Only provide the new test functions (and the imports they need) as valid Python using pytest.
+            Import the code under test from the `{module_name}` module; do not redefine it.
+            """, title="OUTPUT FORMAT")
+
+        try:
+            return strip_code_fences(self.complete(builder.build(), context, llm))
+        except Exception:
+            return None
+
+    def module_context(self, state, inline: str, llm=None):
+        """
+        The whole module registered as a provider-cached prompt prefix on llm (a
+        cached prefix belongs to one model), in place of the `inline` source a
+        prompt would otherwise carry; None to inline it.
+        """
+        return cached_context(llm or self.llm, state["source_code"],
+                              self.config.get("module_name", "module_under_test"), inline)
+
+    def complete(self, prompt: str, context=None, llm=None) -> str:
+        llm = llm or self.llm
+        if context is not None:
+            return llm.generate_content(prompt, context=context).text
+        return llm.generate_content(prompt).text
+
+    def repair_test(self, name, test_source, failures, state, known_names, routed=None):
+        # Failing assertions first; traceback tails only as far as the budget allows
+        builder = PromptBuilder(prompt_budget(self.config, "writer"))
+        builder.text(f"""
+            You are a Python testing assistant.
+            The pytest test `{name}` below is failing. Fix the test so that it correctly
+            checks the behaviour of the code under test; do not change the code under test.
+            """)
+        builder.text(test_source, title="FAILING TEST")
+        builder.text("\n".join(f"{f['nodeid']} ({f['outcome']}): {f.get('message')}" for f in failures),
+                     title="FAILURE", priority=PRIORITY_FAILURES, truncate="head")
+        builder.text("\n\n".join(f["traceback"] for f in failures if f.get("traceback")),
+                     title="TRACEBACK", priority=PRIORITY_TRACEBACKS, truncate="tail")
+        relevant = self.relevant_source(test_source, state)
+        # Repairs follow a failed run, so they go at least one model above where the test's unit started
+        owner = self.owning_unit(name, test_source, state)
+        units = {unit["name"]: unit["source"] for unit in state["analysis"].get("units") or []}
+        bucket = complexity(units.get(owner, relevant))
+        llm = route(self.llm, "generate", bucket, state.get("attempt", 1))
+        context = self.module_context(state, relevant, llm)
+        if context is None:
+            builder.code("SOURCE CODE", relevant)
+        builder.text(f"""
+            Only return the corrected `{name}` (plus any fixtures or imports it needs) as valid Python.
+            """, title="OUTPUT FORMAT")
+        prompt = builder.build()
+
+        start = time.perf_counter()
+        try:
+            fixed_code = strip_code_fences(self.complete(prompt, context, llm))
+            tree = ast.parse(fixed_code)
+        except Exception:
+            return None
+        if routed is not None:
+            routed.append({"unit": owner or "<module>", "complexity": bucket, "model": getattr(llm, "model", None),
+                           "attempt": state.get("attempt", 1), "latency_s": round(time.perf_counter() - start, 4),
+                           "tests": [name]})
+
+        lines = fixed_code.splitlines()
+        fixed_definitions = {
+            node.name: source_segment(lines, node) for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name in known_names
+        }
+        if name not in fixed_definitions:
+            return None
+        fixed_imports = [
+            source_segment(lines, node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+        ]
+        return fixed_definitions, fixed_imports
+
+    def owning_unit(self, name, test_source, state):
+        """
+        The analyzed unit a test was written for: from this run's names_by_unit, else
+        the manifest of earlier runs, else the first unit the test references.
+        """
+        owner = next((unit for unit, names in (state.get("names_by_unit") or {}).items() if name in names), None)
+        if owner is None and self.incremental:
+            manifest = FingerprintManifest.for_test_file(self.state_file)
+            owner = next((unit for unit, entry in manifest.units.items() if name in entry.get("tests", [])), None)
+        units = [unit["name"] for unit in state["analysis"].get("units") or []]
+        if owner is None or owner not in units:
+            tree = ast.parse(test_source)
+            used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+            used |= {n.attr for n in ast.walk(tree) if isinstance(n, ast.Attribute)}
+            owner = next((unit for unit in units if unit in used), None)
+        return owner
+
+    @staticmethod
+    def relevant_source(test_source: str, state):
+        """Source of the units a test references, falling back to the module summary."""
+        units = state["analysis"].get("units") or []
+        if not units:
+            return state["source_code"]
+
+        tree = ast.parse(test_source)
+        used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+        used |= {n.attr for n in ast.walk(tree) if isinstance(n, ast.Attribute)}
+        matched = [unit["source"] for unit in units if unit["name"] in used]
+        return "\n\n\n".join(matched) if matched else state["analysis"]["summary"]
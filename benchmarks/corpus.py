@@ -0,0 +1,65 @@
+import random
+from utils.examples import example_dijkstra
+
+FUNCTION_TEMPLATES = [
+    '''def {name}(a: int, b: int) -> int:
+    """Combine two integers."""
+    if a > b:
+        return a - b
+    return a + b * {k}
+''',
+    '''def {name}(values: list) -> float:
+    """Average of the non-negative values."""
+    kept = [v for v in values if v >= 0]
+    if not kept:
+        raise ValueError("no non-negative values")
+    return sum(kept) / len(kept)
+''',
+    '''def {name}(text: str) -> str:
+    """Normalise whitespace and case."""
+    words = text.split()
+    return " ".join(w.lower() for w in words[:{k}])
+''',
+    '''def {name}(n: int) -> list:
+    """First n multiples of {k}."""
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    return [i * {k} for i in range(n)]
+''',
+]
+
+CLASS_TEMPLATE = '''class {name}:
+    """Bounded counter."""
+
+    def __init__(self, limit: int = {k}):
+        self.limit = limit
+        self.value = 0
+
+    def increment(self, step: int = 1) -> int:
+        if self.value + step > self.limit:
+            raise OverflowError("limit reached")
+        self.value += step
+        return self.value
+
+    def reset(self):
+        self.value = 0
+'''
+
+
+def synthetic_module(functions: int, seed: int = 0) -> str:
+    """A deterministic module with roughly `functions` small functions and a class per ten."""
+    rng = random.Random(seed)
+    parts = ["import math", ""]
+    for index in range(functions):
+        template = FUNCTION_TEMPLATES[index % len(FUNCTION_TEMPLATES)]
+        parts.append(template.format(name=f"func_{index}", k=rng.randint(2, 9)))
+        if index % 10 == 9:
+            parts.append(CLASS_TEMPLATE.format(name=f"Counter{index // 10}", k=rng.randint(5, 50)))
+    return "\n\n".join(parts)
+
+
+def default_corpus(sizes=(10, 50, 200)):
+    """(module_name, source) pairs: the Dijkstra example followed by synthetic modules of growing size."""
+    corpus = [("example_dijkstra", example_dijkstra)]
+    corpus.extend((f"synthetic_{size}", synthetic_module(size, seed=size)) for size in sizes)
+    return corpus
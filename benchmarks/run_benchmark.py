@@ -0,0 +1,155 @@
+"""
+End-to-end benchmark: runs a corpus of modules through CrewWorkflow with a
+deterministic stub LLM and reports per-stage wall time, throughput, peak RSS
+and LLM call counts.
+
+    python -m benchmarks.run_benchmark --latency 0.2 --sizes 10 50 200
+    python -m benchmarks.run_benchmark --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.corpus import default_corpus
+from benchmarks.stub_llm import StubLLM
+from crew_workflow.workflow import CrewWorkflow
+
+STAGES = ("analyze", "generate", "execute", "stabilize", "mutate", "review")
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident set size of this process and of its (reaped) children, in MB."""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(config: dict, sizes=(10, 50, 200), latency: float = 0.0, jitter: float = 0.0):
+    llm = StubLLM(latency=latency, jitter=jitter)
+    workflow = CrewWorkflow(config, llm=llm)
+    modules = []
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="pytestcrew-bench-") as workdir:
+        for module_name, source in default_corpus(sizes):
+            llm.reset()
+            start = time.perf_counter()
+            result = workflow.run_pipeline(source, module_name, os.path.join(workdir, module_name))
+            summary = result["test_results"].get("summary", {})
+            modules.append({
+                "module": module_name,
+                "lines": source.count("\n") + 1,
+                "units": len(result["analysis"].get("units", [])),
+                "wall": round(time.perf_counter() - start, 4),
+                "stages": {stage: round(result["timings"].get(stage, 0.0), 4) for stage in STAGES},
+                "tests": summary.get("total", 0),
+                "passed": summary.get("passed", 0),
+                "llm": llm.stats(),
+            })
+    total = time.perf_counter() - started
+
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "latency": latency,
+        "sizes": list(sizes),
+        "total_wall": round(total, 4),
+        "modules_per_min": round(len(modules) / total * 60, 2) if total else 0.0,
+        "stages": {stage: round(sum(m["stages"][stage] for m in modules), 4) for stage in STAGES},
+        "llm_calls": sum(m["llm"]["calls"] for m in modules),
+        "peak_rss_mb": peak_rss_mb(),
+        "modules": modules,
+    }
+
+
+def save_results(results: dict, output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    name = results["revision"] or results["timestamp"].replace(":", "")
+    path = os.path.join(output_dir, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def _delta(current, previous) -> str:
+    if not previous:
+        return ""
+    return f" ({(current - previous) / previous:+.1%})"
+
+
+def print_report(results: dict, baseline: dict | None = None):
+    baseline = baseline or {}
+    base_modules = {m["module"]: m for m in baseline.get("modules", [])}
+
+    print(f"{'module':<20} {'units':>5} {'wall s':>9} " + " ".join(f"{s:>9}" for s in STAGES)
+          + f" {'llm':>5} {'tests':>6}")
+    for m in results["modules"]:
+        base = base_modules.get(m["module"], {})
+        print(f"{m['module']:<20} {m['units']:>5} {m['wall']:>9.3f} "
+              + " ".join(f"{m['stages'][s]:>9.3f}" for s in STAGES)
+              + f" {m['llm']['calls']:>5} {m['passed']:>3}/{m['tests']:<3}"
+              + _delta(m["wall"], base.get("wall")))
+
+    print(f"\nTotal wall: {results['total_wall']:.3f}s{_delta(results['total_wall'], baseline.get('total_wall'))}")
+    print(f"Throughput: {results['modules_per_min']:.2f} modules/min"
+          f"{_delta(results['modules_per_min'], baseline.get('modules_per_min'))}")
+    print(f"LLM calls:  {results['llm_calls']}{_delta(results['llm_calls'], baseline.get('llm_calls'))}")
+    print(f"Peak RSS:   {results['peak_rss_mb']['self']} MB (children {results['peak_rss_mb']['children']} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PyTestCrew pipeline with a stub LLM.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per LLM call.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the latency.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 50, 200],
+                        help="Function counts of the synthetic modules.")
+    parser.add_argument("--output", default="benchmarks/results", help="Directory for the results JSON.")
+    parser.add_argument("--compare", help="Previous results JSON to print deltas against.")
+    parser.add_argument("--no-save", action="store_true", help="Print the report without saving it.")
+    parser.add_argument("--trace", metavar="JSONL", help="Also write stage spans to this file.")
+    parser.add_argument("--profile", action="store_true", help="With --trace, cProfile every stage.")
+    args = parser.parse_args(argv)
+
+    config = {
+        "llm_model": "stub-llm",
+        "llm_temperature": 0.0,
+        "llm_cache": False,
+        "max_attempts": 3,
+        # Past runs would otherwise change what later runs send to the LLM
+        "test_index": False,
+        "run_history": False,
+        "trace": bool(args.trace),
+        "trace_file": args.trace,
+        "trace_profile": args.profile,
+    }
+    results = run_benchmark(config, sizes=args.sizes, latency=args.latency, jitter=args.jitter)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if not args.no_save:
+        print(f"\nResults saved to {save_results(results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.llm_factory import create_gemini
+from utils.test_runner import set_max_parallel_runs
+from crew_workflow.pipeline import AgentPipeline
+from utils.tracing import configure_tracing, propagate
+
+
+class BatchWorkflow:
+    """
+    BatchWorkflow:
+    Runs the analyze -> generate -> execute -> review pipeline over every module
+    matched by a directory or glob, several modules at a time.
+    In-flight LLM calls and pytest processes are capped independently.
+    """
+
+    def __init__(self, config: dict, llm=None):
+        self.config = config
+        self.concurrency = int(config.get("batch_concurrency", 4))
+        self.llm = llm or create_gemini(config)
+        configure_tracing(config)
+        set_max_parallel_runs(int(config.get("pytest_concurrency", self.concurrency)))
+
+    @staticmethod
+    def discover(target: str):
+        """Return the Python modules in a directory (recursively) or matched by a glob."""
+        if os.path.isdir(target):
+            paths = glob.glob(os.path.join(target, "**", "*.py"), recursive=True)
+        else:
+            paths = glob.glob(target, recursive=True)
+
+        return sorted(
+            p for p in paths
+            if os.path.isfile(p)
+            and not os.path.basename(p).startswith("test_")
+            and not os.path.basename(p).endswith("_test.py")
+            and os.path.basename(p) != "__init__.py"
+        )
+
+    @staticmethod
+    def module_name_for(path: str, root: str):
+        """Derive a unique, importable module name from the file's path under root."""
+        rel = os.path.relpath(path, root) if root else os.path.basename(path)
+        name = re.sub(r"\W", "_", os.path.splitext(rel)[0])
+        return f"m_{name}" if name[0].isdigit() else name
+
+    def run(self, target: str, output_dir: str = "./tests/batch"):
+        """Process every matched module and write per-module outputs plus a summary.json."""
+        modules = self.discover(target)
+        if not modules:
+            raise ValueError(f"❌ No Python modules found for {target}")
+
+        root = target if os.path.isdir(target) else os.path.commonpath(
+            [os.path.dirname(os.path.abspath(p)) for p in modules])
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"🚀 Batch run: {len(modules)} module(s), concurrency={self.concurrency}")
+
+        start = time.perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {
+                pool.submit(propagate(self._run_module), path, self.module_name_for(os.path.abspath(path), root), output_dir): path
+                for path in modules
+            }
+            for future in as_completed(futures):
+                entry = future.result()
+                results.append(entry)
+                status = "✅" if entry.get("passed") else "❌"
+                print(f"{status} {entry['source']} ({entry.get('seconds', 0):.1f}s)")
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            "target": target,
+            "modules": len(results),
+            "passed": sum(1 for r in results if r.get("passed")),
+            "seconds": elapsed,
+            "results": sorted(results, key=lambda r: r["source"]),
+        }
+        with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"✅ Batch completed: {summary['passed']}/{summary['modules']} passed in {elapsed:.1f}s")
+        return summary
+
+    def _run_module(self, path: str, module_name: str, output_dir: str):
+        start = time.perf_counter()
+        module_dir = os.path.join(output_dir, module_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source_code = f.read()
+
+            result = AgentPipeline(self.config, self.llm).run(source_code, module_name, module_dir)
+            review = result["review"]
+            entry = {
+                "source": path,
+                "module_name": module_name,
+                "test_file": result["test_file"],
+                "passed": review["passed"],
+                "score": review["score"],
+                "mutation_score": (review.get("mutation") or {}).get("score"),
+                "flaky": sorted((review.get("flaky") or {}).get("flaky") or {}),
+                "timings": result["timings"],
+            }
+            with open(os.path.join(module_dir, "review.json"), "w", encoding="utf-8") as f:
+                json.dump({"review": review, "timings": result["timings"]}, f, indent=2)
+        except Exception as e:
+            entry = {"source": path, "module_name": module_name, "passed": False, "error": str(e)}
+
+        entry["seconds"] = time.perf_counter() - start
+        return entry
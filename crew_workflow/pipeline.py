@@ -0,0 +1,140 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from agents.analyzer_agent import AnalyzerAgent
+from agents.test_writer_agent import TestWriterAgent
+from agents.reviewer_agent import ReviewerAgent
+from utils.progress import emit
+from utils.run_history import get_run_history
+from utils.tracing import span
+from utils.usage import metering
+from utils.workspace import DEFAULT_ROOT, RunWorkspace, source_key
+
+
+@contextmanager
+def _stage(name: str, timings: dict):
+    """Time one pipeline stage into timings[name] and report its start and end to the progress listener."""
+    emit("stage", name=name, status="started")
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    emit("stage", name=name, status="finished", seconds=round(timings[name], 4))
+
+
+class AgentPipeline:
+    """
+    AgentPipeline:
+    Runs AnalyzerAgent -> TestWriterAgent -> ExecutorAgent (run, then mutation test) -> ReviewerAgent directly
+    (without Crew.kickoff) for a single module. Each module gets its own
+    workspace, so many pipelines can safely share one LLM client concurrently.
+    """
+
+    def __init__(self, config: dict, llm):
+        self.config = config
+        self.llm = llm
+
+    def run(self, source_code: str, module_name: str = "module_under_test", output_dir: str | None = None):
+        """
+        Run the pipeline for one module. Without output_dir the run happens in the
+        module's content-addressed workspace under `workspace_root`; either way,
+        runs sharing a directory are serialized and each run is recorded in the
+        run history.
+        """
+        if not source_code or not source_code.strip():
+            raise ValueError("❌ Source code input is empty!")
+
+        if output_dir is None:
+            workspace = RunWorkspace.for_source(source_code, module_name,
+                                                self.config.get("workspace_root", DEFAULT_ROOT))
+        else:
+            workspace = RunWorkspace(output_dir, module_name)
+
+        record = {
+            "run_id": uuid.uuid4().hex[:12],
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "mode": "pipeline",
+            "module_name": module_name,
+            "source_key": source_key(source_code, module_name),
+            "workspace": workspace.path,
+            "model": getattr(self.llm, "model", None),
+        }
+        started = time.perf_counter()
+        with metering() as usage:
+            try:
+                with workspace:
+                    result = self._run(source_code, module_name, workspace, record)
+            except Exception as e:
+                record["error"] = str(e)
+                raise
+            finally:
+                record["total_s"] = round(time.perf_counter() - started, 4)
+                record.update(usage.to_dict())
+                history = get_run_history(self.config)
+                if history is not None:
+                    history.record(record)
+        result["run_id"] = record["run_id"]
+        return result
+
+    def _run(self, source_code, module_name, workspace, record):
+        workspace.materialize(source_code)
+        run_config = dict(
+            self.config,
+            module_name=module_name,
+            module_file=workspace.module_file,
+            test_file_prefix=workspace.test_prefix,
+            state_prefix=workspace.state_prefix,
+            run_id=record["run_id"],
+        )
+        timings = {}
+
+        with span("pipeline", module_name=module_name, source_chars=len(source_code)):
+            with _stage("analyze", timings):
+                analysis = AnalyzerAgent(run_config, self.llm)(source_code)
+
+            with _stage("generate", timings):
+                writer = TestWriterAgent(run_config, self.llm)
+                test_code = writer(source_code, analysis)
+
+            with _stage("execute", timings):
+                executor = writer.executor
+                # The writer's last run already executed the final suite; run it only when it didn't
+                test_report = writer.test_report or executor(test_code or "")
+
+            with _stage("stabilize", timings):
+                test_report["flaky"] = executor.stabilize(test_report, analysis)
+
+            with _stage("mutate", timings):
+                test_report["mutation"] = executor.mutation_test(test_report, source_code)
+
+            with _stage("review", timings):
+                review = ReviewerAgent(run_config, self.llm)(test_report, analysis)
+
+        summary = test_report["test_results"].get("summary", {})
+        record.update(
+            passed=bool(review["passed"]),
+            score=review["score"],
+            attempts=writer.run_stats.get("attempts"),
+            tests=summary.get("total"),
+            tests_passed=summary.get("passed"),
+            tests_failed=summary.get("failed", 0) + summary.get("error", 0),
+            coverage=(review.get("coverage") or {}).get("percent"),
+            mutation_score=(review.get("mutation") or {}).get("score"),
+            flaky_tests=len(review["flaky"]["flaky"]) if review.get("flaky") else None,
+            **{f"{stage}_s": round(seconds, 4) for stage, seconds in timings.items()},
+        )
+        workspace.save_artifact(f"run-{record['run_id']}.json", {
+            "run": record, "review": review, "timings": timings, "analysis": analysis,
+        })
+
+        return {
+            "module_name": module_name,
+            "module_file": workspace.module_file,
+            "workspace": workspace.path,
+            "analysis": analysis,
+            "test_code": test_report["test_code"],
+            "test_file": test_report["test_file"],
+            "test_results": test_report["test_results"],
+            "review": review,
+            "timings": timings,
+        }
@@ -1,6 +1,14 @@
 import os
+import time
+import uuid
+from datetime import datetime
 from crewai import Agent, Task, Crew
-from utils.llm_factory import create_llm
+from utils.llm_factory import create_gemini, create_llm
+from crew_workflow.pipeline import AgentPipeline
+from utils.run_history import get_run_history
+from utils.tracing import configure_tracing, span
+from utils.usage import metering
+from utils.workspace import DEFAULT_ROOT, RunWorkspace, source_key
 #from utils.test_runner import run_pytest
 from utils.lint_checker import check_code_style
 
@@ -12,10 +20,13 @@ class CrewWorkflow:
     Tasks executed via Crew.kickoff()
     """
 
-    def __init__(self, config: dict, test_file_prefix: str = "test_"):
+    def __init__(self, config: dict, test_file_prefix: str = "test_", llm=None):
         self.config = config
-        self.llm = create_llm(config)
+        # `llm` lets callers inject any GeminiLLM-compatible client (e.g. the benchmark stub)
+        self.gemini = llm or create_gemini(config)
+        self.llm = create_llm(config, gemini=self.gemini)
         self.test_file_prefix = test_file_prefix
+        configure_tracing(config)
 
         # --- Define Agents ---
         self.analyzer_agent = Agent(
@@ -121,21 +132,59 @@ class CrewWorkflow:
             verbose=True,
         )
 
-    def run(self, source_code: str, output_dir: str = "./tests"):
-        """Run the entire CrewAI workflow and save the generated unit tests."""
+    def run(self, source_code: str, output_dir: str | None = None, module_name: str = "module_under_test"):
+        """
+        Run the entire CrewAI workflow and save the generated unit tests, in the
+        module's content-addressed workspace unless output_dir is given.
+        """
         if not source_code or not source_code.strip():
             raise ValueError("❌ Source code input is empty!")
 
-        os.makedirs(output_dir, exist_ok=True)
+        if output_dir is None:
+            workspace = RunWorkspace.for_source(source_code, module_name,
+                                                self.config.get("workspace_root", DEFAULT_ROOT))
+        else:
+            workspace = RunWorkspace(output_dir, module_name)
         print("🚀 Starting CrewAI Workflow (v1.2.1)...")
 
-        # Run Crew
-        inputs = {"source_code": source_code}
-        result = self.crew.kickoff(inputs=inputs)
+        record = {
+            "run_id": uuid.uuid4().hex[:12],
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "mode": "crew",
+            "module_name": module_name,
+            "source_key": source_key(source_code, module_name),
+            "workspace": workspace.path,
+            "model": getattr(self.gemini, "model", None),
+        }
+        started = time.perf_counter()
+        with metering() as usage:
+            try:
+                with workspace:
+                    workspace.materialize(source_code)
+                    # Run Crew
+                    inputs = {"source_code": source_code}
+                    with span("crew.kickoff"):
+                        result = self.crew.kickoff(inputs=inputs)
+                    file_path = self._save_tests(workspace)
+            except Exception as e:
+                record["error"] = str(e)
+                raise
+            finally:
+                record["total_s"] = round(time.perf_counter() - started, 4)
+                record.update(usage.to_dict())
+                history = get_run_history(self.config)
+                if history is not None:
+                    history.record(record)
+
+        if file_path is None:
+            return result
+        print("✅ Workflow completed.")
+        return result, file_path
 
+    def _save_tests(self, workspace):
         if not self.generate_task.output.raw:
             print("❌ No test code generated.")
-            return result
+            return None
 
         test_code = self.generate_task.output.raw
 
@@ -144,10 +193,12 @@ class CrewWorkflow:
         if not lint_ok:
             print(f"⚠️ Lint issues found:\n{lint_issues}")
 
-        file_path = os.path.join(output_dir, f"{self.test_file_prefix}generated.py")
+        file_path = os.path.join(workspace.path, f"{self.test_file_prefix}generated.py")
         with open(file_path, "w", encoding="utf-8") as f:
             f.write(test_code)
         print(f"💾 Unit tests saved to {file_path}")
+        return file_path
 
-        print("✅ Workflow completed.")
-        return result, file_path
+    def run_pipeline(self, source_code: str, module_name: str = "module_under_test", output_dir: str | None = None):
+        """Run the agents directly (no Crew.kickoff), returning per-stage results and timings."""
+        return AgentPipeline(self.config, self.gemini).run(source_code, module_name, output_dir)
@@ -1,20 +1,64 @@
+import argparse
 import os
 from dotenv import load_dotenv
 from crew_workflow.workflow import CrewWorkflow
+from crew_workflow.batch import BatchWorkflow
+from utils.run_history import BUCKETS, get_run_history
 
 # Load environment variables
 load_dotenv()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate and run pytest suites with PyTestCrew AI.")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB",
+                        help="Generate tests for every module in a directory or matching a glob.")
+    parser.add_argument("--output-dir", default="./tests/batch", help="Where batch mode writes per-module outputs.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", 4)),
+                        help="Modules processed at once in batch mode.")
+    parser.add_argument("--llm-concurrency", type=int, default=int(os.getenv("LLM_CONCURRENCY", 4)),
+                        help="Maximum in-flight LLM calls.")
+    parser.add_argument("--pytest-concurrency", type=int, default=int(os.getenv("PYTEST_CONCURRENCY", 2)),
+                        help="Maximum concurrent pytest processes.")
+    parser.add_argument("--history", nargs="?", const="day", choices=sorted(BUCKETS),
+                        help="Print run latency trends from the run history (per day by default) and exit.")
+    parser.add_argument("--module", help="With --history, only runs of this module.")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     # Read environment variables (with sane defaults)
     config = {
         "gemini_api_key": os.getenv("GEMINI_API_KEY"),
         "gemini_model": os.getenv("GEMINI_MODEL", "gemini/gemini-2.5-flash"),
+        "gemini_models": os.getenv("GEMINI_MODELS"),
         "temperature": float(os.getenv("LLM_TEMPERATURE", 0.3)),
         "max_attempts": int(os.getenv("MAX_ATTEMPTS", 3)),
         "test_file_prefix": os.getenv("TEST_FILE_PREFIX", "generated_tests/unit_test"),
+        "llm_cache": os.getenv("LLM_CACHE", "1") != "0",
+        "llm_cache_dir": os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+        "requests_per_minute": os.getenv("LLM_REQUESTS_PER_MINUTE"),
+        "tokens_per_minute": os.getenv("LLM_TOKENS_PER_MINUTE"),
+        "batch_concurrency": args.concurrency,
+        "llm_concurrency": args.llm_concurrency,
+        "pytest_concurrency": args.pytest_concurrency,
+        "trace": os.getenv("TRACE", "0") != "0",
+        "trace_exporter": os.getenv("TRACE_EXPORTER", "jsonl"),
+        "trace_file": os.getenv("TRACE_FILE", "traces/spans.jsonl"),
+        "trace_profile": os.getenv("TRACE_PROFILE", ""),
+        "workspace_root": os.getenv("WORKSPACE_ROOT", ".pytestcrew/runs"),
+        "run_history_path": os.getenv("RUN_HISTORY_PATH", ".pytestcrew/history.duckdb"),
     }
 
+    if args.history:
+        print_history(config, args.history, args.module)
+        return
+
+    if args.batch:
+        BatchWorkflow(config).run(args.batch, args.output_dir)
+        return
+
     # Example source code input
     source_code = """
     def divide(a, b):
@@ -35,6 +79,20 @@ def main():
         print(output)
 
 
+def print_history(config, bucket, module_name=None):
+    history = get_run_history(config)
+    rows = history.latency_trend(bucket, module_name) if history else []
+    if not rows:
+        print("No runs recorded yet.")
+        return
+    print(f"{'period':<14} {'runs':>5} {'pass':>6} {'mutants':>8} {'total s':>8} {'max s':>8} {'gen s':>7} "
+          f"{'exec s':>7} {'mut s':>7} {'flaky':>6} {'tries':>6} {'tokens':>9} {'cached':>9}")
+    for row in rows:
+        print(f"{row['period']:<14} {row['runs']:>5} {row['pass_rate'] or 0:>6.0%} {row['mutation_score'] or 0:>8.0%} "
+              f"{row['total_s'] or 0:>8.2f} {row['max_total_s'] or 0:>8.2f} {row['generate_s'] or 0:>7.2f} "
+              f"{row['execute_s'] or 0:>7.2f} {row['mutate_s'] or 0:>7.2f} {row['flaky_tests'] or 0:>6} "
+              f"{row['attempts'] or 0:>6.1f} {row['tokens'] or 0:>9} {row['cached_tokens'] or 0:>9}")
+
 
 if __name__ == "__main__":
     main()
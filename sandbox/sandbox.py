@@ -0,0 +1,409 @@
+import atexit
+import contextlib
+import ctypes
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import re
+import resource
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+
+# Per-job limits; memory is address space, so leave room for pytest, coverage and thread stacks
+DEFAULT_LIMITS = {
+    "cpu_seconds": 30,
+    "memory_mb": 2048,
+    "file_size_mb": 64,
+    "processes": 64,
+    "open_files": 256,
+}
+
+DEFAULT_PRELOAD = ("pytest", "_pytest.python", "_pytest.assertion.rewrite", "coverage", "coverage.jsonreport",
+                   "utils.pytest_plugin")
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+MS_RDONLY = 0x1
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+# Mount flags a user namespace may not drop when remounting: kept as they are
+_KEPT_FLAGS = [(os.ST_NOSUID, 0x2), (os.ST_NODEV, 0x4), (os.ST_NOEXEC, 0x8), (os.ST_NOATIME, 0x400),
+               (os.ST_NODIRATIME, 0x800), (os.ST_RELATIME, 0x200000)] if hasattr(os, "ST_RELATIME") else []
+
+# Result files the plugin writes outside the workspace: the only host paths a job may write
+OUTPUT_OPTIONS = ("--pytestcrew-results", "--pytestcrew-cov-report")
+
+_KILL_REASONS = {
+    -signal.SIGXCPU: "CPU time limit exceeded",
+    -signal.SIGKILL: "killed (time limit or out of memory)",
+    -signal.SIGXFSZ: "file size limit exceeded",
+    -signal.SIGSEGV: "crashed (segmentation fault)",
+}
+
+
+def _unshare_namespaces(flags=CLONE_NEWUSER | CLONE_NEWNET):
+    """
+    Enter new namespaces, a user namespace among them (no privileges needed
+    where unprivileged userns is allowed), keeping this process's uid and gid so
+    files it creates in the namespace's own mounts (e.g. tmpfs) get an owner.
+    """
+    uid, gid = os.geteuid(), os.getegid()
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+    with contextlib.suppress(OSError):
+        with open("/proc/self/uid_map", "w") as f:
+            f.write(f"{uid} {uid} 1")
+        with open("/proc/self/setgroups", "w") as f:
+            f.write("deny")
+        with open("/proc/self/gid_map", "w") as f:
+            f.write(f"{gid} {gid} 1")
+
+
+def _mount(libc, source, target, fstype, flags):
+    encode = lambda value: value.encode() if value is not None else None
+    if libc.mount(encode(source), encode(target), encode(fstype), ctypes.c_ulong(flags), None) != 0:
+        raise OSError(ctypes.get_errno(), f"mount {target}: {os.strerror(ctypes.get_errno())}")
+
+
+def _mount_points():
+    points = []
+    with open("/proc/self/mountinfo", "r", encoding="utf-8") as f:
+        for line in f:
+            # Spaces and other special characters in paths are octal-escaped
+            point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), line.split()[4])
+            points.append(point)
+    return points
+
+
+def _confine_filesystem(writable):
+    """
+    In a new mount namespace, remount everything read-only except the given
+    paths (the workspace and the result files), give /dev/shm a private tmpfs,
+    then enter one more user namespace so the job can't undo any of it.
+    Raises OSError when the root can't be made read-only.
+    """
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWNS) != 0:
+        raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+    _mount(libc, None, "/", None, MS_REC | MS_PRIVATE)
+    writable = [os.path.realpath(path) for path in writable]
+    for path in writable:
+        _mount(libc, path, path, None, MS_BIND | MS_REC)
+    for point in reversed(_mount_points()):
+        if point in writable or any(point.startswith(path + os.sep) for path in writable):
+            continue
+        try:
+            flags = os.statvfs(point).f_flag
+            kept = sum(ms for st, ms in _KEPT_FLAGS if flags & st)
+            _mount(libc, None, point, None, MS_REMOUNT | MS_BIND | MS_RDONLY | kept)
+        except OSError:
+            if point == "/":
+                raise
+            # e.g. /proc and /sys, whose flags the namespace can't change
+    if os.path.isdir("/dev/shm"):
+        with contextlib.suppress(OSError):
+            _mount(libc, "tmpfs", "/dev/shm", "tmpfs", 0)
+    # Mounts copied into a less privileged namespace are locked: read-only stays read-only
+    _unshare_namespaces(CLONE_NEWUSER | CLONE_NEWNS)
+
+
+def _output_paths(args):
+    return [args[index + 1] for index, arg in enumerate(args[:-1]) if arg in OUTPUT_OPTIONS]
+
+
+def _block_network():
+    """Fallback when namespaces are unavailable: refuse every non-local socket connection."""
+    def refuse(self, address, *args, **kwargs):
+        if self.family == socket.AF_UNIX:
+            return original_connect(self, address, *args, **kwargs)
+        raise ConnectionRefusedError("network access is disabled in the test sandbox")
+
+    original_connect = socket.socket.connect
+    socket.socket.connect = refuse
+    socket.socket.connect_ex = lambda self, address: refuse(self, address)
+    socket.getaddrinfo = lambda *args, **kwargs: (_ for _ in ()).throw(
+        socket.gaierror("network access is disabled in the test sandbox"))
+
+
+def _user_processes() -> int:
+    """Processes currently owned by this real uid (RLIMIT_NPROC counts all of them)."""
+    uid, count = os.getuid(), 0
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            with contextlib.suppress(OSError):
+                if os.stat(f"/proc/{entry}").st_uid == uid:
+                    count += 1
+    return count
+
+
+def _set_limit(name, value, headroom=0):
+    """Lower a soft limit (and an unlimited hard limit to value + headroom)."""
+    limit = getattr(resource, name, None)
+    if limit is None:
+        return
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    with contextlib.suppress(ValueError, OSError):
+        resource.setrlimit(limit, (value, hard if hard != resource.RLIM_INFINITY else value + headroom))
+
+
+def _apply_limits(limits):
+    mb = 1024 * 1024
+    _set_limit("RLIMIT_AS", int(limits["memory_mb"] * mb))
+    _set_limit("RLIMIT_FSIZE", int(limits["file_size_mb"] * mb))
+    _set_limit("RLIMIT_NOFILE", int(limits["open_files"]))
+    _set_limit("RLIMIT_CORE", 0)
+    if sys.platform.startswith("linux"):
+        # Counted per real user, so allow for what it already runs (root is exempt from this limit)
+        _set_limit("RLIMIT_NPROC", _user_processes() + int(limits["processes"]))
+    # Oversized writes raise OSError(EFBIG) inside the test instead of killing the sandbox
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+
+
+def _sandbox_main(conn, workspace, limits, preload, namespaces):
+    """
+    A single-use sandbox: isolate, import pytest, wait for one job, run it in the
+    workspace and exit. Everything up to the job happens while the sandbox is idle.
+    """
+    os.setsid()  # its own process group, so the parent can kill everything it spawns
+    isolation = []
+    if namespaces:
+        try:
+            _unshare_namespaces()
+            isolation.append("namespaces")
+        except (OSError, AttributeError):
+            pass
+    if "namespaces" not in isolation:
+        _block_network()
+        isolation.append("socket-guard")
+
+    for name in preload:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(name)
+    import pytest
+
+    home = os.path.join(workspace, "home")
+    os.makedirs(home, exist_ok=True)
+    # An empty session imports the rest of pytest's machinery before any job arrives
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        with contextlib.suppress(BaseException):
+            pytest.main(["-q", "--collect-only", "-p", "no:cacheprovider", "-p", "utils.pytest_plugin", home])
+    os.environ.update(HOME=home, TMPDIR=home, TEMP=home, TMP=home)
+    tempfile.tempdir = home
+    for proxy in ("http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY"):
+        os.environ.pop(proxy, None)
+    _apply_limits(limits)
+
+    try:
+        job = conn.recv()
+    except (EOFError, OSError):
+        return
+    if job is None:
+        return
+
+    source_dir, targets, extra_args = job
+    if "namespaces" in isolation:
+        try:
+            _confine_filesystem([workspace, *_output_paths(extra_args)])
+            isolation.append("read-only-host")
+        except (OSError, AttributeError):
+            pass
+    # CPU time counts from the job, not from the warm-up; SIGXCPU at the soft limit, SIGKILL a second later
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _set_limit("RLIMIT_CPU", int(usage.ru_utime + usage.ru_stime) + int(limits["cpu_seconds"]), headroom=1)
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(source_dir)
+            sys.path.insert(0, source_dir)
+            returncode = int(pytest.main([*targets, "-q", "--disable-warnings", "-p", "no:cacheprovider",
+                                          "--rootdir", source_dir, *extra_args]))
+        except BaseException as e:  # pytest.main may raise SystemExit or crash on bad input
+            print(f"Error running pytest: {e}", file=sys.stderr)
+            returncode = 1
+
+    with contextlib.suppress(OSError, BrokenPipeError):
+        conn.send({"returncode": returncode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(),
+                   "isolation": isolation})
+    os._exit(0)
+
+
+class _Sandbox:
+    def __init__(self, process, conn, workspace):
+        self.process = process
+        self.conn = conn
+        self.workspace = workspace
+
+    def destroy(self):
+        # The sandbox leads its own process group: take down anything it left behind too
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(self.process.pid, signal.SIGKILL)
+        self.process.join(timeout=5)
+        self.conn.close()
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    Pool of ready, single-use sandboxes for running generated tests.
+    Each sandbox is a process in its own process group that has already entered
+    new user and network namespaces (or, where that isn't permitted, refuses
+    socket connections), imported pytest and applied CPU-time, address-space,
+    file-size, process-count and open-file rlimits. A job copies the test
+    directory's files into the sandbox's throwaway workspace and runs there, in a
+    mount namespace where everything else on the host is read-only; afterwards
+    the whole process group is killed and the workspace deleted, and a fresh
+    sandbox is started in the background. `run` has the same shape as
+    PytestWorkerPool.run, so run_pytest accepts either.
+    """
+
+    def __init__(self, size: int = 2, limits: dict | None = None, namespaces: bool = True,
+                 preload=DEFAULT_PRELOAD):
+        self.size = size
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.namespaces = namespaces and sys.platform.startswith("linux")
+        self.preload = tuple(preload)
+
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if self._ctx.get_start_method() == "forkserver":
+            self._ctx.set_forkserver_preload(list(self.preload))
+
+        self._ready = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._ready.put(self._spawn())
+
+    def _spawn(self):
+        workspace = tempfile.mkdtemp(prefix="pytestcrew-sandbox-")
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_sandbox_main, args=(child_conn, workspace, self.limits, self.preload, self.namespaces),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Sandbox(process, parent_conn, workspace)
+
+    def _replenish(self):
+        if not self._closed:
+            self._ready.put(self._spawn())
+
+    def run(self, test_path, timeout: float = 20, extra_args=()):
+        """
+        Run pytest on test_path (a file, a directory, or a list of `file::test` node ids,
+        all in one directory) inside a sandbox; same result shape as run_pytest.
+        """
+        if self._closed:
+            raise RuntimeError("SandboxPool is closed")
+
+        targets = [os.path.abspath(t) for t in ([test_path] if isinstance(test_path, str) else test_path)]
+        host_dir = targets[0] if os.path.isdir(targets[0]) else os.path.dirname(targets[0].split("::")[0])
+        sandbox = self._ready.get()
+
+        work_dir = os.path.join(sandbox.workspace, "src")
+        try:
+            self._copy_files(host_dir, work_dir)
+            # Result files must exist to be mounted writable inside the sandbox
+            for path in _output_paths(list(extra_args)):
+                open(path, "a").close()
+            sandbox.conn.send((work_dir, [self._to_workspace(t, host_dir, work_dir) for t in targets],
+                               self._workspace_args(extra_args, host_dir, work_dir)))
+            if not sandbox.conn.poll(timeout):
+                return {"passed": False, "stdout": "", "stderr": "Timeout expired while running pytest."}
+            reply = sandbox.conn.recv()
+        except (EOFError, OSError):
+            sandbox.process.join(timeout=1)
+            reason = _KILL_REASONS.get(sandbox.process.exitcode, f"exit code {sandbox.process.exitcode}")
+            return {"passed": False, "stdout": "", "stderr": f"Sandbox stopped: {reason}."}
+        finally:
+            self._restore_coverage_paths(extra_args, host_dir, work_dir)
+            sandbox.destroy()
+            # Started once the job is done so warming up never competes with it for CPU
+            threading.Thread(target=self._replenish, daemon=True).start()
+
+        return {
+            "passed": reply["returncode"] == 0,
+            "stdout": reply["stdout"],
+            "stderr": reply["stderr"],
+            "isolation": reply["isolation"],
+        }
+
+    def _copy_files(self, host_dir, work_dir):
+        """Copy the files next to the tests (the module under test, conftest, data files) into the workspace."""
+        os.makedirs(work_dir)
+        max_bytes = self.limits["file_size_mb"] * 1024 * 1024
+        for entry in os.scandir(host_dir):
+            if entry.is_file() and entry.stat().st_size <= max_bytes:
+                shutil.copy2(entry.path, os.path.join(work_dir, entry.name))
+
+    @staticmethod
+    def _workspace_args(extra_args, host_dir, work_dir):
+        """Coverage sources and mutant manifests refer to the test directory, so point them at its copy."""
+        args = list(extra_args)
+        for index, arg in enumerate(args[:-1]):
+            if arg in ("--pytestcrew-cov", "--pytestcrew-mutants"):
+                args[index + 1] = SandboxPool._to_workspace(os.path.abspath(args[index + 1]), host_dir, work_dir)
+        return args
+
+    @staticmethod
+    def _to_workspace(arg: str, host_dir: str, work_dir: str) -> str:
+        """Paths inside the test directory point at the workspace copy; anything else is unchanged."""
+        if arg == host_dir or arg.startswith(host_dir + os.sep):
+            return work_dir + arg[len(host_dir):]
+        return arg
+
+    @staticmethod
+    def _restore_coverage_paths(extra_args, host_dir, work_dir):
+        """The coverage report names the workspace copies; map them back to the host files."""
+        args = list(extra_args)
+        if "--pytestcrew-cov-report" not in args:
+            return
+        path = args[args.index("--pytestcrew-cov-report") + 1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            return
+        report = {SandboxPool._to_workspace(key, work_dir, host_dir): value for key, value in report.items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                sandbox = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            with contextlib.suppress(OSError, BrokenPipeError):
+                sandbox.conn.send(None)
+            sandbox.destroy()
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_sandbox_pool(size: int = 2, limits: dict | None = None, namespaces: bool = True):
+    """Return the process-wide sandbox pool, creating it on first use."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SandboxPool(size=size, limits=limits, namespaces=namespaces)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
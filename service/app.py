@@ -0,0 +1,102 @@
+"""
+HTTP front end for PyTestCrew: submissions go on a bounded job queue served by
+warm workflow instances; identical in-flight submissions share one job.
+
+    uvicorn service.app:app --host 0.0.0.0 --port 8000
+"""
+import os
+from contextlib import asynccontextmanager
+from typing import Literal
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from service.jobs import JobManager, QueueFullError
+
+load_dotenv()
+
+
+class JobRequest(BaseModel):
+    source_code: str = Field(min_length=1)
+    module_name: str = Field(default="module_under_test", pattern=r"^[A-Za-z_][A-Za-z0-9_]*$")
+    mode: Literal["pipeline", "crew"] = "pipeline"
+    config: dict = Field(default_factory=dict)
+
+
+def load_config() -> dict:
+    return {
+        "gemini_api_key": os.getenv("GEMINI_API_KEY"),
+        "gemini_model": os.getenv("GEMINI_MODEL", "gemini/gemini-2.5-flash"),
+        "gemini_models": os.getenv("GEMINI_MODELS"),
+        "temperature": float(os.getenv("LLM_TEMPERATURE", 0.3)),
+        "max_attempts": int(os.getenv("MAX_ATTEMPTS", 3)),
+        "llm_cache": os.getenv("LLM_CACHE", "1") != "0",
+        "llm_cache_dir": os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+        "requests_per_minute": os.getenv("LLM_REQUESTS_PER_MINUTE"),
+        "tokens_per_minute": os.getenv("LLM_TOKENS_PER_MINUTE"),
+        "llm_concurrency": int(os.getenv("LLM_CONCURRENCY", 4)),
+        "llm_priority": "interactive",
+        "workspace_root": os.getenv("WORKSPACE_ROOT", ".pytestcrew/runs"),
+        "run_history_path": os.getenv("RUN_HISTORY_PATH", ".pytestcrew/history.duckdb"),
+        "service_workers": int(os.getenv("SERVICE_WORKERS", 2)),
+        "service_queue_size": int(os.getenv("SERVICE_QUEUE_SIZE", 32)),
+    }
+
+
+def create_app(config: dict | None = None, manager: JobManager | None = None) -> FastAPI:
+    """Build the service; pass a JobManager to control how workflows are created (tests, benchmarks)."""
+    config = config or load_config()
+    manager = manager or JobManager(
+        config,
+        workers=int(config.get("service_workers", 2)),
+        max_queue=int(config.get("service_queue_size", 32)),
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        manager.start()  # workflows are built here, once, not per request
+        yield
+        manager.stop()
+
+    app = FastAPI(title="PyTestCrew AI", lifespan=lifespan)
+    app.state.jobs = manager
+
+    @app.post("/jobs", status_code=202)
+    def submit_job(request: JobRequest):
+        try:
+            job, deduplicated = manager.submit(request.source_code, request.module_name, request.mode,
+                                               request.config)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return dict(job.to_dict(), deduplicated=deduplicated)
+
+    @app.get("/jobs/{job_id}")
+    def job_status(job_id: str):
+        return _job(manager, job_id).to_dict()
+
+    @app.get("/jobs/{job_id}/result")
+    def job_result(job_id: str, wait: float = 0.0):
+        """The job's result; `wait` blocks up to that many seconds (max 60) for it to finish."""
+        job = _job(manager, job_id)
+        job.done.wait(min(max(wait, 0.0), 60.0))
+        if not job.done.is_set():
+            return JSONResponse(job.to_dict(), status_code=202)
+        return job.to_dict(include_result=True)
+
+    @app.get("/health")
+    def health():
+        return manager.stats()
+
+    return app
+
+
+def _job(manager: JobManager, job_id: str):
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+app = create_app()
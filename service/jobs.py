@@ -0,0 +1,193 @@
+import hashlib
+import json
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from crew_workflow.pipeline import AgentPipeline
+from crew_workflow.workflow import CrewWorkflow
+
+# Per-request config overrides a client may send; everything else (keys, paths, pools) is server-side
+OVERRIDABLE_KEYS = {
+    "max_attempts", "temperature", "candidates", "unit_concurrency", "incremental",
+    "baseline_tests", "baseline_max_statements", "coverage", "coverage_target", "coverage_rounds",
+    "coverage_min_gain", "test_index", "prompt_token_budget", "analyzer_prompt_tokens",
+    "writer_prompt_tokens", "reviewer_prompt_tokens", "pytest_test_timeout", "fail_fast",
+    "mutation", "mutation_max_mutants", "flaky_runs", "flaky_action",
+}
+
+MODES = ("pipeline", "crew")
+
+
+class QueueFullError(Exception):
+    """Raised by JobManager.submit when the job queue is at capacity."""
+
+
+def job_key(source_code: str, module_name: str, mode: str, overrides: dict) -> str:
+    """Identity of a submission: identical keys share one job while it is in flight."""
+    payload = json.dumps([source_code, module_name, mode, overrides], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Job:
+    def __init__(self, key: str, source_code: str, module_name: str, mode: str, overrides: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.key = key
+        self.source_code = source_code
+        self.module_name = module_name
+        self.mode = mode
+        self.overrides = overrides
+        self.status = "queued"          # queued -> running -> succeeded | failed
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.attached = 0               # identical submissions served by this job
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self, include_result: bool = False):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "module_name": self.module_name,
+            "mode": self.mode,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_seconds": round((self.started_at or time.time()) - self.submitted_at, 4),
+            "run_seconds": round((self.finished_at or time.time()) - self.started_at, 4) if self.started_at else None,
+            "attached": self.attached,
+            "error": self.error,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Bounded job queue served by a pool of worker threads, each holding a warm
+    CrewWorkflow (LLM client, agents and Crew built once at start-up). Pipeline
+    jobs share each worker's LLM client; per-request config overrides only build
+    a lightweight pipeline around it. A submission identical to a queued or
+    running job (same source, module, mode and overrides) attaches to that job
+    instead of being run again. Finished jobs are kept for `retain` lookups.
+    """
+
+    def __init__(self, config: dict, workers: int = 2, max_queue: int = 32, retain: int = 256,
+                 workflow_factory=None):
+        self.config = config
+        self.workers = workers
+        self.retain = retain
+        # Injectable for tests and benchmarks (e.g. a CrewWorkflow around a stub LLM)
+        self.workflow_factory = workflow_factory or (lambda: CrewWorkflow(config))
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            workflow = self.workflow_factory()
+            thread = threading.Thread(target=self._work, args=(workflow,), name=f"pytestcrew-job-{index}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, source_code: str, module_name: str = "module_under_test", mode: str = "pipeline",
+               overrides: dict | None = None):
+        """Queue a job, or attach to the identical one in flight. Returns (job, deduplicated)."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+        overrides = dict(overrides or {})
+        unknown = set(overrides) - OVERRIDABLE_KEYS
+        if unknown:
+            raise ValueError(f"Config keys not overridable per request: {', '.join(sorted(unknown))}")
+
+        key = job_key(source_code, module_name, mode, overrides)
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing is not None:
+                existing.attached += 1
+                return existing, True
+
+            job = Job(key, source_code, module_name, mode, overrides)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Job queue is full ({self._queue.maxsize} waiting)") from None
+            self._inflight[key] = job
+            self._jobs[job.id] = job
+            self._evict()
+            return job, False
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {"workers": len(self._threads), "queued": self._queue.qsize(),
+                    "queue_capacity": self._queue.maxsize, "in_flight": len(self._inflight), "jobs": statuses}
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond `retain` (queued and running ones are always kept)."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(self._jobs) - self.retain)]:
+            del self._jobs[job_id]
+
+    def _work(self, workflow):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status, job.started_at = "running", time.time()
+            try:
+                job.result = self._run(workflow, job)
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.result = {"traceback": traceback.format_exc(limit=5)}
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._inflight.pop(job.key, None)
+                job.done.set()
+
+    def _run(self, workflow, job):
+        config = dict(self.config, **job.overrides)
+        if job.mode == "pipeline":
+            result = AgentPipeline(config, workflow.gemini).run(job.source_code, job.module_name)
+            return {key: result[key] for key in
+                    ("run_id", "module_name", "workspace", "test_file", "test_code", "test_results", "review",
+                     "timings")}
+
+        # Crew tasks keep per-run state on the workflow's Task objects, so a worker runs one at a time
+        if job.overrides:
+            workflow = CrewWorkflow(config, llm=workflow.gemini)
+        outcome = workflow.run(job.source_code, module_name=job.module_name)
+        output, file_path = outcome if isinstance(outcome, tuple) else (outcome, None)
+        test_code = None
+        if file_path:
+            with open(file_path, "r", encoding="utf-8") as f:
+                test_code = f.read()
+        return {
+            "test_file": file_path,
+            "test_code": test_code,
+            "output": output.dict() if hasattr(output, "dict") else str(output),
+        }
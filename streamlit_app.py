@@ -1,8 +1,11 @@
 import os
+import queue
+import threading
 import streamlit as st
 from dotenv import load_dotenv
 from crew_workflow.workflow import CrewWorkflow
 from utils.examples import example_dijkstra
+from utils.progress import listening
 load_dotenv()
 
 st.title("🧪 PyTestCrew_AI — AI-Powered Python Test Generator")
@@ -12,11 +15,24 @@ st.caption("Automatically create, run, and validate Python tests using AI-driven
 config = {
     "gemini_api_key": os.getenv("GEMINI_API_KEY"),
     "gemini_model": os.getenv("GEMINI_MODEL", "gemini/gemini-2.5-flash"),
+    "gemini_models": os.getenv("GEMINI_MODELS"),
     "temperature": float(os.getenv("LLM_TEMPERATURE", 0.3)),
     "max_attempts": int(os.getenv("MAX_ATTEMPTS", 3)),
     "test_file_prefix": os.getenv("TEST_FILE_PREFIX", "generated_tests/unit_test"),
+    "llm_cache": os.getenv("LLM_CACHE", "1") != "0",
+    "llm_cache_dir": os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+    "requests_per_minute": os.getenv("LLM_REQUESTS_PER_MINUTE"),
+    "tokens_per_minute": os.getenv("LLM_TOKENS_PER_MINUTE"),
+    "llm_priority": "interactive",
+    "fail_fast": int(os.getenv("FAIL_FAST", 0)),
 }
 
+@st.cache_resource
+def get_workflow():
+    """Built once per server process and reused across reruns (LLM client, agents and Crew)."""
+    return CrewWorkflow(config)
+
+
 st.header("Source Code Input")
 source_code = st.text_area(
     "Paste your Python code here:", 
@@ -24,28 +40,90 @@ source_code = st.text_area(
     value=f"{example_dijkstra}"
 )
 
+def run_streaming(workflow, source_code: str):
+    """
+    Run the pipeline in a background thread and render its progress events as they
+    arrive: the stage in progress, the tests as the LLM writes them, and each test's
+    outcome as soon as pytest reports it.
+    """
+    events = queue.Queue()
+    outcome = {}
+
+    def target():
+        try:
+            with listening(lambda kind, data: events.put((kind, data))):
+                outcome["result"] = workflow.run_pipeline(source_code)
+        except Exception as e:
+            outcome["error"] = e
+
+    stage_box = st.empty()
+    code_box = st.empty()
+    tests_box = st.empty()
+    streamed, results, mutants = {}, {}, []
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    while thread.is_alive() or not events.empty():
+        try:
+            kind, data = events.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if kind == "stage":
+            verb = "Running" if data["status"] == "started" else "Finished"
+            stage_box.info(f"{verb} stage: {data['name']}")
+        elif kind == "llm.chunk":
+            unit = data.get("unit") or "module"
+            streamed[unit] = streamed.get(unit, "") + data["text"]
+            code_box.code("\n\n".join(streamed.values()), language="python")
+        elif kind == "pytest":
+            results.clear()
+            fail_fast = f" (stops after {data['fail_fast']} failures)" if data.get("fail_fast") else ""
+            stage_box.info(f"Running tests, attempt {data['attempt']}{fail_fast}")
+        elif kind == "test":
+            results[data["nodeid"]] = data["outcome"]
+            counts = {o: list(results.values()).count(o) for o in ("passed", "failed", "error", "skipped")}
+            summary = ", ".join(f"{n} {o}" for o, n in counts.items() if n)
+            lines = [f"{'✅' if o in ('passed', 'skipped') else '❌'} {nodeid}" for nodeid, o in results.items()]
+            tests_box.markdown(f"**{summary}**\n\n" + "\n".join(f"- `{line}`" for line in lines[-30:]))
+        elif kind == "mutant":
+            mutants.append(data["status"])
+            killed = sum(status in ("killed", "timeout") for status in mutants)
+            stage_box.info(f"Mutation testing: {killed}/{len(mutants)} mutants killed")
+
+    thread.join()
+    stage_box.empty()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
 if st.button("Run Workflow"):
     if not source_code.strip():
         st.error("Please provide source code to run the workflow.")
     else:
-        workflow = CrewWorkflow(config)
-
-        with st.spinner("Running CrewAI workflow..."):
-            result, file_path = workflow.run(source_code)
-
+        result = run_streaming(get_workflow(), source_code)
         st.success("Workflow completed!")
 
-    result_dict  = result.dict()
-
-    if file_path and os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            st.download_button(
-                label=f"Download {os.path.basename(file_path)}",
-                data=f.read(),
-                file_name=os.path.basename(file_path),
-                mime="text/plain"
-            )
+        file_path = result["test_file"]
+        if file_path and os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                st.download_button(
+                    label=f"Download {os.path.basename(file_path)}",
+                    data=f.read(),
+                    file_name=os.path.basename(file_path),
+                    mime="text/plain"
+                )
 
-    for task_name, output in result_dict.items():
-        st.subheader(f"Task: {task_name}")
-        st.code(output)
+        st.subheader("Generated tests")
+        st.code(result["test_code"], language="python")
+        st.subheader("Review")
+        st.markdown(f"Score: **{result['review']['score']}**")
+        mutation = result["review"].get("mutation")
+        if mutation and mutation.get("mutants"):
+            st.markdown(f"Mutation score: **{mutation['score']:.0%}** "
+                        f"({mutation['killed']}/{mutation['mutants']} mutants killed)")
+        flaky = result["review"].get("flaky")
+        if flaky and flaky.get("flaky"):
+            verb = "Quarantined" if flaky.get("action") == "quarantine" else "Flagged"
+            st.warning(f"{verb} flaky tests: " + ", ".join(f"`{name}`" for name in sorted(flaky["flaky"])))
+        st.code(result["review"]["summary"])
@@ -0,0 +1,373 @@
+import ast
+import builtins
+import importlib.util
+
+# Names whose use makes calling a function with arbitrary inputs unsafe (I/O, processes, sleeping)
+UNSAFE_NAMES = {
+    "open", "input", "exec", "eval", "compile", "__import__", "breakpoint", "exit", "quit",
+    "os", "sys", "subprocess", "shutil", "socket", "requests", "urllib", "http", "time", "pathlib",
+    "threading", "multiprocessing", "asyncio",
+}
+
+# Per type: (hypothesis strategy, sample values for parametrized tests, value that is "empty" or zero)
+TYPE_STRATEGIES = {
+    "int": ("st.integers(min_value=-1000, max_value=1000)", ["0", "1", "-1", "7"], "0"),
+    "float": ("st.floats(min_value=-1e6, max_value=1e6, allow_nan=False, allow_infinity=False)",
+              ["0.0", "1.5", "-2.25"], "0.0"),
+    "str": ("st.text(max_size=20)", ['""', '"a"', '"Hello World"'], '""'),
+    "bool": ("st.booleans()", ["True", "False"], "False"),
+    "bytes": ("st.binary(max_size=20)", ['b""', 'b"ab"'], 'b""'),
+    "list": ("st.lists(st.integers(min_value=-1000, max_value=1000), max_size=10)",
+             ["[]", "[1]", "[3, -1, 2]"], "[]"),
+    "tuple": ("st.lists(st.integers(min_value=-1000, max_value=1000), max_size=10).map(tuple)",
+              ["()", "(1,)", "(3, -1, 2)"], "()"),
+    "set": ("st.sets(st.integers(min_value=-1000, max_value=1000), max_size=10)", ["set()", "{1}", "{3, -1}"],
+            "set()"),
+    "dict": ("st.dictionaries(st.text(max_size=5), st.integers(min_value=-1000, max_value=1000), max_size=5)",
+             ["{}", '{"a": 1}'], "{}"),
+}
+NEUTRAL = {"int": "1", "float": "1.5", "str": '"a"', "bool": "True", "bytes": 'b"a"', "list": "[1]",
+           "tuple": "(1,)", "set": "{1}", "dict": '{"a": 1}'}
+RETURN_TYPES = {"int": "int", "float": "(int, float)", "str": "str", "bool": "bool", "bytes": "bytes",
+                "list": "list", "tuple": "tuple", "set": "set", "dict": "dict"}
+SEQUENCE_TYPES = {"str", "bytes", "list", "tuple"}
+ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+
+# Operations allowed in guard conditions we evaluate to pick violating inputs
+GUARD_NODES = (
+    ast.Expression, ast.Compare, ast.BoolOp, ast.UnaryOp, ast.Name, ast.Constant, ast.Load, ast.Call,
+    ast.And, ast.Or, ast.Not, ast.USub, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot,
+)
+
+
+def annotation_type(annotation):
+    """Simple builtin type name of an annotation (`list[int]`, `List[int]` -> "list"), or None."""
+    if isinstance(annotation, ast.Subscript):
+        annotation = annotation.value
+    name = annotation.id if isinstance(annotation, ast.Name) else getattr(annotation, "attr", None)
+    if name in ("List", "Tuple", "Set", "Dict"):
+        name = name.lower()
+    return name if name in TYPE_STRATEGIES else None
+
+
+def infer_types(node: ast.FunctionDef, params):
+    """
+    Annotated types, falling back to int for unannotated parameters that are only
+    used as numbers: operands of -, /, //, %, ** or of + and * with a numeric constant.
+    """
+    types = {arg.arg: annotation_type(arg.annotation) for arg in params}
+    numeric, other = set(), set()
+
+    for child in ast.walk(node):
+        if isinstance(child, ast.BinOp) and isinstance(child.op, ARITHMETIC):
+            operands = (child.left, child.right)
+            for operand, partner in (operands, operands[::-1]):
+                if not isinstance(operand, ast.Name):
+                    continue
+                if not isinstance(child.op, (ast.Add, ast.Mult)) or (
+                        isinstance(partner, ast.Constant) and type(partner.value) in (int, float)):
+                    numeric.add(operand.id)
+        elif isinstance(child, (ast.Attribute, ast.Subscript)) and isinstance(child.value, ast.Name):
+            other.add(child.value.id)
+        elif isinstance(child, (ast.For, ast.comprehension)) and isinstance(child.iter, ast.Name):
+            other.add(child.iter.id)
+        elif isinstance(child, ast.Call):
+            other.update(a.id for a in child.args if isinstance(a, ast.Name))
+
+    for name, kind in types.items():
+        if kind is None and name in numeric and name not in other:
+            types[name] = "int"
+    return types
+
+
+def raised_exceptions(node, symbols):
+    """Names of the builtin or module-level exception classes raised in the function."""
+    names = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Raise) and child.exc is not None:
+            exc = child.exc.func if isinstance(child.exc, ast.Call) else child.exc
+            if isinstance(exc, ast.Name) and _is_exception(exc.id, symbols) and exc.id not in names:
+                names.append(exc.id)
+    return names
+
+
+def _is_exception(name, symbols):
+    value = getattr(builtins, name, None)
+    if isinstance(value, type) and issubclass(value, BaseException):
+        return True
+    return name in symbols
+
+
+def implicit_exceptions(node):
+    """Exceptions that arithmetic and indexing in the body can raise on ordinary inputs."""
+    found = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.BinOp) and isinstance(child.op, (ast.Div, ast.FloorDiv, ast.Mod)):
+            if not isinstance(child.right, ast.Constant):
+                found.append("ZeroDivisionError")
+        elif isinstance(child, ast.BinOp) and isinstance(child.op, ast.Pow):
+            found.append("OverflowError")
+        elif isinstance(child, ast.Subscript) and not isinstance(child.slice, ast.Slice):
+            found.extend(["IndexError", "KeyError"])
+    return list(dict.fromkeys(found))
+
+
+def unconditional_nodes(statement):
+    """Nodes of a statement that always evaluate (skips conditional expressions, lambdas, comprehensions)."""
+    pending = [statement]
+    while pending:
+        node = pending.pop()
+        yield node
+        if isinstance(node, (ast.IfExp, ast.BoolOp, ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+                             ast.GeneratorExp)):
+            continue
+        pending.extend(ast.iter_child_nodes(node))
+
+
+def _guard(statement):
+    """(condition, exception name) for `if <cond>: raise Exc(...)`, else None."""
+    if (isinstance(statement, ast.If) and not statement.orelse and len(statement.body) == 1
+            and isinstance(statement.body[0], ast.Raise) and statement.body[0].exc is not None):
+        exc = statement.body[0].exc
+        exc = exc.func if isinstance(exc, ast.Call) else exc
+        if isinstance(exc, ast.Name):
+            return statement.test, exc.id
+    return None
+
+
+def _evaluator(condition, params):
+    """Compile a guard condition into a predicate over argument values, if it only uses safe operations."""
+    expression = ast.Expression(condition)
+    for child in ast.walk(expression):
+        if not isinstance(child, GUARD_NODES):
+            return None
+        if isinstance(child, ast.Name) and child.id not in params and child.id != "len":
+            return None
+        if isinstance(child, ast.Call) and not (isinstance(child.func, ast.Name) and child.func.id == "len"):
+            return None
+    code = compile(ast.fix_missing_locations(expression), "<guard>", "eval")
+
+    def predicate(values):
+        try:
+            return bool(eval(code, {"__builtins__": {}, "len": len}, values))
+        except Exception:
+            return None
+
+    return predicate
+
+
+class _FunctionBaseline:
+    def __init__(self, node, symbols):
+        self.node = node
+        self.name = node.name
+        self.symbols = symbols
+        args = node.args
+        required = len(args.args) - len(args.defaults)
+        self.params = args.args[:required]
+        self.types = infer_types(node, self.params)
+        self.imports = set()
+
+    @property
+    def typed(self):
+        return all(self.types.values())
+
+    @property
+    def checks_return(self):
+        """Whether the property test asserts something about the result (it only can with a known return type)."""
+        return bool(RETURN_TYPES.get(annotation_type(self.node.returns) or ""))
+
+    def body(self):
+        statements = self.node.body
+        if statements and isinstance(statements[0], ast.Expr) and isinstance(statements[0].value, ast.Constant) \
+                and isinstance(statements[0].value.value, str):
+            statements = statements[1:]
+        return statements
+
+    def call(self, values):
+        return f"{self.name}({', '.join(values[p.arg] for p in self.params)})"
+
+    def neutral(self):
+        return {p.arg: NEUTRAL[self.types[p.arg]] for p in self.params}
+
+    def candidates(self, param):
+        kind = self.types[param]
+        values = [TYPE_STRATEGIES[kind][2], *TYPE_STRATEGIES[kind][1]]
+        if kind in ("int", "float"):
+            values += ["-100", "100", "1000"] if kind == "int" else ["-100.0", "100.0"]
+        return list(dict.fromkeys(values))
+
+    def property_test(self, hypothesis: bool):
+        allowed = raised_exceptions(self.node, self.symbols) + implicit_exceptions(self.node)
+        self.imports.update(name for name in allowed if not hasattr(builtins, name))
+        allowed = list(dict.fromkeys(allowed))
+        returns = RETURN_TYPES.get(annotation_type(self.node.returns) or "")
+        names = [p.arg for p in self.params]
+
+        lines = []
+        if hypothesis:
+            strategies = ", ".join(f"{n}={TYPE_STRATEGIES[self.types[n]][0]}" for n in names)
+            lines += ["@settings(max_examples=25, deadline=None)", f"@given({strategies})"]
+            lines.append(f"def test_{self.name}_properties({', '.join(names)}):")
+        else:
+            samples = [TYPE_STRATEGIES[self.types[n]][1] for n in names]
+            rows = []
+            for i in range(max(len(s) for s in samples)):
+                # Offset each parameter so rows mix values instead of repeating the diagonal
+                row = [s[(i + j) % len(s)] for j, s in enumerate(samples)]
+                rows.append(row[0] if len(row) == 1 else f"({', '.join(row)})")
+            lines.append(f'@pytest.mark.parametrize("{", ".join(names)}", [{", ".join(rows)}])')
+            lines.append(f"def test_{self.name}_samples({', '.join(names)}):")
+
+        call = f"{self.name}({', '.join(names)})"
+        if allowed:
+            lines += ["    try:", f"        result = {call}",
+                      f"    except ({', '.join(allowed)},):", "        return"]
+        else:
+            lines.append(f"    result = {call}")
+        if returns:
+            lines.append(f"    assert isinstance(result, {returns})")
+        return "\n".join(lines)
+
+    def guard_tests(self):
+        """pytest.raises checks for leading `if <cond>: raise Exc` guards."""
+        tests, previous = [], []
+        params = {p.arg for p in self.params}
+        for statement in self.body():
+            guard = _guard(statement)
+            if guard is None:
+                break
+            condition, exc = guard
+            predicate = _evaluator(condition, params)
+            if predicate is None or not _is_exception(exc, self.symbols):
+                break
+
+            values = self._violating(predicate, previous)
+            previous.append(predicate)
+            if values is None:
+                continue
+            if not hasattr(builtins, exc):
+                self.imports.add(exc)
+            tests.append(
+                f"def test_{self.name}_raises_{exc.lower()}_{len(tests)}():\n"
+                f"    with pytest.raises({exc}):\n"
+                f"        {self.call(values)}"
+            )
+        return tests, previous
+
+    def _violating(self, predicate, previous):
+        """Arguments that trip this guard but none of the earlier ones."""
+        base = self.neutral()
+        for param in self.params:
+            for candidate in self.candidates(param.arg):
+                values = dict(base, **{param.arg: candidate})
+                evaluated = {name: eval(value, {}) for name, value in values.items()}
+                if predicate(evaluated) and not any(p(evaluated) for p in previous):
+                    return values
+        return None
+
+    def first_statement_tests(self, guards):
+        """Zero-division and empty-sequence checks on the first statement after the guards."""
+        statements = self.body()[len(guards):]
+        if not statements:
+            return []
+        neutral = self.neutral()
+        evaluated = {name: eval(value, {}) for name, value in neutral.items()}
+        if any(g(evaluated) for g in guards):
+            return []
+
+        tests = []
+        for node in unconditional_nodes(statements[0]):
+            if (isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod))
+                    and isinstance(node.right, ast.Name) and self.types.get(node.right.id) in ("int", "float")):
+                values = dict(neutral, **{node.right.id: TYPE_STRATEGIES[self.types[node.right.id]][2]})
+                tests.append(
+                    f"def test_{self.name}_zero_{node.right.id}_raises():\n"
+                    f"    with pytest.raises(ZeroDivisionError):\n"
+                    f"        {self.call(values)}"
+                )
+            elif (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+                  and self.types.get(node.value.id) in SEQUENCE_TYPES
+                  and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, int)):
+                values = dict(neutral, **{node.value.id: TYPE_STRATEGIES[self.types[node.value.id]][2]})
+                tests.append(
+                    f"def test_{self.name}_empty_{node.value.id}_raises():\n"
+                    f"    with pytest.raises(IndexError):\n"
+                    f"        {self.call(values)}"
+                )
+        return list(dict.fromkeys(tests))
+
+
+def _unsafe(node) -> bool:
+    return any(
+        (isinstance(n, ast.Name) and n.id in UNSAFE_NAMES) or isinstance(n, (ast.Global, ast.Nonlocal))
+        for n in ast.walk(node)
+    )
+
+
+def _statement_count(node) -> int:
+    return sum(1 for n in ast.walk(node) if isinstance(n, ast.stmt)) - 1
+
+
+def baseline_tests(source: str, name: str, module_name: str, symbols=(), max_statements: int = 8):
+    """
+    Deterministic pytest tests for one unit, derived from its AST with no LLM call:
+    a smoke test, a property test over the (annotated or inferred) parameter types
+    (hypothesis when installed, parametrized samples otherwise), pytest.raises checks
+    for leading `if ...: raise` guards, and zero-division / empty-sequence checks.
+    Returns (test_code, covered): covered is True when the unit is small, pure-looking
+    and fully typed and at least one test asserts on its behaviour (a return type or
+    an expected exception), so the baseline can stand in for LLM-written tests.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None, False
+    node = next((n for n in tree.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+                 and n.name == name), None)
+    if node is None:
+        return None, False
+
+    symbols = set(symbols or ())
+    tests = []
+    covered = False
+    uses_hypothesis = False
+    imports = {name}
+
+    if isinstance(node, ast.ClassDef):
+        tests.append(f"def test_{name}_is_class():\n    assert isinstance({name}, type)")
+        init = next((n for n in node.body if isinstance(n, ast.FunctionDef) and n.name == "__init__"), None)
+        required = len(init.args.args) - len(init.args.defaults) - 1 if init else 0
+        if required == 0 and not (init and _unsafe(init)):
+            tests.append(f"def test_{name}_instantiates():\n    assert {name}() is not None")
+    else:
+        tests.append(f"def test_{name}_is_callable():\n    assert callable({name})")
+        function = _FunctionBaseline(node, symbols)
+        simple = (
+            isinstance(node, ast.FunctionDef)
+            and not node.args.vararg and not node.args.kwarg and not node.args.kwonlyargs
+            and not node.args.posonlyargs
+            and not any(isinstance(n, (ast.Yield, ast.YieldFrom, ast.FunctionDef, ast.Lambda)) for n in ast.walk(node)
+                        if n is not node)
+            and not _unsafe(node)
+        )
+        if simple and function.typed:
+            behavioural, asserting = [], []
+            if function.params:
+                uses_hypothesis = importlib.util.find_spec("hypothesis") is not None
+                behavioural.append(function.property_test(uses_hypothesis))
+                if function.checks_return:
+                    asserting.append(behavioural[-1])
+            guards, predicates = function.guard_tests()
+            checks = guards + function.first_statement_tests(predicates)
+            behavioural += checks
+            asserting += checks
+            tests += behavioural
+            imports |= function.imports
+            # A test that only calls the unit proves nothing about it: those units still go to the LLM
+            covered = bool(asserting) and _statement_count(node) <= max_statements
+
+    header = ["import pytest"]
+    if uses_hypothesis:
+        header.append("from hypothesis import given, settings, strategies as st")
+    header.append(f"from {module_name} import {', '.join(sorted(imports))}")
+    return "\n".join(header) + "\n\n\n" + "\n\n\n".join(tests) + "\n", covered
@@ -0,0 +1,182 @@
+import datetime
+import hashlib
+import threading
+import time
+from utils.llm_scheduler import estimate_tokens
+from utils.tracing import current_span
+
+
+def module_context(source_code: str, module_name: str) -> str:
+    """
+    Static prefix shared by every prompt about one module. It must be byte-identical
+    across stages and retries to be served from the provider's cache.
+    """
+    return (
+        f"You are helping test the Python module `{module_name}`. Its full source code follows; "
+        f"every later request about `{module_name}` refers to it.\n\n"
+        f"=== MODULE SOURCE ({module_name}.py) ===\n{source_code}"
+    )
+
+
+class ContextHandle:
+    """A prefix registered with the provider; `client` generates with that prefix prepended."""
+
+    def __init__(self, key: str, model: str, prefix: str, resource, client, expires_at: float):
+        self.key = key
+        self.model = model
+        self.prefix = prefix
+        self.resource = resource
+        self.client = client
+        self.expires_at = expires_at
+        self.tokens = estimate_tokens(prefix)
+
+
+class GeminiContextBackend:
+    """Gemini explicit context caching (google.generativeai.caching.CachedContent)."""
+
+    def __init__(self):
+        from google.generativeai import caching
+        import google.generativeai as genai
+
+        self._caching = caching
+        self._genai = genai
+
+    def create(self, model: str, prefix: str, ttl: float):
+        """Register prefix; returns (resource, client, expiry as a UNIX time)."""
+        resource = self._caching.CachedContent.create(
+            model=f"models/{model.split('/')[-1]}",
+            display_name=f"pytestcrew-{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:12]}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return resource, self._genai.GenerativeModel.from_cached_content(cached_content=resource), \
+            self._expiry(resource, ttl)
+
+    def extend(self, resource, ttl: float) -> float:
+        resource.update(ttl=datetime.timedelta(seconds=ttl))
+        return self._expiry(resource, ttl)
+
+    def delete(self, resource):
+        resource.delete()
+
+    @staticmethod
+    def _expiry(resource, ttl: float) -> float:
+        expire_time = getattr(resource, "expire_time", None)
+        return expire_time.timestamp() if hasattr(expire_time, "timestamp") else time.time() + ttl
+
+
+class ContextCache:
+    """
+    Registry of prefixes cached on the provider side, keyed by model and prefix
+    hash, so a prefix is registered once and referenced by every later call. An
+    entry is extended (or registered again) when it is used within
+    `refresh_margin` seconds of its expiry. Prefixes shorter than `min_tokens`
+    (the provider's minimum), and prefixes whose registration just failed, get
+    no handle: callers then send the full prompt instead. So do calls whose
+    inline alternative is cheaper than the prefix at the cached-token rate
+    (`cached_token_cost`, a fraction of the normal input price; 0 always caches).
+    """
+
+    def __init__(self, backend, ttl: float = 600, min_tokens: int = 1024, refresh_margin: float = 60,
+                 retry_after: float = 300, cached_token_cost: float = 0.25):
+        self.backend = backend
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.cached_token_cost = cached_token_cost
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._entries = {}
+        self._failed = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = self.creates = self.failures = 0
+
+    @staticmethod
+    def make_key(model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\0{prefix}".encode("utf-8")).hexdigest()[:16]
+
+    def get(self, model: str, prefix: str, inline_tokens: int | None = None):
+        """
+        The handle for prefix, registering or extending it as needed; None when it
+        can't be cached or when inline_tokens (what the call would send instead) cost less.
+        """
+        tokens = estimate_tokens(prefix)
+        if tokens < self.min_tokens:
+            return None
+        if inline_tokens is not None and inline_tokens < self.cached_token_cost * tokens:
+            return None
+        key = self.make_key(model, prefix)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Concurrent first uses of one prefix wait for a single registration
+        with key_lock:
+            now = time.time()
+            handle = self._entries.get(key)
+            if handle is not None and handle.expires_at - self.refresh_margin > now:
+                self.hits += 1
+                return handle
+            if self._failed.get(key, 0) > now:
+                return None
+            try:
+                if handle is not None and handle.expires_at > now:
+                    handle.expires_at = self.backend.extend(handle.resource, self.ttl)
+                else:
+                    resource, client, expires_at = self.backend.create(model, prefix, self.ttl)
+                    handle = ContextHandle(key, model, prefix, resource, client, expires_at)
+                    self.creates += 1
+                    current_span().set(context_registered=handle.tokens)
+            except Exception as e:
+                self.failures += 1
+                self._failed[key] = now + self.retry_after
+                self._entries.pop(key, None)
+                print(f"⚠️ Context caching unavailable, sending full prompts: {e}")
+                return None
+            self._entries[key] = handle
+            return handle
+
+    def invalidate(self, handle: ContextHandle):
+        """Forget a handle the provider no longer knows (e.g. it expired early)."""
+        with self._lock:
+            if self._entries.get(handle.key) is handle:
+                del self._entries[handle.key]
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "creates": self.creates,
+                "failures": self.failures}
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_context_cache(config: dict):
+    """
+    Process-wide ContextCache for Gemini, or None when disabled (`context_cache`,
+    on by default) or when the installed SDK has no caching support.
+    """
+    if not config.get("context_cache", True):
+        return None
+    ttl = float(config.get("context_cache_ttl", 600))
+    min_tokens = int(config.get("context_cache_min_tokens", 1024))
+    cost = float(config.get("context_cache_cost", 0.25))
+    with _shared_lock:
+        key = (ttl, min_tokens, cost)
+        if key not in _shared_caches:
+            try:
+                _shared_caches[key] = ContextCache(GeminiContextBackend(), ttl=ttl, min_tokens=min_tokens,
+                                                   cached_token_cost=cost)
+            except ImportError as e:
+                print(f"⚠️ Context caching disabled: {e}")
+                _shared_caches[key] = None
+        return _shared_caches[key]
+
+
+def cached_context(llm, source_code: str, module_name: str, inline: str | None = None):
+    """
+    The module's registered context on llm, or None when llm or the provider can't
+    cache it, or when `inline` (the source the prompt would carry instead) is cheaper.
+    """
+    register = getattr(llm, "cached_context", None)
+    if register is None:
+        return None
+    return register(module_context(source_code, module_name), None if inline is None else estimate_tokens(inline))
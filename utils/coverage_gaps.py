@@ -0,0 +1,62 @@
+import ast
+
+
+def unit_ranges(source_code: str):
+    """(name, first line, last line) of every top-level function and class, decorators included."""
+    try:
+        tree = ast.parse(source_code)
+    except SyntaxError:
+        return []
+    return [
+        (node.name, min([node.lineno] + [d.lineno for d in node.decorator_list]), node.end_lineno)
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+
+
+def uncovered_by_unit(source_code: str, coverage: dict):
+    """
+    Group the missing lines and branches of a coverage record by the top-level
+    function or class containing them: {name: {"lines": [...], "branches": [[from, to], ...]}}.
+    Module-level code outside any unit is ignored.
+    """
+    ranges = unit_ranges(source_code)
+
+    def owner(line):
+        return next((name for name, start, end in ranges if start <= line <= end), None)
+
+    gaps = {}
+    for line in coverage.get("missing_lines", []):
+        name = owner(line)
+        if name:
+            gaps.setdefault(name, {"lines": [], "branches": []})["lines"].append(line)
+    for source, target in coverage.get("missing_branches", []):
+        name = owner(source)
+        # A branch whose target line is itself missing is already reported as a line
+        if name and target not in coverage.get("missing_lines", []):
+            gaps.setdefault(name, {"lines": [], "branches": []})["branches"].append([source, target])
+    return gaps
+
+
+def format_gaps(source_code: str, gaps: dict) -> str:
+    """Only the uncovered lines (numbered) and the branches never taken, for a prompt."""
+    lines = source_code.splitlines()
+
+    def text(number):
+        return lines[number - 1].strip() if 0 < number <= len(lines) else ""
+
+    parts = [f"L{number}: {text(number)}" for number in gaps.get("lines", [])]
+    for source, target in gaps.get("branches", []):
+        where = "exit the function" if target < 0 else f"go to L{target}: {text(target)}"
+        parts.append(f"L{source}: {text(source)}  -> never took the branch to {where}")
+    return "\n".join(parts)
+
+
+def describe_coverage(coverage: dict | None) -> str:
+    if not coverage:
+        return "Coverage: not measured"
+    branches = ""
+    if coverage.get("num_branches"):
+        branches = f", branches {coverage['covered_branches']}/{coverage['num_branches']}"
+    return (f"Coverage: {coverage['percent']:.1f}% "
+            f"(lines {coverage['covered_lines']}/{coverage['num_statements']}{branches})")
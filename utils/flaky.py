@@ -0,0 +1,204 @@
+import ast
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.merging import is_test_definition, replace_definitions, source_segment
+from utils.progress import listening
+from utils.pytest_plugin import definition_outcomes
+from utils.test_runner import run_pytest
+from utils.tracing import current_span, propagate, traced
+
+DEFAULT_PATH = ".pytestcrew/flaky.json"
+
+
+def test_fingerprints(test_code: str, units=()):
+    """
+    Fingerprint of every top-level test in test_code, from its AST, the file's
+    supporting code (imports, fixtures, helpers) and the fingerprints of the
+    analyzed units it references. A test keeps its fingerprint, and so its
+    verdict, until it or the code it exercises changes.
+    """
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return {}
+    support = hashlib.sha256()
+    for node in tree.body:
+        if not is_test_definition(node):
+            support.update(ast.dump(node, include_attributes=False).encode("utf-8"))
+    unit_fingerprints = {unit["name"]: unit.get("fingerprint") or "" for unit in units}
+
+    fingerprints = {}
+    for node in tree.body:
+        if not is_test_definition(node):
+            continue
+        used = {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+        used |= {n.attr for n in ast.walk(node) if isinstance(n, ast.Attribute)}
+        digest = hashlib.sha256(support.digest())
+        digest.update(ast.dump(node, include_attributes=False).encode("utf-8"))
+        for name in sorted(used & set(unit_fingerprints)):
+            digest.update(f"{name}:{unit_fingerprints[name]}".encode("utf-8"))
+        fingerprints[node.name] = digest.hexdigest()[:16]
+    return fingerprints
+
+
+def quarantine(test_code: str, flaky: dict) -> str:
+    """Mark each test named in flaky ({name: reason}) as skipped, so it no longer turns the suite red."""
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return test_code
+    lines = test_code.splitlines()
+    replacements = {}
+    for node in tree.body:
+        if is_test_definition(node) and node.name in flaky:
+            indent = " " * node.col_offset
+            marker = f"{indent}@pytest.mark.skip(reason={'Quarantined as flaky: ' + flaky[node.name]!r})"
+            replacements[node.name] = f"{marker}\n{source_segment(lines, node)}"
+    if not replacements:
+        return test_code
+    return replace_definitions(test_code, replacements, ["import pytest"])
+
+
+class FlakyVerdicts:
+    """
+    Verdicts ("stable" or "flaky") of checked tests, keyed by test fingerprint
+    and shared by every module and run. Stored as JSON; the oldest verdicts are
+    dropped beyond max_entries.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.verdicts = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.verdicts = json.load(f).get("verdicts", {})
+            except (OSError, ValueError):
+                pass  # a corrupt store only costs re-checking
+
+    def get(self, fingerprint: str):
+        with self._lock:
+            return self.verdicts.get(fingerprint)
+
+    def record(self, verdicts: dict):
+        """Store {fingerprint: verdict record} and save."""
+        with self._lock:
+            self.verdicts.update(verdicts)
+            if len(self.verdicts) > self.max_entries:
+                oldest = sorted(self.verdicts, key=lambda key: self.verdicts[key].get("checked_at", ""))
+                for key in oldest[:len(self.verdicts) - self.max_entries]:
+                    del self.verdicts[key]
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Written whole and renamed, so concurrent readers never see half a file
+            temporary = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump({"verdicts": self.verdicts}, f, indent=2, sort_keys=True)
+            os.replace(temporary, self.path)
+
+
+_shared_stores = {}
+_shared_lock = threading.Lock()
+
+
+def get_flaky_verdicts(config: dict):
+    """Process-wide FlakyVerdicts for the configured path, or None when caching is off (`flaky_cache`)."""
+    if not config.get("flaky_cache", True):
+        return None
+    path = config.get("flaky_cache_path", DEFAULT_PATH)
+    with _shared_lock:
+        if path not in _shared_stores:
+            _shared_stores[path] = FlakyVerdicts(path)
+        return _shared_stores[path]
+
+
+class FlakyDetector:
+    """
+    Finds flaky tests by running them `runs` times, up to `workers` runs at a
+    time on the given pytest pool, each run in its own shuffled order with its
+    own `random` seeds. A test that both passes and fails across those runs and
+    the run being checked is flaky. One that always passes is stable. One that
+    always fails is a real failure, which gets no verdict. Verdicts are cached by
+    test fingerprint, so a test that was already checked is not run again.
+    """
+
+    def __init__(self, pool=None, runs: int = 5, workers: int = 2, timeout: float = 20,
+                 test_timeout: float | None = None, verdicts: FlakyVerdicts | None = None):
+        self.pool = pool
+        self.runs = runs
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.test_timeout = test_timeout
+        self.verdicts = verdicts
+
+    @traced("flaky")
+    def check(self, test_file: str, fingerprints: dict, observed: dict | None = None, names=None):
+        """
+        Check the tests in names (default: every test in fingerprints, {name:
+        fingerprint}). observed holds the outcomes of the run being checked (see
+        definition_outcomes) and counts as one more run. Returns flaky ({name:
+        reason}), stable (names), checked (names run now), cached (names with a
+        cached verdict), the seeds used and the wall time.
+        """
+        started = time.perf_counter()
+        observed = observed or {}
+        names = [name for name in (names if names is not None else fingerprints) if name in fingerprints]
+        flaky, stable, pending, cached = {}, [], [], []
+        for name in names:
+            verdict = self.verdicts.get(fingerprints[name]) if self.verdicts is not None else None
+            if verdict is None:
+                pending.append(name)
+                continue
+            cached.append(name)
+            if verdict["verdict"] == "flaky":
+                flaky[name] = verdict["reason"]
+            else:
+                stable.append(name)
+
+        seeds = [random.randrange(2 ** 31) for _ in range(self.runs)] if pending else []
+        if seeds:
+            def run(seed):
+                # Internal reruns: keep their test events away from the progress listener
+                with listening(None):
+                    result = run_pytest(test_file, pool=self.pool, timeout=self.timeout,
+                                        test_timeout=self.test_timeout, select=pending, shuffle_seed=seed)
+                return definition_outcomes(result["tests"])
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(seeds))) as executor:
+                runs = list(executor.map(propagate(run), seeds))
+
+            now = datetime.now().isoformat(timespec="seconds")
+            new_verdicts = {}
+            for name in pending:
+                tally = Counter(outcomes[name] for outcomes in runs + [observed] if name in outcomes)
+                if tally["passed"] and tally["failed"]:
+                    reason = f"failed {tally['failed']} of {tally['passed'] + tally['failed']} shuffled runs"
+                    flaky[name] = reason
+                    new_verdicts[fingerprints[name]] = {"verdict": "flaky", "reason": reason, "checked_at": now}
+                elif tally["passed"]:
+                    stable.append(name)
+                    new_verdicts[fingerprints[name]] = {"verdict": "stable", "runs": tally["passed"],
+                                                        "checked_at": now}
+            if self.verdicts is not None and new_verdicts:
+                self.verdicts.record(new_verdicts)
+
+        current_span().set(tests=len(names), checked=len(pending), cached=len(cached), flaky=len(flaky),
+                           runs=len(seeds))
+        return {
+            "flaky": flaky,
+            "stable": sorted(stable),
+            "checked": sorted(pending),
+            "cached": sorted(cached),
+            "seeds": seeds,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
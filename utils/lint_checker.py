@@ -1,16 +1,155 @@
 import ast
+import builtins
+import importlib.util
+import re
+import symtable
 
-def check_code_style(code: str):
+PLACEHOLDER_PATTERNS = [
+    (re.compile(r"#\s*Error generating tests"), "LLM error placeholder instead of tests"),
+    (re.compile(r"#\s*Tests for \w+ could not be parsed"), "unparseable generated tests were dropped"),
+    (re.compile(r"Summary generation failed"), "analyzer error text leaked into the tests"),
+    (re.compile(r"\b(your_module|your_function)\b"), "template placeholder name"),
+]
+
+MODULE_GLOBALS = {"__name__", "__file__", "__doc__", "__spec__", "__loader__", "__package__", "__builtins__"}
+
+
+def _issue(kind: str, message: str, line: int | None = None):
+    return {"kind": kind, "line": line, "message": message}
+
+
+def validate_tests(code: str, analysis: dict | None = None, module_name: str | None = None):
     """
-    Minimal Python syntax / lint check using ast.parse.
+    Static validation of generated pytest code, cheapest checks first:
+    placeholders, syntax, test count, imports from the module under test
+    (against the analyzer's symbols), importability of other modules and
+    undefined names. Returns a list of issues: {"kind", "line", "message"}.
+    """
+    issues = []
+
+    for number, line in enumerate(code.splitlines(), start=1):
+        for pattern, reason in PLACEHOLDER_PATTERNS:
+            if pattern.search(line):
+                issues.append(_issue("placeholder", f"{reason}: {line.strip()[:80]}", number))
+                break
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        issues.append(_issue("syntax", f"SyntaxError: {e.msg}", e.lineno))
+        return issues
+
+    if not _count_tests(tree):
+        issues.append(_issue("no-tests", "no test_ functions or Test classes found"))
+
+    symbols = set((analysis or {}).get("symbols") or [])
+    if not symbols and analysis:
+        symbols = {f["name"] for f in analysis.get("functions", [])} | {c["name"] for c in analysis.get("classes", [])}
+    issues.extend(_check_imports(tree, symbols, module_name))
+    issues.extend(_check_undefined_names(code, tree))
+    return issues
+
+
+def _count_tests(tree: ast.Module) -> int:
+    count = 0
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            count += 1
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            count += sum(
+                1 for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child.name.startswith("test")
+            )
+    return count
+
+
+def _check_imports(tree: ast.Module, symbols: set, module_name: str | None):
+    issues = []
+    module_aliases = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            if node.module == module_name:
+                for alias in node.names:
+                    if symbols and alias.name != "*" and alias.name not in symbols:
+                        issues.append(_issue("unknown-import",
+                                             f"{module_name} has no symbol '{alias.name}'", node.lineno))
+            elif not _resolvable(node.module):
+                issues.append(_issue("missing-module", f"cannot import module '{node.module}'", node.lineno))
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == module_name:
+                    module_aliases.add(alias.asname or alias.name)
+                elif not _resolvable(alias.name):
+                    issues.append(_issue("missing-module", f"cannot import module '{alias.name}'", node.lineno))
+
+    # `import mod` followed by `mod.missing(...)`
+    if symbols and module_aliases:
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+                    and node.value.id in module_aliases and node.attr not in symbols):
+                issues.append(_issue("unknown-import", f"{module_name} has no symbol '{node.attr}'", node.lineno))
+    return issues
+
+
+def _resolvable(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _check_undefined_names(code: str, tree: ast.Module):
+    """Names read somewhere but bound nowhere (module scope or builtins), via symtable."""
+    if any(isinstance(n, ast.ImportFrom) and any(a.name == "*" for a in n.names) for n in ast.walk(tree)):
+        return []  # star imports make every name potentially defined
+
+    try:
+        table = symtable.symtable(code, "<generated tests>", "exec")
+    except SyntaxError:
+        return []
+
+    defined = {
+        sym.get_name() for sym in table.get_symbols()
+        if sym.is_assigned() or sym.is_imported() or sym.is_namespace()
+    } | set(dir(builtins)) | MODULE_GLOBALS
+
+    undefined = set()
+    pending = [table]
+    while pending:
+        scope = pending.pop()
+        pending.extend(scope.get_children())
+        for sym in scope.get_symbols():
+            if not sym.is_referenced() or sym.get_name() in defined:
+                continue
+            if scope is table or sym.is_global():
+                undefined.add(sym.get_name())
+
+    if not undefined:
+        return []
+
+    first_use = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in undefined:
+            first_use[node.id] = min(first_use.get(node.id, node.lineno), node.lineno)
+    return [_issue("undefined-name", f"name '{name}' is not defined", first_use.get(name))
+            for name in sorted(undefined)]
+
+
+def format_issue(issue: dict) -> str:
+    where = f"line {issue['line']}: " if issue.get("line") else ""
+    return f"{where}[{issue['kind']}] {issue['message']}"
+
+
+def check_code_style(code: str, analysis: dict | None = None, module_name: str | None = None):
+    """
+    Static validation of generated test code (see validate_tests).
     Returns:
         - passed: bool
         - issues: list[str]
     """
     try:
-        ast.parse(code)
-        return True, []
-    except SyntaxError as e:
-        return False, [f"SyntaxError: {e}"]
+        issues = validate_tests(code, analysis, module_name)
     except Exception as e:
         return False, [f"Error: {e}"]
+    return not issues, [format_issue(issue) for issue in issues]
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """
+    Disk-backed, content-addressed cache for LLM responses.
+    Entries are keyed by model, temperature, stop words and a hash of the prompt,
+    and evicted least-recently-used once the cache exceeds its size or age limits.
+    """
+
+    def __init__(self, path: str = ".llm_cache/responses.sqlite",
+                 max_bytes: int = 64 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, stop, prompt: str) -> str:
+        """Build a stable cache key from the call parameters and a hash of the prompt."""
+        payload = json.dumps({
+            "model": model,
+            "temperature": float(temperature),
+            "stop": list(stop or []),
+            "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached response for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        if self.max_age:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.max_age,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+def build_llm_cache(config: dict):
+    """Create an LLMCache from workflow config, or None when caching is disabled."""
+    if not config.get("llm_cache", True):
+        return None
+
+    cache_dir = config.get("llm_cache_dir", ".llm_cache")
+    return LLMCache(
+        path=os.path.join(cache_dir, "responses.sqlite"),
+        max_bytes=int(config.get("llm_cache_max_bytes", 64 * 1024 * 1024)),
+        max_age=float(config.get("llm_cache_max_age", 7 * 24 * 3600)),
+    )
@@ -1,14 +1,60 @@
 import os
+import threading
+import time
+from contextlib import nullcontext
 import google.generativeai as genai
 from crewai import LLM
+from utils.context_cache import ContextCache, ContextHandle, get_context_cache
+from utils.llm_cache import LLMCache, build_llm_cache
+from utils.model_router import ModelRouter
+from utils.run_history import get_run_history
+from utils.tracing import current_span, span
+from utils.llm_scheduler import PRIORITIES, PRIORITY_BATCH, RateLimitScheduler, estimate_tokens, get_scheduler
+from utils.usage import record_llm_call
+
+# One GenerativeModel per model name, so every GeminiLLM shares the same
+# underlying (sync and async) transport and its connection pool
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+
+def is_missing_context(error: Exception) -> bool:
+    """True when a call failed because its cached context is gone (expired, deleted or not visible)."""
+    return getattr(error, "code", None) in (403, 404) or type(error).__name__ in ("NotFound", "PermissionDenied")
+
+
+def _shared_model(model_name: str):
+    with _shared_models_lock:
+        if model_name not in _shared_models:
+            _shared_models[model_name] = genai.GenerativeModel(model_name=model_name)
+        return _shared_models[model_name]
+
+
+class LLMResponse:
+    """Minimal response object mirroring the `.text` attribute of Gemini responses."""
+
+    def __init__(self, text: str):
+        self.text = text
 
 
 class GeminiLLM:
     """Wrapper to make Google's Gemini LLM compatible with CrewAI agents."""
 
-    def __init__(self, model: str = "gemini-2.5-flash", temperature: float = 0.3, api_key: str | None = None):
+    def __init__(self, model: str = "gemini-2.5-flash", temperature: float = 0.3, api_key: str | None = None,
+                 cache: LLMCache | None = None, max_concurrency: int | None = None,
+                 scheduler: RateLimitScheduler | None = None, priority: int = PRIORITY_BATCH,
+                 expected_output_tokens: int = 1024, context_cache: ContextCache | None = None):
         self.model = model
         self.temperature = temperature
+        self.cache = cache
+        # Rate limits, retries and priority lanes shared by every client in the process
+        self.scheduler = scheduler
+        self.priority = priority
+        self.expected_output_tokens = expected_output_tokens
+        # Caps in-flight requests when one client is shared by many pipelines (cache hits don't count)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        # Provider-side prefix caching for prompts sharing a module's source (None: always send full prompts)
+        self.context_cache = context_cache
 
         # Use provided key or fall back to environment
         if api_key:
@@ -20,14 +66,199 @@ class GeminiLLM:
 
         # Configure the Gemini client
         genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel(model_name=self.model)
-
-    def __call__(self, prompt: str) -> str:
-        """Direct call interface for LLM."""
-        response = self.client.generate_content(
-            prompt,
-            generation_config={"temperature": self.temperature},
-        )
+        self.client = _shared_model(self.model)
+
+    def __call__(self, prompt: str, use_cache: bool = True) -> str:
+        """Direct call interface for LLM. Pass use_cache=False to bypass the response cache."""
+        return self._complete(prompt, use_cache=use_cache)
+
+    def generate_content(self, prompt: str, generation_config: dict | None = None, use_cache: bool = True,
+                         priority: int | None = None, on_chunk=None, context: ContextHandle | None = None):
+        """
+        Gemini-style interface used by the agents; returns an object with `.text`.
+        With on_chunk, the response is streamed and on_chunk(text) is called with
+        each piece as it arrives (a cached response arrives as one piece).
+        With a context from `cached_context`, the prompt is sent after that cached
+        prefix instead of on its own.
+        """
+        temperature = (generation_config or {}).get("temperature", self.temperature)
+        return LLMResponse(self._complete(prompt, temperature=temperature, use_cache=use_cache, priority=priority,
+                                          on_chunk=on_chunk, context=context))
+
+    def cached_context(self, prefix: str, inline_tokens: int | None = None) -> ContextHandle | None:
+        """Register prefix with the provider's context cache (once) and return its handle, or None."""
+        if self.context_cache is None:
+            return None
+        return self.context_cache.get(self.model, prefix, inline_tokens)
+
+    def _complete(self, prompt: str, stop=None, temperature: float | None = None, use_cache: bool = True,
+                  priority: int | None = None, on_chunk=None, context: ContextHandle | None = None) -> str:
+        """Serve the prompt from the cache when possible, otherwise call Gemini and store the result."""
+        temperature = self.temperature if temperature is None else temperature
+
+        with span("llm.call", model=self.model, temperature=temperature, prompt_chars=len(prompt),
+                  prompt_tokens=estimate_tokens(prompt), context_tokens=context.tokens if context else None) as s:
+            key = None
+            if self.cache is not None and use_cache:
+                key = LLMCache.make_key(self.model, temperature, stop,
+                                        f"[context {context.key}]\n{prompt}" if context else prompt)
+                cached = self.cache.get(key)
+                s.set(cache_hit=cached is not None)
+                if cached is not None:
+                    s.set(response_chars=len(cached))
+                    record_llm_call(estimate_tokens(prompt), estimate_tokens(cached), cache_hit=True)
+                    if on_chunk is not None:
+                        on_chunk(cached)
+                    return cached
+
+            try:
+                text = self._generate(prompt, temperature, priority, on_chunk, context)
+            except Exception as e:
+                if context is None or not is_missing_context(e):
+                    raise
+                # The provider dropped the prefix (e.g. it expired early): send it inline this time
+                self.context_cache.invalidate(context)
+                s.set(context_fallback=True)
+                text = self._generate(f"{context.prefix}\n\n{prompt}", temperature, priority, on_chunk)
+            if stop:
+                for word in stop:
+                    text = text.split(word)[0]
+
+            if key is not None:
+                self.cache.set(key, text)
+            s.set(response_chars=len(text))
+            return text
+
+    def _generate(self, prompt: str, temperature: float, priority: int | None = None, on_chunk=None,
+                  context: ContextHandle | None = None) -> str:
+        if on_chunk is not None:
+            return self._generate_stream(prompt, temperature, priority, on_chunk, context)
+        client = context.client if context is not None else self.client
+
+        def request():
+            return client.generate_content(
+                prompt,
+                generation_config={"temperature": temperature},
+            )
+
+        with self._slots or nullcontext():
+            if self.scheduler is not None:
+                response = self.scheduler.call(request, self._token_cost(prompt, context), self._priority(priority))
+            else:
+                response = request()
+        text = self._response_text(response)
+        self._record_usage(response, prompt, text, context)
+        return text
+
+    def _generate_stream(self, prompt: str, temperature: float, priority: int | None, on_chunk,
+                         context: ContextHandle | None = None) -> str:
+        client = context.client if context is not None else self.client
+
+        def request():
+            return client.generate_content(
+                prompt,
+                generation_config={"temperature": temperature},
+                stream=True,
+            )
+
+        parts = []
+        started = time.perf_counter()
+        # The slot is held until the last chunk: the request is in flight until then
+        with self._slots or nullcontext():
+            if self.scheduler is not None:
+                response = self.scheduler.call(request, self._token_cost(prompt, context), self._priority(priority))
+            else:
+                response = request()
+            for text in self.stream_chunks(response):
+                if not parts:
+                    current_span().set(first_chunk_s=round(time.perf_counter() - started, 4))
+                parts.append(text)
+                on_chunk(text)
+        text = "".join(parts)
+        # Token counts are reported on the response once it has been fully iterated
+        self._record_usage(response, prompt, text, context)
+        return text
+
+    @staticmethod
+    def stream_chunks(response):
+        """Yield the text of each chunk of a streamed Gemini response as it arrives."""
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:  # e.g. a final chunk carrying only the finish reason
+                continue
+            if text:
+                yield text
+
+    # === Async interface ===
+    async def agenerate(self, prompt: str, temperature: float | None = None, use_cache: bool = True,
+                        priority: int | None = None) -> str:
+        """Async counterpart of __call__, sharing the cache and scheduler."""
+        temperature = self.temperature if temperature is None else temperature
+
+        with span("llm.call", model=self.model, temperature=temperature, prompt_chars=len(prompt),
+                  prompt_tokens=estimate_tokens(prompt), mode="async") as s:
+            key = None
+            if self.cache is not None and use_cache:
+                key = LLMCache.make_key(self.model, temperature, None, prompt)
+                cached = self.cache.get(key)
+                s.set(cache_hit=cached is not None)
+                if cached is not None:
+                    s.set(response_chars=len(cached))
+                    record_llm_call(estimate_tokens(prompt), estimate_tokens(cached), cache_hit=True)
+                    return cached
+
+            def request():
+                return self.client.generate_content_async(
+                    prompt,
+                    generation_config={"temperature": temperature},
+                )
+
+            if self.scheduler is not None:
+                response = await self.scheduler.call_async(request, self._token_cost(prompt),
+                                                           self._priority(priority))
+            else:
+                response = await request()
+            text = self._response_text(response)
+            self._record_usage(response, prompt, text)
+
+            if key is not None:
+                self.cache.set(key, text)
+            s.set(response_chars=len(text))
+            return text
+
+    async def agenerate_content(self, prompt: str, generation_config: dict | None = None, use_cache: bool = True,
+                                priority: int | None = None):
+        temperature = (generation_config or {}).get("temperature", self.temperature)
+        return LLMResponse(await self.agenerate(prompt, temperature, use_cache, priority))
+
+    def _token_cost(self, prompt: str, context: ContextHandle | None = None) -> int:
+        # Cached prefix tokens still count towards the tokens-per-minute quota
+        return estimate_tokens(prompt) + (context.tokens if context else 0) + self.expected_output_tokens
+
+    def _priority(self, priority: int | None) -> int:
+        return self.priority if priority is None else priority
+
+    @staticmethod
+    def _record_usage(response, prompt: str, text: str, context: ContextHandle | None = None):
+        """
+        Attach the provider-reported token counts, when present, to the current span,
+        and add the call to the run's usage meter (estimating counts the provider didn't report).
+        Prompt tokens include those served from a cached context, which are also counted separately.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None) if usage is not None else None
+        response_tokens = getattr(usage, "candidates_token_count", None) if usage is not None else None
+        cached_tokens = getattr(usage, "cached_content_token_count", None) if usage is not None else None
+        if usage is not None:
+            current_span().set(prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+                               cached_tokens=cached_tokens)
+        context_tokens = context.tokens if context is not None else 0
+        record_llm_call(prompt_tokens or estimate_tokens(prompt) + context_tokens,
+                        response_tokens or estimate_tokens(text), cached_tokens=cached_tokens or context_tokens)
+
+    @staticmethod
+    def _response_text(response) -> str:
         if hasattr(response, "text"):
             return response.text
         elif hasattr(response, "candidates") and response.candidates:
@@ -39,18 +270,19 @@ class GeminiLLM:
         """Return a callable suitable for CrewAI agents."""
         stop_words = kwargs.get("stop", None)
 
-        def bound(prompt: str):
-            response = self(prompt)
-            if stop_words:
-                for word in stop_words:
-                    response = response.split(word)[0]
+        def bound(prompt: str, use_cache: bool = True):
+            response = self._complete(prompt, stop=stop_words, use_cache=use_cache)
             return response.strip()
 
         return bound
 
 
-def create_llm(config: dict):
-    """Factory function for CrewAI-style LLM injection using Gemini."""
+def create_gemini(config: dict):
+    """
+    Build the cached GeminiLLM client described by the workflow config. With several
+    `gemini_models` (fastest first) it is a ModelRouter over one client per model,
+    sharing the response cache, scheduler and context cache.
+    """
     model_name = config.get("gemini_model", "gemini-2.5-flash")
     temperature = float(config.get("temperature", 0.3))
     api_key = config.get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
@@ -58,11 +290,35 @@ def create_llm(config: dict):
     if not api_key:
         raise ValueError("GEMINI_API_KEY is required")
 
-    gemini = GeminiLLM(model=model_name, temperature=temperature, api_key=api_key)
+    max_concurrency = config.get("llm_concurrency")
+    priority = config.get("llm_priority", "batch")
+    models = config.get("gemini_models") or []
+    if isinstance(models, str):
+        models = [m.strip() for m in models.split(",") if m.strip()]
+
+    cache = build_llm_cache(config)
+    context_cache = get_context_cache(config)
+
+    def client(model: str) -> GeminiLLM:
+        return GeminiLLM(model=model, temperature=temperature, api_key=api_key, cache=cache,
+                         max_concurrency=int(max_concurrency) if max_concurrency else None,
+                         scheduler=get_scheduler(config) if config.get("llm_scheduler", True) else None,
+                         priority=PRIORITIES.get(priority, PRIORITY_BATCH) if isinstance(priority, str)
+                         else int(priority),
+                         context_cache=context_cache)
+
+    if len(models) < 2:
+        return client(models[0] if models else model_name)
+    return ModelRouter({model: client(model) for model in models},
+                       history=get_run_history(config) if config.get("model_routing_history", True) else None)
+
+
+def create_llm(config: dict, gemini=None):
+    """Factory function for CrewAI-style LLM injection using Gemini (or an existing client)."""
+    gemini = gemini or create_gemini(config)
 
     # Create CrewAI LLM wrapper — remove provider argument
     return LLM(
-        model=model_name,
+        model=gemini.model,
         call_fn=gemini.bind()
     )
-
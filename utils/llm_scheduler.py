@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from utils.tracing import current_span
+
+# Priority lanes: lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "BadGateway", "GatewayTimeout",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for tokens/min budgeting."""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits (429), transient server errors and dropped connections."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute; a None rate means unlimited."""
+
+    def __init__(self, rate_per_minute: float | None, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = capacity or rate_per_minute or 0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)."""
+        if self.rate is None:
+            return 0.0
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate is not None:
+            self.tokens -= min(amount, self.capacity)
+
+
+class RateLimitScheduler:
+    """
+    Central gate for LLM calls.
+    Enforces requests/min and tokens/min budgets with token buckets, serves waiting
+    callers by priority lane (interactive before batch, FIFO within a lane), and
+    retries rate-limit and transient errors with jittered exponential backoff.
+    A 429 pauses every lane so callers don't hammer an exhausted quota.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.retries = 0
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    # --- admission ---
+    def _try_admit(self, ticket, tokens):
+        """Admit ticket if it heads the queue and budget allows; else return seconds to wait."""
+        if self._waiting[0] != ticket:
+            return None
+        wait = max(
+            self.paused_until - time.monotonic(),
+            self.requests.time_until(1),
+            self.tokens.time_until(tokens),
+        )
+        if wait > 0:
+            return wait
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        heapq.heappop(self._waiting)
+        self._cond.notify_all()
+        return 0.0
+
+    def _abandon(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_BATCH):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0.0:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, tokens: int, priority: int = PRIORITY_BATCH):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket, tokens)
+                if wait == 0.0:
+                    return
+                # Not at the head of the queue yet: poll without blocking the event loop
+                await asyncio.sleep(min(wait, 0.05) if wait is not None else 0.05)
+        except BaseException:
+            with self._cond:
+                self._abandon(ticket)
+            raise
+
+    # --- retries ---
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential delay; rate limits also pause every lane."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if isinstance(retry_after, (int, float)):
+            delay = max(delay, float(retry_after))
+        if is_rate_limit(error):
+            with self._cond:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                self._cond.notify_all()
+        self.retries += 1
+        return delay
+
+    def call(self, fn, tokens: int, priority: int = PRIORITY_BATCH):
+        """Run fn() once admitted, retrying retryable failures."""
+        span = current_span()
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            self.acquire(tokens, priority)
+            span.add("queue_wait", round(time.perf_counter() - queued, 4))
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                span.add("retries")
+                time.sleep(self.backoff(attempt, e))
+
+    async def call_async(self, coro_fn, tokens: int, priority: int = PRIORITY_BATCH):
+        """Await coro_fn() once admitted, retrying retryable failures."""
+        span = current_span()
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            await self.acquire_async(tokens, priority)
+            span.add("queue_wait", round(time.perf_counter() - queued, 4))
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                span.add("retries")
+                await asyncio.sleep(self.backoff(attempt, e))
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+
+def get_scheduler(config: dict):
+    """Return the process-wide scheduler so every client shares one quota."""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            rpm = config.get("requests_per_minute")
+            tpm = config.get("tokens_per_minute")
+            _shared_scheduler = RateLimitScheduler(
+                requests_per_minute=float(rpm) if rpm else None,
+                tokens_per_minute=float(tpm) if tpm else None,
+                max_retries=int(config.get("llm_max_retries", 5)),
+            )
+        return _shared_scheduler
@@ -0,0 +1,50 @@
+import json
+import os
+
+
+class FingerprintManifest:
+    """
+    Maps each source unit's AST fingerprint to the test functions generated for it.
+    Stored as JSON next to the generated test file so unchanged units can reuse
+    their tests instead of being regenerated.
+    """
+
+    def __init__(self, path: str, units: dict | None = None):
+        self.path = path
+        self.units = units or {}
+
+    @classmethod
+    def for_test_file(cls, test_file: str):
+        return cls.load(f"{os.path.splitext(test_file)[0]}.manifest.json")
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f).get("units", {}))
+        except (OSError, ValueError):
+            # A corrupt manifest only costs a full regeneration
+            return cls(path)
+
+    def reusable_tests(self, unit: dict):
+        """Test names recorded for this unit if its fingerprint is unchanged, else None."""
+        entry = self.units.get(unit["name"])
+        if entry and entry.get("fingerprint") == unit.get("fingerprint") and entry.get("tests"):
+            return entry["tests"]
+        return None
+
+    def record(self, unit: dict, tests):
+        self.units[unit["name"]] = {"fingerprint": unit.get("fingerprint"), "tests": list(tests)}
+
+    def prune(self, unit_names):
+        """Forget units that no longer exist in the module."""
+        self.units = {name: entry for name, entry in self.units.items() if name in set(unit_names)}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"units": self.units}, f, indent=2, sort_keys=True)
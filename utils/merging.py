@@ -0,0 +1,165 @@
+import ast
+import re
+
+
+def strip_code_fences(text: str) -> str:
+    """Return the code inside markdown fences (joined if several), or the text unchanged."""
+    blocks = re.findall(r"```(?:python|py)?[ \t]*\n(.*?)```", text, re.S)
+    return "\n\n".join(b.strip() for b in blocks) if blocks else text.strip()
+
+
+def source_segment(lines, node) -> str:
+    """Source of a top-level statement, including any decorators."""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+def is_test_definition(node) -> bool:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return node.name.startswith("test")
+    return isinstance(node, ast.ClassDef) and node.name.startswith("Test")
+
+
+def collect_test_names(code: str):
+    """Top-level test functions and Test* classes defined in code (empty if it doesn't parse)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    return [node.name for node in tree.body if is_test_definition(node)]
+
+
+def extract_tests(code: str, names):
+    """
+    Cut the named tests out of a test module, keeping its imports and
+    supporting definitions (fixtures, helpers, constants).
+    Returns None if the code doesn't parse or any requested test is missing.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    lines = code.splitlines()
+    wanted = set(names)
+    found, parts = set(), []
+    for node in tree.body:
+        if is_test_definition(node):
+            if node.name in wanted:
+                found.add(node.name)
+                parts.append(source_segment(lines, node))
+        else:
+            parts.append(source_segment(lines, node))
+
+    if found != wanted:
+        return None
+    return "\n\n\n".join(parts) + "\n"
+
+
+def merge_test_modules(chunks, names_by_label: dict | None = None):
+    """
+    Merge several generated pytest modules into one.
+    chunks: iterable of (label, code) pairs.
+    Imports are hoisted and deduplicated, identical definitions are kept once,
+    and test names that collide with different bodies are suffixed to stay unique.
+    If names_by_label is given it is filled with the final test names per label.
+    """
+    imports, seen_imports = [], set()
+    body, seen_defs, seen_other = [], {}, set()
+
+    for label, code in chunks:
+        code = strip_code_fences(code)
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            body.append(f"# Tests for {label} could not be parsed and were skipped")
+            continue
+
+        if not tree.body and code:
+            # Comment-only output, e.g. an error placeholder; keep it visible
+            body.append(code)
+            continue
+
+        lines = code.splitlines()
+        for index, node in enumerate(tree.body):
+            text = source_segment(lines, node)
+
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                key = ast.dump(node)
+                if key not in seen_imports:
+                    seen_imports.add(key)
+                    imports.append(text)
+
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                fingerprint = ast.dump(node)
+                existing = seen_defs.get(node.name)
+                name = node.name
+                if existing is not None and (existing == fingerprint or not is_test_definition(node)):
+                    # Identical duplicate, or a shared helper/fixture: keep the first one
+                    if names_by_label is not None and is_test_definition(node):
+                        _record_name(names_by_label, label, name)
+                    continue
+                if existing is not None:
+                    name = _unique_name(node.name, seen_defs)
+                    text = re.sub(rf"\b(def|class)\s+{re.escape(node.name)}\b", rf"\1 {name}", text, count=1)
+                seen_defs[name] = fingerprint
+                if names_by_label is not None and is_test_definition(node):
+                    _record_name(names_by_label, label, name)
+                body.append(text)
+
+            elif index == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+                continue  # module docstring
+
+            elif text.strip() not in seen_other:
+                seen_other.add(text.strip())
+                body.append(text)
+
+    parts = []
+    if imports:
+        parts.append("\n".join(imports))
+    parts.extend(body)
+    return "\n\n\n".join(parts) + "\n"
+
+
+def replace_definitions(code: str, replacements: dict, new_imports=()):
+    """
+    Patch top-level functions/classes in code by name, leaving everything else
+    byte-for-byte intact. Imports not already present are added after the last import.
+    """
+    tree = ast.parse(code)
+    lines = code.splitlines()
+    existing_imports = {ast.dump(n) for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))}
+    last_import = max((n.end_lineno for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))), default=0)
+
+    targets = [
+        n for n in tree.body
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and n.name in replacements
+    ]
+    # Patch bottom-up so earlier line numbers stay valid
+    for node in sorted(targets, key=lambda n: n.lineno, reverse=True):
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        lines[start - 1:node.end_lineno] = replacements[node.name].splitlines()
+
+    added = []
+    for statement in new_imports:
+        key = ast.dump(ast.parse(statement).body[0])
+        if key not in existing_imports:
+            existing_imports.add(key)
+            added.append(statement)
+    lines[last_import:last_import] = added
+
+    return "\n".join(lines) + "\n"
+
+
+def _unique_name(name, taken):
+    suffix = 2
+    while f"{name}_{suffix}" in taken:
+        suffix += 1
+    return f"{name}_{suffix}"
+
+
+def _record_name(names_by_label, label, name):
+    # A label repeating an identical test still lists it once
+    names = names_by_label.setdefault(label, [])
+    if name not in names:
+        names.append(name)
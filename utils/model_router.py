@@ -0,0 +1,120 @@
+import ast
+import textwrap
+import threading
+from datetime import datetime
+from utils.tracing import current_span
+
+# Complexity buckets: statements plus twice the branch points of a unit
+COMPLEXITY_BUCKETS = (("small", 12), ("medium", 40), ("large", None))
+BRANCHES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith, ast.BoolOp, ast.IfExp,
+            ast.comprehension, ast.Match)
+
+# Roles that always go to the fastest model: they never fail a test run
+CHEAP_ROLES = {"summary", "review"}
+
+
+def complexity(source: str) -> str:
+    """Bucket ("small", "medium" or "large") of a unit's size and branchiness."""
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except SyntaxError:
+        return "large"
+    nodes = list(ast.walk(tree))
+    score = sum(isinstance(n, ast.stmt) for n in nodes) + 2 * sum(isinstance(n, BRANCHES) for n in nodes)
+    for bucket, limit in COMPLEXITY_BUCKETS:
+        if limit is None or score <= limit:
+            return bucket
+
+
+class ModelRouter:
+    """
+    Several clients of one provider, ordered from the fastest/cheapest model to the
+    strongest, behind the interface of the first. Summaries and reviews always use
+    the first model. Test generation for a unit starts at the model with the lowest
+    expected time to a passing unit for its complexity bucket, and each failed
+    attempt escalates one model up. The expected time from model i on is
+        E[i] = L[i] + T + (1 - p[i]) * E[i + 1],   E[last] = (L[last] + T) / p[last]
+    with L the model's mean generation latency, p its pass rate for the bucket and
+    T the time of one pytest run. Rates and latencies come from the recorded unit
+    outcomes, smoothed towards a prior (`prior_success`, and a latency doubling per
+    model) worth `prior_weight` observations until enough are recorded.
+    """
+
+    def __init__(self, clients: dict, history=None, attempt_seconds: float | None = None,
+                 prior_success: float = 0.8, prior_weight: float = 3.0, prior_latency: float = 2.0):
+        self.clients = clients
+        self.models = list(clients)
+        self.default = clients[self.models[0]]
+        self.history = history
+        self.prior_success = prior_success
+        self.prior_weight = prior_weight
+        self.prior_latency = prior_latency
+        self._stats = {}
+        self._lock = threading.Lock()
+        if history is not None:
+            for row in history.model_stats():
+                self._stats[(row["model"], row["complexity"])] = [row["attempts"], row["passes"] or 0,
+                                                                  (row["latency_s"] or 0.0) * row["attempts"]]
+            attempt_seconds = attempt_seconds or history.mean_execute_seconds()
+        self.attempt_seconds = attempt_seconds or 1.0
+
+    def __getattr__(self, name):
+        # Everything but routing behaves like the fastest model's client
+        if name == "default":
+            raise AttributeError(name)
+        return getattr(self.default, name)
+
+    def estimate(self, model: str, bucket: str):
+        """Smoothed (pass rate, mean latency) of a model on a complexity bucket."""
+        tier = self.models.index(model)
+        attempts, passes, seconds = self._stats.get((model, bucket), (0, 0, 0.0))
+        weight = self.prior_weight
+        prior_latency = self.prior_latency * 2 ** tier
+        return ((passes + self.prior_success * weight) / (attempts + weight),
+                (seconds + prior_latency * weight) / (attempts + weight))
+
+    def expected_seconds(self, bucket: str):
+        """Expected seconds to a passing unit when starting at each model (escalating on failure)."""
+        expected = [0.0] * len(self.models)
+        for tier in reversed(range(len(self.models))):
+            success, latency = self.estimate(self.models[tier], bucket)
+            cost = latency + self.attempt_seconds
+            if tier == len(self.models) - 1:
+                expected[tier] = cost / max(success, 0.01)  # retried on the strongest model
+            else:
+                expected[tier] = cost + (1 - success) * expected[tier + 1]
+        return expected
+
+    def route(self, role: str = "generate", bucket: str | None = None, escalation: int = 0):
+        """The client for one call: role "summary"/"review", or "generate" for a unit of bucket."""
+        if role in CHEAP_ROLES or len(self.models) == 1:
+            tier = 0
+        else:
+            expected = self.expected_seconds(bucket or "medium")
+            start = expected.index(min(expected))
+            tier = min(start + escalation, len(self.models) - 1)
+        current_span().set(routed_model=self.models[tier], routed_role=role, complexity=bucket)
+        return self.clients[self.models[tier]]
+
+    def record_outcomes(self, outcomes, run_id: str | None = None, module_name: str | None = None):
+        """
+        Learn from unit outcomes: dicts with model, complexity, attempt, passed and
+        latency_s. They are also stored in the run history, when there is one.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = []
+        with self._lock:
+            for outcome in outcomes:
+                stats = self._stats.setdefault((outcome["model"], outcome["complexity"]), [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += int(bool(outcome["passed"]))
+                stats[2] += outcome["latency_s"]
+                rows.append(dict(outcome, recorded_at=now, run_id=run_id, module_name=module_name))
+        if self.history is not None and rows:
+            self.history.record_units(rows)
+
+
+def route(llm, role: str = "generate", bucket: str | None = None, escalation: int = 0):
+    """The client llm routes this call to (llm itself when it isn't a ModelRouter)."""
+    router = getattr(llm, "route", None)
+    return llm if router is None else router(role, bucket, escalation)
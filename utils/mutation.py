@@ -0,0 +1,271 @@
+import ast
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.progress import emit, listening
+from utils.test_runner import run_pytest
+from utils.tracing import current_span, propagate, traced
+
+BINOP_SWAPS = {
+    ast.Add: ast.Sub, ast.Sub: ast.Add, ast.Mult: ast.Div, ast.Div: ast.Mult, ast.FloorDiv: ast.Mult,
+    ast.Mod: ast.FloorDiv, ast.Pow: ast.Mult, ast.LShift: ast.RShift, ast.RShift: ast.LShift,
+    ast.BitAnd: ast.BitOr, ast.BitOr: ast.BitAnd, ast.BitXor: ast.BitAnd,
+}
+# Off-by-one at the edge of a range
+BOUNDARY_SWAPS = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt}
+COMPARE_SWAPS = {
+    ast.Eq: ast.NotEq, ast.NotEq: ast.Eq, ast.Is: ast.IsNot, ast.IsNot: ast.Is, ast.In: ast.NotIn,
+    ast.NotIn: ast.In,
+}
+BOOLOP_SWAPS = {ast.And: ast.Or, ast.Or: ast.And}
+
+
+def _mutations(node):
+    """(operator, replacement text) for every mutation of one node; the text replaces the node's source."""
+    if isinstance(node, ast.BinOp) and type(node.op) in BINOP_SWAPS:
+        yield "arithmetic", _expression(ast.BinOp(node.left, BINOP_SWAPS[type(node.op)](), node.right))
+    elif isinstance(node, ast.AugAssign) and type(node.op) in BINOP_SWAPS:
+        yield "arithmetic", ast.unparse(ast.AugAssign(node.target, BINOP_SWAPS[type(node.op)](), node.value))
+    elif isinstance(node, ast.BoolOp):
+        yield "logical", _expression(ast.BoolOp(BOOLOP_SWAPS[type(node.op)](), node.values))
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        yield "negation", _expression(node.operand)
+    elif isinstance(node, ast.Compare):
+        for index, op in enumerate(node.ops):
+            for operator, swaps in (("boundary", BOUNDARY_SWAPS), ("comparison", COMPARE_SWAPS)):
+                if type(op) in swaps:
+                    ops = list(node.ops)
+                    ops[index] = swaps[type(op)]()
+                    yield operator, _expression(ast.Compare(node.left, ops, node.comparators))
+        operands = [node.left, *node.comparators]
+        for index, operand in enumerate(operands):
+            if isinstance(operand, ast.Constant) and type(operand.value) is int:
+                shifted = list(operands)
+                shifted[index] = ast.Constant(operand.value + 1)
+                yield "boundary", _expression(ast.Compare(shifted[0], node.ops, shifted[1:]))
+    elif isinstance(node, ast.Return) and node.value is not None:
+        value = node.value
+        if isinstance(value, ast.Constant) and isinstance(value.value, bool):
+            yield "return", f"return {not value.value}"
+        elif not (isinstance(value, ast.Constant) and value.value is None):
+            yield "return", "return None"
+    elif isinstance(node, (ast.If, ast.While)):
+        yield "condition", _expression(ast.UnaryOp(ast.Not(), node.test))
+
+
+def _expression(node) -> str:
+    # Parenthesized, so the replacement binds the same way whatever surrounds it
+    return f"({ast.unparse(node)})"
+
+
+def generate_mutants(source_code: str, max_mutants: int | None = None):
+    """
+    Mutants of the code inside the module's functions and methods (code run at
+    import time is left alone): arithmetic and logical operator swaps, boundary
+    changes (`<` vs `<=`, integer constants in comparisons plus one), negated
+    comparisons and conditions, and returns of None (or the opposite bool).
+    Each mutant changes one node and is a dict with id, line, operator,
+    description and the mutated module source. With more than max_mutants, an
+    evenly spread subset is kept.
+    """
+    try:
+        tree = ast.parse(source_code)
+    except SyntaxError:
+        return []
+    encoded = source_code.encode("utf-8")
+    # AST column offsets count UTF-8 bytes
+    line_starts = [0]
+    for line in encoded.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    skipped = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            # Positions inside f-strings aren't reliable before Python 3.12
+            skipped.update(id(child) for child in ast.walk(node))
+
+    mutants, seen = [], set()
+    for function in ast.walk(tree):
+        if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for statement in function.body:
+            for node in ast.walk(statement):
+                if id(node) in skipped or not hasattr(node, "end_col_offset"):
+                    continue
+                start = line_starts[node.lineno - 1] + node.col_offset
+                end = line_starts[node.end_lineno - 1] + node.end_col_offset
+                if isinstance(node, (ast.If, ast.While)):
+                    # Only the condition is replaced, not the whole block
+                    start = line_starts[node.test.lineno - 1] + node.test.col_offset
+                    end = line_starts[node.test.end_lineno - 1] + node.test.end_col_offset
+                for operator, replacement in _mutations(node):
+                    mutated = (encoded[:start] + replacement.encode("utf-8") + encoded[end:]).decode("utf-8")
+                    if mutated in seen:  # nested functions are walked once per enclosing function
+                        continue
+                    seen.add(mutated)
+                    try:
+                        compile(mutated, "<mutant>", "exec")
+                    except SyntaxError:
+                        continue
+                    original = encoded[start:end].decode("utf-8")
+                    mutants.append({
+                        "line": node.lineno,
+                        "operator": operator,
+                        "description": f"{_clip(original)} -> {_clip(replacement)}",
+                        "source": mutated,
+                    })
+
+    mutants.sort(key=lambda m: m["line"])
+    if max_mutants and len(mutants) > max_mutants:
+        mutants = [mutants[index * len(mutants) // max_mutants] for index in range(max_mutants)]
+    for index, mutant in enumerate(mutants):
+        mutant["id"] = index
+    return mutants
+
+
+def _clip(text: str, limit: int = 60) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class MutationTester:
+    """
+    Scores a test suite by the share of mutants of the module under test it
+    kills. Only the suite's passing tests run, and against each mutant only those
+    that executed the mutated line (from the per-test coverage of the suite's own
+    run), fastest first; a mutant's remaining tests are skipped once one fails.
+    A mutant no test executes survives without running. A mutant that makes a
+    test hang is killed by the per-test timeout. Mutants run in batches of up to
+    `batch_size`, one pytest session per batch (see MutantRunner in
+    utils.pytest_plugin), with up to `workers` batches at a time on the given
+    pytest pool (warm workers or sandboxes; fresh subprocesses without one).
+    """
+
+    def __init__(self, pool=None, workers: int = 2, timeout: float = 20, test_timeout: float | None = 10,
+                 max_mutants: int | None = 100, batch_size: int = 50):
+        self.pool = pool
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.test_timeout = test_timeout
+        self.max_mutants = max_mutants
+        self.batch_size = max(1, batch_size)
+
+    @traced("mutation")
+    def run(self, source_code: str, module_name: str, test_file: str, test_results: dict):
+        """
+        Mutation report of the tests in test_file that passed in test_results (a
+        run_pytest report of test_file, ideally with coverage_contexts). Returns
+        score (killed / mutants), the counts of killed, survived, no_coverage and
+        timeout (killed by hanging) mutants, the wall time, and the surviving
+        mutants (line, operator, description, and whether any test executed them).
+        """
+        started = time.perf_counter()
+        durations = {t["nodeid"]: t.get("duration", 0.0) for t in test_results.get("tests", [])
+                     if t["outcome"] == "passed"}
+        tests_by_line = (test_results.get("coverage") or {}).get("tests_by_line")
+        mutants = generate_mutants(source_code, self.max_mutants)
+
+        for mutant in mutants:
+            if tests_by_line is None:  # coverage not measured: every passing test may kill it
+                covering = list(durations)
+            else:
+                covering = [nodeid for nodeid in tests_by_line.get(str(mutant["line"]), []) if nodeid in durations]
+            mutant["tests"] = sorted(covering, key=lambda nodeid: durations[nodeid])
+            mutant["cost"] = sum(durations[nodeid] for nodeid in covering)
+            if not covering:
+                mutant["status"] = "no_coverage"
+
+        batches = self.plan_batches([mutant for mutant in mutants if mutant["tests"]])
+        if batches:
+            def run(batch):
+                self.run_batch(batch, module_name, test_file, durations)
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+                list(executor.map(propagate(run), batches))
+
+        counts = {status: sum(m["status"] == status for m in mutants)
+                  for status in ("killed", "timeout", "survived", "no_coverage")}
+        killed = counts["killed"] + counts["timeout"]
+        report = {
+            "score": round(killed / len(mutants), 3) if mutants else None,
+            "mutants": len(mutants),
+            "killed": killed,
+            "survived": counts["survived"],
+            "no_coverage": counts["no_coverage"],
+            "timeout": counts["timeout"],
+            "batches": len(batches),
+            "seconds": round(time.perf_counter() - started, 4),
+            "survivors": [
+                {"line": m["line"], "operator": m["operator"], "description": m["description"],
+                 "covered": bool(m["tests"])}
+                for m in mutants if m["status"] in ("survived", "no_coverage")
+            ],
+        }
+        current_span().set(mutants=len(mutants), killed=killed, survived=counts["survived"],
+                           no_coverage=counts["no_coverage"], batches=len(batches), score=report["score"])
+        return report
+
+    def plan_batches(self, mutants):
+        """Split mutants into batches of similar total test time (heaviest first), at least one per worker."""
+        if not mutants:
+            return []
+        count = max(min(self.workers, len(mutants)), -(-len(mutants) // self.batch_size))
+        batches = [[[], 0.0] for _ in range(count)]
+        for mutant in sorted(mutants, key=lambda m: -m["cost"]):
+            lightest = min((batch for batch in batches if len(batch[0]) < self.batch_size), key=lambda b: b[1])
+            lightest[0].append(mutant)
+            lightest[1] += mutant["cost"]
+        return [batch[0] for batch in sorted(batches, key=lambda b: -b[1]) if batch[0]]
+
+    def run_batch(self, batch, module_name: str, test_file: str, durations: dict):
+        """Run one batch of mutants in one pytest session and set each mutant's status."""
+        directory = tempfile.mkdtemp(prefix="pytestcrew-mutants-")
+        try:
+            with open(test_file, "r", encoding="utf-8") as f:
+                # Only pass or fail matters here: skip pytest's assertion rewriting of every copy
+                tests = f'"""PYTEST_DONT_REWRITE"""\n{f.read()}'
+            for mutant in batch:
+                with open(os.path.join(directory, f"mutant_{mutant['id']}.py"), "w", encoding="utf-8") as f:
+                    f.write(mutant["source"])
+                with open(os.path.join(directory, f"test_mutant_{mutant['id']}.py"), "w", encoding="utf-8") as f:
+                    f.write(tests)
+            conftest = os.path.join(os.path.dirname(test_file), "conftest.py")
+            if os.path.exists(conftest):
+                shutil.copy2(conftest, directory)
+            manifest = os.path.join(directory, "mutants.json")
+            with open(manifest, "w", encoding="utf-8") as f:
+                json.dump({"module": module_name, "tests": {
+                    str(mutant["id"]): [nodeid.split("::", 1)[1] for nodeid in mutant["tests"]] for mutant in batch
+                }}, f)
+
+            # A mutant may turn a loop infinite: give each test a few times its normal duration,
+            # and the session enough time for every mutant of the batch to hang once
+            test_timeout = max(1.0, 5 * max(durations[nodeid] for mutant in batch for nodeid in mutant["tests"]))
+            if self.test_timeout:
+                test_timeout = min(test_timeout, self.test_timeout)
+            # Mutant runs are internal: keep their test events away from the progress listener
+            with listening(None):
+                result = run_pytest(directory, pool=self.pool, timeout=self.timeout + test_timeout * len(batch),
+                                    test_timeout=test_timeout, mutants=manifest)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        records = {}
+        for test in result["tests"]:
+            name = os.path.basename(test["nodeid"].split("::")[0])
+            records.setdefault(name, []).append(test)
+        for mutant in batch:
+            tests = records.get(f"test_mutant_{mutant['id']}.py", [])
+            failed = [t for t in tests if t["outcome"] in ("failed", "error")]
+            if failed:
+                timed_out = any(t.get("timeout") or "Timeout: test exceeded" in (t.get("message") or "") for t in failed)
+                mutant["status"] = "timeout" if timed_out else "killed"
+            elif tests or result["passed"]:
+                mutant["status"] = "survived"
+            else:
+                # The session ended before reaching this mutant (e.g. the whole run timed out)
+                mutant["status"] = "timeout" if "Timeout" in result["stderr"] else "killed"
+            emit("mutant", line=mutant["line"], operator=mutant["operator"], status=mutant["status"])
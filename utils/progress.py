@@ -0,0 +1,36 @@
+import contextlib
+import contextvars
+
+_current_listener = contextvars.ContextVar("pytestcrew_progress", default=None)
+
+
+@contextlib.contextmanager
+def listening(callback):
+    """
+    Send the progress events of everything run inside the block (and in threads
+    given its context) to callback(kind, data): "stage" (pipeline stage started
+    or finished), "llm.chunk" (streamed test code as it is generated), "pytest"
+    (a test run started), "test" (one test's outcome, as soon as it is known) and
+    "mutant" (a mutant of the module under test was killed or survived).
+    The callback is called from worker threads, so it should only hand the event
+    off (e.g. to a queue).
+    """
+    token = _current_listener.set(callback)
+    try:
+        yield
+    finally:
+        _current_listener.reset(token)
+
+
+def is_listening() -> bool:
+    return _current_listener.get() is not None
+
+
+def emit(kind: str, **data):
+    """Report one event to the current listener, if any; a failing listener never breaks a run."""
+    callback = _current_listener.get()
+    if callback is not None:
+        try:
+            callback(kind, data)
+        except Exception as e:
+            print(f"⚠️ Progress listener failed on {kind}: {e}")
@@ -0,0 +1,181 @@
+import ast
+import io
+import re
+import textwrap
+import tokenize
+from utils.llm_scheduler import estimate_tokens
+
+# Packing order: lower values are added first and trimmed last
+PRIORITY_REQUIRED = 0
+PRIORITY_SIGNATURES = 10
+PRIORITY_CONTEXT = 20
+PRIORITY_BODIES = 30
+PRIORITY_FAILURES = 40
+PRIORITY_EXAMPLES = 45
+PRIORITY_TRACEBACKS = 50
+
+DEFAULT_TOKEN_BUDGET = 4000
+
+
+def strip_comments(code: str) -> str:
+    """Drop comments and blank-line runs and de-indent; code that doesn't tokenize is only de-indented."""
+    code = textwrap.dedent(code)
+    try:
+        comments = [tok.start for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+                    if tok.type == tokenize.COMMENT]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code.strip("\n")
+
+    lines = code.splitlines()
+    comment_only = set()
+    for row, col in comments:
+        line = lines[row - 1]
+        if not line[:col].strip():
+            comment_only.add(row - 1)
+        lines[row - 1] = line[:col].rstrip()
+
+    kept = [line for index, line in enumerate(lines) if index not in comment_only]
+    return re.sub(r"\n\s*\n(\s*\n)+", "\n\n", "\n".join(kept)).strip("\n")
+
+
+def skeleton(code: str) -> str:
+    """
+    Signatures, docstrings and imports only: every function body becomes `...`.
+    Short module-level assignments are kept; other top-level statements are dropped.
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return ""
+
+    def stub(node):
+        docstring = ast.get_docstring(node, clean=False)
+        body = [ast.Expr(ast.Constant(docstring))] if docstring else []
+        if isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    body.append(stub(child))
+                elif isinstance(child, (ast.Assign, ast.AnnAssign)) and len(ast.unparse(child)) <= 100:
+                    body.append(child)
+        node.body = body or [ast.Expr(ast.Constant(...))]
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and docstring:
+            node.body.append(ast.Expr(ast.Constant(...)))
+        return node
+
+    kept = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            kept.append(stub(node))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            kept.append(node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and len(ast.unparse(node)) <= 100:
+            kept.append(node)
+    return ast.unparse(ast.Module(body=kept, type_ignores=[]))
+
+
+def truncate_lines(text: str, budget: int, keep: str = "head") -> str:
+    """Whole lines from the head (or tail) of text that fit in budget tokens, marking the cut."""
+    lines = text.splitlines()
+    if keep == "tail":
+        lines = lines[::-1]
+    kept, used = [], estimate_tokens("...")
+    for line in lines:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return ""
+    if len(kept) < len(lines):
+        kept.append("...")
+    return "\n".join(kept[::-1] if keep == "tail" else kept)
+
+
+class _Section:
+    def __init__(self, title, variants, truncate):
+        self.title = title
+        self.variants = variants      # [(priority, text)] from smallest to fullest
+        self.truncate = truncate      # None, "head" or "tail"
+        self.text = ""
+
+    def render(self, text):
+        return f"=== {self.title} ===\n{text}" if self.title else text
+
+
+class PromptBuilder:
+    """
+    Packs prompt sections into a token budget by priority.
+    Each section has one or more renderings (e.g. a code skeleton, then the full code),
+    each with its own priority. Renderings are added cheapest-priority first, a larger
+    rendering replacing the smaller one only when it fits; a rendering that doesn't fit
+    is cut on line boundaries when the section allows it. Sections are emitted in the
+    order they were added, so the prompt reads the same whatever was trimmed.
+    """
+
+    def __init__(self, budget: int | None = DEFAULT_TOKEN_BUDGET):
+        self.budget = budget
+        self.sections = []
+
+    def text(self, text: str, title: str | None = None, priority: int = PRIORITY_REQUIRED,
+             truncate: str | None = None):
+        """A plain section; required text (the default) is always included in full."""
+        text = textwrap.dedent(text).strip("\n")
+        if text:
+            self.sections.append(_Section(title, [(priority, text)], truncate))
+        return self
+
+    def code(self, title: str, code: str, signature_priority: int = PRIORITY_SIGNATURES,
+             body_priority: int | None = PRIORITY_BODIES):
+        """
+        Source code: signatures and docstrings at signature_priority, the full
+        comment-stripped code at body_priority (None keeps only the skeleton).
+        """
+        full = strip_comments(code)
+        outline = skeleton(full)
+        variants = []
+        if outline and outline != full:
+            variants.append((signature_priority, outline))
+        if body_priority is not None or not variants:
+            variants.append((signature_priority if not variants else body_priority, full))
+        self.sections.append(_Section(title, variants, "head"))
+        return self
+
+    @staticmethod
+    def tokens(text: str) -> int:
+        return estimate_tokens(text)
+
+    def build(self) -> str:
+        separator = self.tokens("\n\n")
+        used = 0
+        steps = sorted(
+            ((priority, order, index) for order, section in enumerate(self.sections)
+             for index, (priority, _) in enumerate(section.variants)),
+        )
+        for priority, order, index in steps:
+            section = self.sections[order]
+            if index and not section.text:
+                continue  # the smaller rendering didn't make it, so neither will this one
+            text = section.variants[index][1]
+            current = self.tokens(section.render(section.text)) + separator if section.text else 0
+            cost = self.tokens(section.render(text)) + separator
+
+            if self.budget is None or priority == PRIORITY_REQUIRED or used - current + cost <= self.budget:
+                used += cost - current
+                section.text = text
+            elif section.truncate and not section.text:
+                room = self.budget - used - self.tokens(section.render("")) - separator
+                trimmed = truncate_lines(text, room, section.truncate) if room > 0 else ""
+                if trimmed:
+                    section.text = trimmed
+                    used += self.tokens(section.render(trimmed)) + separator
+
+        return "\n\n".join(section.render(section.text) for section in self.sections if section.text)
+
+
+def prompt_budget(config: dict, agent: str | None = None) -> int | None:
+    """Token budget for an agent's prompts: `<agent>_prompt_tokens`, else `prompt_token_budget` (0 = unlimited)."""
+    budget = config.get(f"{agent}_prompt_tokens") if agent else None
+    if budget is None:
+        budget = config.get("prompt_token_budget", DEFAULT_TOKEN_BUDGET)
+    return int(budget) or None
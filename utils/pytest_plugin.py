@@ -0,0 +1,460 @@
+import importlib.util
+import json
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import threading
+
+TRACEBACK_LINES = 15
+
+
+def pytest_addoption(parser):
+    parser.addoption("--pytestcrew-results", default=None,
+                     help="Write per-test results as JSON lines to this file.")
+    parser.addoption("--pytestcrew-cov", action="append", default=[],
+                     help="Measure line and branch coverage of this source file (repeatable).")
+    parser.addoption("--pytestcrew-cov-report", default=None,
+                     help="Write the coverage of the --pytestcrew-cov files as JSON to this file.")
+    parser.addoption("--pytestcrew-cov-contexts", action="store_true", default=False,
+                     help="Also record which tests executed each line of the --pytestcrew-cov files.")
+    parser.addoption("--pytestcrew-timeout", type=float, default=None,
+                     help="Fail any test running longer than this many seconds; stop the process if it won't stop.")
+    parser.addoption("--pytestcrew-exclude", default=None,
+                     help="JSON file with a list of node ids to deselect (exact matches only).")
+    parser.addoption("--pytestcrew-shuffle", type=int, default=None,
+                     help="Run the tests in an order shuffled with this seed, and seed `random` per test from it.")
+    parser.addoption("--pytestcrew-mutants", default=None,
+                     help="JSON manifest of mutant test files to run, each against its own mutant module.")
+
+
+def pytest_configure(config):
+    path = config.getoption("--pytestcrew-results")
+    if path:
+        config.pluginmanager.register(ResultCollector(path), "pytestcrew-results")
+
+    sources = config.getoption("--pytestcrew-cov")
+    report = config.getoption("--pytestcrew-cov-report")
+    if sources and report:
+        # Registered before collection, so the module under test is imported while tracing
+        config.pluginmanager.register(
+            CoverageCollector(sources, report, contexts=config.getoption("--pytestcrew-cov-contexts")),
+            "pytestcrew-coverage",
+        )
+
+    timeout = config.getoption("--pytestcrew-timeout")
+    if timeout:
+        config.pluginmanager.register(TestTimeout(timeout), "pytestcrew-timeout")
+
+    seed = config.getoption("--pytestcrew-shuffle")
+    if seed is not None:
+        config.pluginmanager.register(Shuffle(seed), "pytestcrew-shuffle")
+
+    manifest = config.getoption("--pytestcrew-mutants")
+    if manifest:
+        # A mutant that breaks at import is killed; the other mutants still run
+        config.option.continue_on_collection_errors = True
+        config.pluginmanager.register(MutantRunner(manifest), "pytestcrew-mutants")
+
+
+def pytest_collection_modifyitems(config, items):
+    path = config.getoption("--pytestcrew-exclude")
+    if not path:
+        return
+    with open(path, encoding="utf-8") as f:
+        excluded = set(json.load(f))
+    # Unlike --deselect, which matches prefixes, `test_a` must not drop `test_ab`
+    deselected = [item for item in items if item.nodeid in excluded]
+    if deselected:
+        items[:] = [item for item in items if item.nodeid not in excluded]
+        config.hook.pytest_deselected(items=deselected)
+
+
+class ResultCollector:
+    """
+    Pytest plugin collecting node id, outcome, duration, failure location and a
+    short traceback for every test, appending each JSON line as soon as the test
+    finishes. Load with `-p utils.pytest_plugin --pytestcrew-results <file.jsonl>`.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.pending = {}
+        open(output_path, "w").close()
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        # A start marker without a result means the process died (or was killed) inside this test
+        self._write({"nodeid": nodeid, "started": True})
+
+    def pytest_runtest_logreport(self, report):
+        record = self.pending.setdefault(report.nodeid, {
+            "nodeid": report.nodeid,
+            "outcome": "passed",
+            "duration": 0.0,
+            "location": None,
+            "message": None,
+            "traceback": None,
+        })
+        record["duration"] += report.duration
+
+        if report.failed:
+            # Failures outside the test body (fixtures, teardown) are errors
+            record["outcome"] = "failed" if report.when == "call" else "error"
+            record.update(_failure_details(report))
+        elif report.skipped and record["outcome"] == "passed":
+            record["outcome"] = "skipped"
+
+        if report.when == "teardown":
+            self._write(self.pending.pop(report.nodeid))
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            record = {"nodeid": report.nodeid, "outcome": "error", "duration": 0.0}
+            record.update(_failure_details(report))
+            self._write(record)
+
+    def _write(self, record):
+        with open(self.output_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+class Shuffle:
+    """
+    Runs the tests in a random order and gives each test its own `random` seed,
+    both derived from `seed`: runs with different seeds expose tests that depend
+    on the order they run in, on state another test left behind, or on the
+    random values they happen to draw.
+    """
+
+    def __init__(self, seed: int):
+        self.seed = seed
+
+    def pytest_collection_modifyitems(self, items):
+        random.Random(self.seed).shuffle(items)
+
+    def pytest_runtest_setup(self, item):
+        random.seed(f"{self.seed}:{item.nodeid}")
+
+
+class MutantRunner:
+    """
+    Runs the tests of many mutants of one module in a single session. The test
+    directory holds, per mutant id, `mutant_<id>.py` (the mutated module) and
+    `test_mutant_<id>.py` (a copy of the suite). The manifest names the module
+    and, per mutant id, the tests to run in order: {"module": name, "tests":
+    {id: [test names]}}. Each test file is collected, and each of its tests run,
+    with the module name bound to its own mutant. Once a test of a mutant fails,
+    that mutant's remaining tests are skipped.
+    """
+
+    FILE = re.compile(r"test_mutant_(\d+)\.py$")
+
+    def __init__(self, manifest_path: str):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.module_name = manifest["module"]
+        # Position of each test in its mutant's run order, and the top-level functions and classes it needs
+        self.order = {mutant_id: {name: index for index, name in enumerate(tests)}
+                      for mutant_id, tests in manifest["tests"].items()}
+        self.definitions = {
+            mutant_id: {re.sub(r"\[.*\]$", "", test.split("::")[0]) for test in tests}
+            for mutant_id, tests in manifest["tests"].items()
+        }
+        self.modules = {}
+        self.killed = set()
+
+    def mutant_of(self, path) -> str | None:
+        match = self.FILE.search(str(path).split("::")[0])
+        return match.group(1) if match else None
+
+    def _bind(self, mutant_id: str, directory: str):
+        if mutant_id not in self.modules:
+            path = os.path.join(directory, f"mutant_{mutant_id}.py")
+            spec = importlib.util.spec_from_file_location(self.module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[self.module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except Exception:
+                module = None  # importing the suite then fails: a collection error kills the mutant
+            self.modules[mutant_id] = module
+        if self.modules[mutant_id] is None:
+            sys.modules.pop(self.module_name, None)
+        else:
+            sys.modules[self.module_name] = self.modules[mutant_id]
+
+    def pytest_collectstart(self, collector):
+        mutant_id = self.mutant_of(getattr(collector, "path", ""))
+        if mutant_id is not None and getattr(collector, "path", None) and collector.path.is_file():
+            # The suite's `import <module>` must find this mutant
+            self._bind(mutant_id, str(collector.path.parent))
+
+    def pytest_pycollect_makeitem(self, collector, name, obj):
+        # Don't even build items (or parametrize) the tests this mutant won't run
+        mutant_id = self.mutant_of(getattr(collector, "nodeid", ""))
+        if mutant_id is None or "::" in collector.nodeid:
+            return None
+        wanted = self.definitions.get(mutant_id, set())
+        if name not in wanted and (collector.funcnamefilter(name) or collector.classnamefilter(name)):
+            return []
+        return None
+
+    def pytest_collection_modifyitems(self, config, items):
+        def rank(item):
+            return self.order.get(self.mutant_of(item.nodeid), {}).get(item.nodeid.split("::", 1)[1])
+
+        selected = [item for item in items if rank(item) is not None]
+        deselected = [item for item in items if rank(item) is None]
+        selected.sort(key=lambda item: (int(self.mutant_of(item.nodeid)), rank(item)))
+        items[:] = selected
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+
+    def pytest_runtest_setup(self, item):
+        import pytest
+
+        mutant_id = self.mutant_of(item.nodeid)
+        if mutant_id in self.killed:
+            pytest.skip("mutant already killed")
+        self._bind(mutant_id, str(item.path.parent))
+
+    def pytest_runtest_logreport(self, report):
+        if report.failed:
+            self.killed.add(self.mutant_of(report.nodeid))
+
+
+class TestTimeout:
+    """
+    Per-test time limit. After `seconds` a SIGALRM fails the running test (main thread
+    only, where signals are delivered); if the test still hasn't finished `grace`
+    seconds later (e.g. it is stuck in C code or swallows the exception) a watchdog
+    thread ends the whole process. The ResultCollector's start marker then lets
+    load_results report that test as timed out.
+    """
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, seconds: float, grace: float = 2.0):
+        self.seconds = seconds
+        self.grace = grace
+        self.use_alarm = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        self.watchdog = None
+        self.previous_handler = None
+
+    def _alarm(self, signum, frame):
+        import pytest
+
+        pytest.fail(f"Timeout: test exceeded {self.seconds:g}s", pytrace=False)
+
+    @staticmethod
+    def _abort():
+        os._exit(1)
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        if self.use_alarm:
+            self.previous_handler = signal.signal(signal.SIGALRM, self._alarm)
+            signal.setitimer(signal.ITIMER_REAL, self.seconds)
+        self.watchdog = threading.Timer(self.seconds + self.grace, self._abort)
+        self.watchdog.daemon = True
+        self.watchdog.start()
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+        if self.use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self.previous_handler or signal.SIG_DFL)
+
+
+class CoverageCollector:
+    """
+    Measures line and branch coverage of the given source files for the whole
+    session and writes, per file, the covered/missing lines and missing branches
+    (see load_coverage). With contexts, each test is measured in its own coverage
+    context and the report also maps every executed line to the node ids of the
+    tests that ran it ("tests_by_line"; code run at import time belongs to no test).
+    Requires the `coverage` package.
+    """
+
+    def __init__(self, sources, report_path: str, contexts: bool = False):
+        import coverage
+
+        self.sources = [os.path.abspath(s) for s in sources]
+        self.report_path = report_path
+        self.contexts = contexts
+        self.cov = coverage.Coverage(branch=True, include=self.sources, data_file=None)
+        self.cov.start()
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        if self.contexts:
+            self.cov.switch_context(nodeid)
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        if self.contexts:
+            self.cov.switch_context("")
+
+    def pytest_unconfigure(self, config):
+        self.cov.stop()
+        fd, raw_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            self.cov.json_report(outfile=raw_path, include=self.sources)
+            with open(raw_path, encoding="utf-8") as f:
+                files = json.load(f).get("files", {})
+        except Exception:
+            files = {}  # nothing from the sources was imported
+        finally:
+            os.remove(raw_path)
+
+        report = {}
+        for path, data in files.items():
+            summary = data.get("summary", {})
+            report[os.path.abspath(path)] = {
+                "percent": round(summary.get("percent_covered", 0.0), 2),
+                "num_statements": summary.get("num_statements", 0),
+                "covered_lines": summary.get("covered_lines", 0),
+                "num_branches": summary.get("num_branches", 0),
+                "covered_branches": summary.get("covered_branches", 0),
+                "missing_lines": data.get("missing_lines", []),
+                "missing_branches": data.get("missing_branches", []),
+            }
+            if self.contexts:
+                report[os.path.abspath(path)]["tests_by_line"] = self._tests_by_line(path)
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+
+    def _tests_by_line(self, path):
+        try:
+            by_line = self.cov.get_data().contexts_by_lineno(os.path.abspath(path))
+        except Exception:
+            return {}
+        return {str(line): sorted(c for c in contexts if c) for line, contexts in by_line.items()
+                if any(contexts)}
+
+
+def _failure_details(report):
+    crash = getattr(report.longrepr, "reprcrash", None)
+    if crash is not None:
+        location = {"path": crash.path, "line": crash.lineno}
+        message = crash.message
+    else:
+        path, line, _ = report.location if getattr(report, "location", None) else (report.fspath, None, None)
+        location = {"path": str(path), "line": line}
+        message = None
+
+    text = report.longreprtext or ""
+    return {
+        "location": location,
+        "message": message or (text.strip().splitlines() or [""])[-1],
+        "traceback": "\n".join(text.splitlines()[-TRACEBACK_LINES:]),
+    }
+
+
+def load_results(path: str):
+    """
+    Read the JSON lines written by ResultCollector (tolerates a missing file).
+    A test that started but never reported is returned as a timed-out error.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+    records = {}
+    for line in lines:
+        if line.get("started"):
+            records.setdefault(line["nodeid"], None)
+        else:
+            records.pop(line["nodeid"], None)  # keep the order in which tests finished
+            records[line["nodeid"]] = line
+    return [record or {
+        "nodeid": nodeid,
+        "outcome": "error",
+        "duration": 0.0,
+        "location": None,
+        "message": "Timeout: the test never finished and its process was stopped",
+        "traceback": None,
+        "timeout": True,
+    } for nodeid, record in records.items()]
+
+
+def load_coverage(path: str, source: str):
+    """Coverage record of one source file written by CoverageCollector, or None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return report.get(os.path.abspath(source))
+
+
+def merge_coverage(records):
+    """
+    Combine coverage records of the same source file from separate runs (shards):
+    a line or branch is covered if any run covered it, by the tests of every run.
+    """
+    records = [r for r in records if r]
+    if len(records) <= 1:
+        return records[0] if records else None
+
+    missing_lines = set.intersection(*(set(r["missing_lines"]) for r in records))
+    missing_branches = set.intersection(*(set(map(tuple, r["missing_branches"])) for r in records))
+    statements = max(r["num_statements"] for r in records)
+    branches = max(r["num_branches"] for r in records)
+    covered_lines = statements - len(missing_lines)
+    covered_branches = branches - len(missing_branches)
+    total = statements + branches
+    merged = {
+        "percent": round(100.0 * (covered_lines + covered_branches) / total, 2) if total else 100.0,
+        "num_statements": statements,
+        "covered_lines": covered_lines,
+        "num_branches": branches,
+        "covered_branches": covered_branches,
+        "missing_lines": sorted(missing_lines),
+        "missing_branches": [list(branch) for branch in sorted(missing_branches)],
+    }
+    if any("tests_by_line" in r for r in records):
+        tests_by_line = {}
+        for record in records:
+            for line, tests in record.get("tests_by_line", {}).items():
+                tests_by_line.setdefault(line, set()).update(tests)
+        merged["tests_by_line"] = {line: sorted(tests) for line, tests in tests_by_line.items()}
+    return merged
+
+
+def summarize(tests):
+    summary = {"total": len(tests), "passed": 0, "failed": 0, "error": 0, "skipped": 0}
+    for test in tests:
+        summary[test["outcome"]] = summary.get(test["outcome"], 0) + 1
+    summary["duration"] = round(sum(t.get("duration", 0.0) for t in tests), 4)
+    return summary
+
+
+def definition_name(nodeid: str):
+    """Top-level test function or class a node id belongs to (None for file-level records)."""
+    parts = nodeid.split("::")
+    return re.sub(r"\[.*\]$", "", parts[1]) if len(parts) > 1 else None
+
+
+def definition_outcomes(tests):
+    """
+    Outcome of each top-level test in one run: "failed" if any of its records
+    (e.g. parametrized cases) failed or errored, else "passed" if one passed,
+    else "skipped". File-level records are left out.
+    """
+    outcomes = {}
+    for test in tests:
+        name = definition_name(test["nodeid"])
+        if name is None:
+            continue
+        if test["outcome"] in ("failed", "error"):
+            outcomes[name] = "failed"
+        elif test["outcome"] == "passed" and outcomes.get(name) != "failed":
+            outcomes[name] = "passed"
+        else:
+            outcomes.setdefault(name, "skipped")
+    return outcomes
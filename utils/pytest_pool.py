@@ -0,0 +1,168 @@
+import atexit
+import contextlib
+import importlib
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import sysconfig
+import threading
+
+DEFAULT_PRELOAD = ("pytest", "_pytest.python", "_pytest.assertion.rewrite", "coverage", "coverage.jsonreport")
+
+_LIBRARY_ROOTS = tuple({
+    os.path.abspath(sysconfig.get_paths()[key]) + os.sep
+    for key in ("stdlib", "platstdlib", "purelib", "platlib")
+})
+
+
+def _is_library_module(module) -> bool:
+    """True for stdlib/site-packages modules, which stay cached between jobs."""
+    path = getattr(module, "__file__", None)
+    return not path or os.path.abspath(path).startswith(_LIBRARY_ROOTS)
+
+
+def _worker_main(conn, preload):
+    """Worker loop: keep pytest imported and run one test file per job."""
+    for name in preload:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(name)
+    import pytest
+
+    cwd = os.getcwd()
+    base_path = list(sys.path)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        targets, extra_args = job
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                returncode = int(pytest.main([*targets, "-q", "--disable-warnings", *extra_args]))
+            except BaseException as e:  # pytest.main may raise SystemExit or crash on bad input
+                print(f"Error running pytest: {e}", file=sys.stderr)
+                returncode = 1
+
+        # Forget user modules (tests, module under test, conftest) so the next job re-imports them
+        for name, module in list(sys.modules.items()):
+            if name not in ("__main__", "__mp_main__") and module is not None and not _is_library_module(module):
+                del sys.modules[name]
+        sys.path[:] = base_path
+        os.chdir(cwd)
+
+        conn.send({"returncode": returncode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()})
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.runs = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            with contextlib.suppress(OSError, BrokenPipeError):
+                self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class PytestWorkerPool:
+    """
+    Pool of pre-warmed pytest worker processes.
+    Workers are forked from a fork server that already imported pytest, run test
+    files in-process, and are recycled after max_runs jobs, a crash or a timeout.
+    """
+
+    def __init__(self, size: int = 2, max_runs: int = 50, preload=DEFAULT_PRELOAD):
+        self.size = size
+        self.max_runs = max_runs
+        self.preload = tuple(preload)
+
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if self._ctx.get_start_method() == "forkserver":
+            self._ctx.set_forkserver_preload(list(self.preload))
+
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main, args=(child_conn, self.preload), daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def run(self, test_path, timeout: float = 20, extra_args=()):
+        """
+        Run pytest on test_path (a file, or a list of files / `file::test` node ids)
+        in a warm worker; same result shape as run_pytest.
+        """
+        if self._closed:
+            raise RuntimeError("PytestWorkerPool is closed")
+
+        targets = [test_path] if isinstance(test_path, str) else list(test_path)
+        worker = self._idle.get()
+        healthy = False
+        try:
+            worker.conn.send(([os.path.abspath(target) for target in targets], list(extra_args)))
+            if not worker.conn.poll(timeout):
+                return {"passed": False, "stdout": "", "stderr": "Timeout expired while running pytest."}
+            reply = worker.conn.recv()
+            healthy = True
+        except (EOFError, OSError):
+            return {"passed": False, "stdout": "", "stderr": "pytest worker exited unexpectedly (crash or os._exit in tests)."}
+        finally:
+            self._release(worker, healthy)
+
+        return {
+            "passed": reply["returncode"] == 0,
+            "stdout": reply["stdout"],
+            "stderr": reply["stderr"],
+        }
+
+    def _release(self, worker, healthy):
+        worker.runs += 1
+        if healthy and worker.runs < self.max_runs:
+            self._idle.put(worker)
+            return
+        # Timed out, crashed or worn out: replace it with a fresh worker
+        worker.stop(kill=not healthy)
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_pool(size: int = 2, max_runs: int = 50):
+    """Return the process-wide worker pool, creating it on first use."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = PytestWorkerPool(size=size, max_runs=max_runs)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_PATH = ".pytestcrew/history.duckdb"
+
+# (column, type): types are valid in both DuckDB and SQLite
+COLUMNS = [
+    ("run_id", "VARCHAR"),
+    ("started_at", "VARCHAR"),     # ISO 8601, so substr() buckets by hour/day in either backend
+    ("mode", "VARCHAR"),
+    ("module_name", "VARCHAR"),
+    ("source_key", "VARCHAR"),
+    ("workspace", "VARCHAR"),
+    ("model", "VARCHAR"),
+    ("passed", "BOOLEAN"),
+    ("score", "DOUBLE"),
+    ("attempts", "INTEGER"),
+    ("tests", "INTEGER"),
+    ("tests_passed", "INTEGER"),
+    ("tests_failed", "INTEGER"),
+    ("coverage", "DOUBLE"),
+    ("mutation_score", "DOUBLE"),
+    ("flaky_tests", "INTEGER"),
+    ("llm_calls", "INTEGER"),
+    ("cache_hits", "INTEGER"),
+    ("prompt_tokens", "INTEGER"),
+    ("response_tokens", "INTEGER"),
+    ("cached_tokens", "INTEGER"),
+    ("analyze_s", "DOUBLE"),
+    ("generate_s", "DOUBLE"),
+    ("execute_s", "DOUBLE"),
+    ("stabilize_s", "DOUBLE"),
+    ("mutate_s", "DOUBLE"),
+    ("review_s", "DOUBLE"),
+    ("total_s", "DOUBLE"),
+    ("error", "VARCHAR"),
+]
+
+# One row per LLM-written unit (or repaired test) and attempt: which model wrote it and whether it then passed
+UNIT_COLUMNS = [
+    ("recorded_at", "VARCHAR"),
+    ("run_id", "VARCHAR"),
+    ("module_name", "VARCHAR"),
+    ("unit", "VARCHAR"),
+    ("complexity", "VARCHAR"),
+    ("model", "VARCHAR"),
+    ("attempt", "INTEGER"),
+    ("passed", "BOOLEAN"),
+    ("latency_s", "DOUBLE"),
+]
+
+BUCKETS = {"hour": 13, "day": 10, "month": 7}
+
+
+class RunHistory:
+    """
+    Local store of pipeline runs: one row per run with stage timings, attempts,
+    outcome, coverage, mutation score and LLM usage, plus one row per unit outcome (the model that
+    wrote the unit's tests and whether they passed) for model routing. Uses DuckDB when installed (SQLite otherwise,
+    in a `.sqlite` file next to the configured path). One connection per store,
+    guarded by a lock, so it can be shared by every run in the process.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            import duckdb
+
+            self.backend = "duckdb"
+            self.path = path
+            self.conn = duckdb.connect(path)
+        except ImportError:
+            self.backend = "sqlite"
+            self.path = f"{os.path.splitext(path)[0]}.sqlite"
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            for table, table_columns in (("runs", COLUMNS), ("unit_outcomes", UNIT_COLUMNS)):
+                columns = ", ".join(f"{name} {kind}" for name, kind in table_columns)
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+                # Stores created by older versions get the columns added since
+                existing = {column[0] for column in self.conn.execute(f"SELECT * FROM {table} LIMIT 0").description}
+                for name, kind in table_columns:
+                    if name not in existing:
+                        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+            self._commit()
+
+    def _commit(self):
+        if self.backend == "sqlite":
+            self.conn.commit()
+
+    def record(self, run: dict):
+        """Insert one run; missing columns are stored as NULL, unknown keys are ignored."""
+        self._insert("runs", COLUMNS, [run])
+
+    def record_units(self, outcomes):
+        """Insert unit outcomes (dicts with UNIT_COLUMNS keys)."""
+        self._insert("unit_outcomes", UNIT_COLUMNS, outcomes)
+
+    def _insert(self, table: str, columns, rows):
+        names = [name for name, _ in columns]
+        placeholders = ", ".join("?" for _ in names)
+        with self._lock:
+            for row in rows:
+                self.conn.execute(f"INSERT INTO {table} ({', '.join(names)}) VALUES ({placeholders})",
+                                  [row.get(name) for name in names])
+            self._commit()
+
+    def query(self, sql: str, params=()):
+        """Run a read query against the `runs` table and return the rows as dicts."""
+        with self._lock:
+            cursor = self.conn.execute(sql, list(params))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def latency_trend(self, bucket: str = "day", module_name: str | None = None):
+        """Runs, pass rate, mean mutation score, flaky tests found, tokens and mean stage latencies per hour, day or month."""
+        width = BUCKETS[bucket]
+        where, params = ("WHERE module_name = ?", [module_name]) if module_name else ("", [])
+        return self.query(f"""
+            SELECT substr(started_at, 1, {width}) AS period,
+                   count(*) AS runs,
+                   avg(CASE WHEN passed THEN 1.0 ELSE 0.0 END) AS pass_rate,
+                   avg(total_s) AS total_s,
+                   max(total_s) AS max_total_s,
+                   avg(analyze_s) AS analyze_s,
+                   avg(generate_s) AS generate_s,
+                   avg(execute_s) AS execute_s,
+                   avg(stabilize_s) AS stabilize_s,
+                   avg(mutate_s) AS mutate_s,
+                   avg(review_s) AS review_s,
+                   avg(attempts) AS attempts,
+                   avg(mutation_score) AS mutation_score,
+                   sum(flaky_tests) AS flaky_tests,
+                   sum(prompt_tokens + response_tokens) AS tokens,
+                   sum(cached_tokens) AS cached_tokens
+            FROM runs {where}
+            GROUP BY period
+            ORDER BY period
+        """, params)
+
+    def model_stats(self):
+        """Attempts, passes and mean latency per (model, complexity), from the recorded unit outcomes."""
+        return self.query("""
+            SELECT model, complexity,
+                   count(*) AS attempts,
+                   sum(CASE WHEN passed THEN 1 ELSE 0 END) AS passes,
+                   avg(latency_s) AS latency_s
+            FROM unit_outcomes
+            GROUP BY model, complexity
+        """)
+
+    def mean_execute_seconds(self):
+        """Mean duration of a pipeline's pytest run, or None before any run was recorded."""
+        rows = self.query("SELECT avg(execute_s) AS execute_s FROM runs WHERE execute_s IS NOT NULL")
+        return rows[0]["execute_s"] if rows else None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_shared_stores = {}
+_shared_lock = threading.Lock()
+
+
+def get_run_history(config: dict):
+    """Process-wide RunHistory for the configured path, or None when disabled (`run_history`) or unavailable."""
+    if not config.get("run_history", True):
+        return None
+    path = config.get("run_history_path", DEFAULT_PATH)
+    with _shared_lock:
+        if path not in _shared_stores:
+            try:
+                _shared_stores[path] = RunHistory(path)
+            except Exception as e:  # e.g. the DuckDB file is locked by another process
+                print(f"⚠️ Run history disabled: {e}")
+                _shared_stores[path] = None
+        return _shared_stores[path]
@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.merging import collect_test_names
+from utils.pytest_plugin import definition_name, merge_coverage, summarize
+from utils.test_runner import run_pytest
+from utils.tracing import current_span, propagate, traced
+
+# Estimate for tests that have never run
+DEFAULT_TEST_SECONDS = 0.05
+
+
+class DurationHistory:
+    """
+    Per-test durations from earlier runs of a generated test file, keyed by
+    top-level test name (parametrized cases summed). Stored as JSON next to the
+    test file and smoothed across runs, so shards can be balanced by expected time.
+    """
+
+    def __init__(self, path: str | None, durations: dict | None = None, smoothing: float = 0.5):
+        self.path = path
+        self.durations = durations or {}
+        self.smoothing = smoothing
+
+    @classmethod
+    def for_test_file(cls, test_file: str):
+        return cls.load(f"{os.path.splitext(test_file)[0]}.durations.json")
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f).get("durations", {}))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def estimate(self, name: str) -> float:
+        if name in self.durations:
+            return self.durations[name]
+        # Unknown tests are assumed typical for this file
+        known = sorted(self.durations.values())
+        return known[len(known) // 2] if known else DEFAULT_TEST_SECONDS
+
+    def update(self, tests):
+        measured = {}
+        for test in tests:
+            name = definition_name(test["nodeid"])
+            # A test killed without a known limit has no meaningful duration
+            if name and not (test.get("timeout") and not test.get("duration")):
+                measured[name] = measured.get(name, 0.0) + test.get("duration", 0.0)
+        for name, seconds in measured.items():
+            previous = self.durations.get(name)
+            self.durations[name] = round(seconds if previous is None
+                                         else self.smoothing * seconds + (1 - self.smoothing) * previous, 4)
+
+    def prune(self, names):
+        self.durations = {name: seconds for name, seconds in self.durations.items() if name in set(names)}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"durations": self.durations}, f, indent=2, sort_keys=True)
+
+
+def plan_shards(names, history: DurationHistory, shards: int, min_shard_seconds: float = 0.0):
+    """
+    Split tests into at most `shards` groups of similar expected duration
+    (longest-processing-time first). Fewer shards are used when the suite is
+    too short for each to get min_shard_seconds of work.
+    Returns [(names, expected seconds)], heaviest first.
+    """
+    estimates = sorted(((history.estimate(name), name) for name in names), reverse=True)
+    total = sum(seconds for seconds, _ in estimates)
+    if min_shard_seconds > 0:
+        shards = min(shards, int(total // min_shard_seconds) or 1)
+    shards = max(1, min(shards, len(estimates)))
+
+    groups = [[[], 0.0] for _ in range(shards)]
+    for seconds, name in estimates:
+        lightest = min(groups, key=lambda group: group[1])
+        lightest[0].append(name)
+        lightest[1] += seconds
+    return sorted(((group[0], round(group[1], 4)) for group in groups if group[0]), key=lambda g: -g[1])
+
+
+@traced("pytest.sharded")
+def run_sharded(test_file: str, shards: int, pool=None, timeout: float = 20, coverage_source: str | None = None,
+                test_timeout: float | None = None, history: DurationHistory | None = None,
+                min_shard_seconds: float = 0.5, max_failures: int | None = None, coverage_contexts: bool = False):
+    """
+    Run a test file as up to `shards` concurrent pytest runs, balanced by the
+    durations in `history`, and merge them into one run_pytest-shaped report
+    (plus "shards": tests, expected and actual seconds per shard). The history
+    is updated with this run's durations and saved. max_failures applies to each
+    shard on its own; coverage_contexts is passed to every run_pytest.
+    """
+    with open(test_file, "r", encoding="utf-8") as f:
+        names = collect_test_names(f.read())
+    plan = plan_shards(names, history or DurationHistory(None), shards, min_shard_seconds) if names else []
+    current_span().set(tests=len(names), shards=len(plan))
+
+    def run(shard):
+        start = time.perf_counter()
+        result = run_pytest(test_file, pool=pool, timeout=timeout, coverage_source=coverage_source,
+                            test_timeout=test_timeout, select=shard[0] if len(plan) > 1 else None,
+                            max_failures=max_failures, coverage_contexts=coverage_contexts)
+        return result, time.perf_counter() - start
+
+    if len(plan) <= 1:
+        outputs = [run(plan[0] if plan else ([], 0.0))]
+    else:
+        with ThreadPoolExecutor(max_workers=len(plan)) as executor:
+            outputs = list(executor.map(propagate(run), plan))
+
+    tests, seen = [], set()
+    for result, _ in outputs:
+        for test in result["tests"]:
+            # Module-level errors (imports, collection) are reported by every shard
+            if test["nodeid"] not in seen:
+                seen.add(test["nodeid"])
+                tests.append(test)
+
+    if history is not None:
+        history.update(tests)
+        history.prune(names)
+        history.save()
+
+    return {
+        "passed": all(result["passed"] for result, _ in outputs),
+        "stdout": "\n".join(result["stdout"] for result, _ in outputs if result["stdout"]),
+        "stderr": "\n".join(result["stderr"] for result, _ in outputs if result["stderr"]),
+        "tests": tests,
+        "summary": summarize(tests),
+        "coverage": merge_coverage([result["coverage"] for result, _ in outputs]),
+        "shards": [{"tests": len(shard[0]), "expected": shard[1], "wall": round(wall, 4)}
+                   for shard, (_, wall) in zip(plan or [([], 0.0)], outputs)],
+    }
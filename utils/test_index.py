@@ -0,0 +1,206 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from utils.prompt_builder import strip_comments
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def sentence_embedder(model_name: str = DEFAULT_MODEL):
+    """Batch embedding function backed by sentence-transformers (one model per name per process)."""
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+
+            _models[model_name] = SentenceTransformer(model_name)
+    model = _models[model_name]
+
+    def embed(texts):
+        return model.encode(list(texts), normalize_embeddings=True)
+
+    return embed
+
+
+def code_key(source: str) -> str:
+    """Identity of a unit regardless of formatting and comments."""
+    try:
+        text = ast.dump(ast.parse(source), include_attributes=False)
+    except SyntaxError:
+        text = strip_comments(source)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def adapt_tests(tests: str, old_name: str, new_name: str, old_module: str, new_module: str) -> str:
+    """
+    Retarget tests written for `old_module.old_name` at `new_module.new_name`:
+    imports, references and test names are rewritten on the AST.
+    """
+    tree = ast.parse(tests)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == old_module:
+            node.module = new_module
+            for alias in node.names:
+                if alias.name == old_name:
+                    alias.name = new_name
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == old_module:
+                    alias.name, alias.asname = new_module, alias.asname or old_module
+        elif isinstance(node, ast.Name) and node.id == old_name:
+            node.id = new_name
+        elif isinstance(node, ast.Attribute) and node.attr == old_name:
+            node.attr = new_name
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and old_name != new_name:
+            node.name = re.sub(rf"(?<![A-Za-z0-9]){re.escape(old_name)}(?![A-Za-z0-9])", new_name, node.name)
+    return ast.unparse(tree) + "\n"
+
+
+class TestIndex:
+    """
+    Persistent HNSW index of unit source -> accepted (passing) tests from past runs.
+    Items are keyed by a normalized AST hash, so re-recording a unit replaces its
+    tests; once max_items is reached the least recently used items are evicted.
+    The index (index.bin) and item metadata (items.json) live under `path`.
+    `embed` maps a list of texts to unit-normalized vectors (sentence-transformers by default).
+    """
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, path: str = ".test_index", embed=None, max_items: int = 5000):
+        import hnswlib
+
+        self.path = path
+        self.embed = embed or sentence_embedder()
+        self.max_items = max_items
+        self._hnswlib = hnswlib
+        self._lock = threading.RLock()
+        self.items = {}     # label -> metadata
+        self.labels = {}    # code key -> label
+        self.index = None
+        self.dim = None
+        self.next_label = 0
+        self._load()
+
+    # --- persistence ---
+    def _files(self):
+        return os.path.join(self.path, "index.bin"), os.path.join(self.path, "items.json")
+
+    def _load(self):
+        index_file, items_file = self._files()
+        if not (os.path.exists(index_file) and os.path.exists(items_file)):
+            return
+        try:
+            with open(items_file, encoding="utf-8") as f:
+                data = json.load(f)
+            self.dim = data["dim"]
+            self.next_label = data["next_label"]
+            self.items = {int(label): item for label, item in data["items"].items()}
+            self.index = self._hnswlib.Index(space="cosine", dim=self.dim)
+            self.index.load_index(index_file, max_elements=max(self.max_items, len(self.items)),
+                                  allow_replace_deleted=True)
+            self.index.set_ef(50)
+            self.labels = {item["key"]: label for label, item in self.items.items()}
+            if len(self.items) > self.max_items:  # the cap was lowered since the last save
+                self._evict(len(self.items) - self.max_items)
+            return
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            print(f"⚠️ Ignoring unreadable test index at {self.path}: {e}")
+            self.items, self.index, self.dim, self.next_label = {}, None, None, 0
+
+    def save(self):
+        with self._lock:
+            if self.index is None:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            index_file, items_file = self._files()
+            self.index.save_index(index_file)
+            tmp = f"{items_file}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "next_label": self.next_label,
+                           "items": {str(label): item for label, item in self.items.items()}}, f)
+            os.replace(tmp, items_file)
+
+    def _new_index(self, dim):
+        index = self._hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(max_elements=self.max_items, ef_construction=200, M=16, allow_replace_deleted=True)
+        index.set_ef(50)
+        return index
+
+    # --- updates ---
+    def add(self, source: str, tests: str, name: str, module_name: str):
+        """Insert (or refresh) the accepted tests of one unit."""
+        vector = self.embed([strip_comments(source)])[0]
+        key = code_key(source)
+        with self._lock:
+            if self.index is None:
+                self.dim = len(vector)
+                self.index = self._new_index(self.dim)
+
+            label = self.labels.get(key)
+            if label is None:
+                if len(self.items) >= self.max_items:
+                    self._evict(len(self.items) - self.max_items + 1)
+                label = self.next_label
+                self.next_label += 1
+                self.index.add_items([vector], [label], replace_deleted=True)
+            self.labels[key] = label
+            self.items[label] = {
+                "key": key, "name": name, "module_name": module_name, "source": source, "tests": tests,
+                "added": time.time(), "used": time.time(),
+            }
+
+    def _evict(self, count: int):
+        for label in sorted(self.items, key=lambda label: self.items[label]["used"])[:count]:
+            self.index.mark_deleted(label)
+            self.labels.pop(self.items.pop(label)["key"], None)
+
+    # --- queries ---
+    def query(self, source: str, k: int = 3):
+        """[(similarity, item)] of the k nearest indexed units, most similar first."""
+        with self._lock:
+            if self.index is None or not self.items:
+                return []
+        vector = self.embed([strip_comments(source)])[0]
+        with self._lock:
+            k = min(k, len(self.items))
+            labels, distances = self.index.knn_query([vector], k=k)
+            matches = []
+            for label, distance in zip(labels[0], distances[0]):
+                item = self.items.get(int(label))
+                if item is not None:
+                    item["used"] = time.time()
+                    matches.append((round(1.0 - float(distance), 4), item))
+            return matches
+
+    def __len__(self):
+        return len(self.items)
+
+
+_shared_indexes = {}
+_shared_lock = threading.Lock()
+
+
+def get_test_index(config: dict):
+    """
+    Process-wide TestIndex for the configured directory, or None when disabled
+    (`test_index`) or when hnswlib / the embedding model aren't available.
+    """
+    if not config.get("test_index", True):
+        return None
+    path = config.get("test_index_dir", ".test_index")
+    with _shared_lock:
+        if path not in _shared_indexes:
+            try:
+                embed = sentence_embedder(config.get("test_index_model", DEFAULT_MODEL))
+                _shared_indexes[path] = TestIndex(path, embed, int(config.get("test_index_max_items", 5000)))
+            except Exception as e:  # ImportError, or the model can't be downloaded
+                print(f"⚠️ Test index disabled: {e}")
+                _shared_indexes[path] = None
+        return _shared_indexes[path]
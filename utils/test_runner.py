@@ -1,41 +1,210 @@
+import importlib.util
+import json
 import tempfile
 import subprocess
 import os
-import uuid
+import threading
+import time
+from contextlib import nullcontext
+from utils.progress import emit, is_listening
+from utils.pytest_plugin import load_coverage, load_results, merge_coverage, summarize
+from utils.tracing import current_span, propagate, traced
 
-def run_pytest(test_code_path: str):
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Optional cap on concurrent pytest processes, shared by every caller in this process
+_run_slots = None
+
+
+def set_max_parallel_runs(limit: int | None):
+    """Limit how many pytest runs may execute at once (None or 0 removes the limit)."""
+    global _run_slots
+    _run_slots = threading.BoundedSemaphore(limit) if limit else None
+
+
+@traced("pytest.run")
+def run_pytest(test_code_path: str, pool=None, timeout: float = 20, coverage_source: str | None = None,
+               test_timeout: float | None = None, select=None, max_failures: int | None = None,
+               coverage_contexts: bool = False, mutants: str | None = None, shuffle_seed: int | None = None):
     """
     Runs pytest on the provided test file and captures output.
+    When a PytestWorkerPool is given, the run happens in one of its warm workers
+    instead of a fresh subprocess. With coverage_source (and the `coverage`
+    package installed), line and branch coverage of that file is measured too;
+    coverage_contexts adds which tests ran each line ("tests_by_line").
+    `mutants` is the manifest of a batch of mutants to run (see MutantRunner in
+    utils.pytest_plugin); test_code_path is then their directory. With
+    shuffle_seed the tests run in an order shuffled with that seed, which also
+    seeds `random` for each test.
+    `select` restricts the run to these top-level tests (names, as for a shard).
+    With test_timeout each test gets that many seconds: a test over the limit is
+    failed, and a test that won't stop takes its process down with it, after
+    which the tests that hadn't run yet are run again in a fresh process.
+    `timeout` bounds each whole process run. With max_failures the run stops
+    once that many tests have failed or errored (pytest's --maxfail).
+    While a progress listener is active, each test's outcome is reported as a
+    "test" event as soon as the test finishes, not when the run does.
     Returns a dictionary with:
         - passed: bool
         - stdout: str
         - stderr: str
+        - tests: list of per-test records from utils.pytest_plugin
+        - summary: outcome counts and total duration
+        - coverage: percent, covered/missing lines and missing branches, or None
     """
     if not os.path.exists(test_code_path):
-        return {"passed": False, "stdout": "", "stderr": f"Test file {test_code_path} not found."}
+        return {"passed": False, "stdout": "", "stderr": f"Test file {test_code_path} not found.",
+                "tests": [], "summary": summarize([]), "coverage": None}
+
+    span = current_span()
+    span.set(test_file=test_code_path, mode="pool" if pool is not None else "subprocess",
+             selected=len(select) if select else None)
+    targets = [f"{test_code_path}::{name}" for name in select] if select else [test_code_path]
+
+    attempts, tests, coverages, done = [], [], [], []
+    failures = 0
+    while True:
+        result, attempt_tests, coverage = _run_once(targets, pool, timeout, coverage_source, test_timeout, done,
+                                                    max_failures - failures if max_failures else None,
+                                                    coverage_contexts, mutants, shuffle_seed)
+        attempts.append(result)
+        for test in attempt_tests:
+            if test.get("timeout") and test_timeout:
+                test["duration"] = test_timeout  # it ran at least this long before being stopped
+        tests.extend(attempt_tests)
+        coverages.append(coverage)
+        failures += sum(t["outcome"] in ("failed", "error") for t in attempt_tests)
+        # Results of tests that finished before a test was killed are kept; the rest run again
+        if not test_timeout or not any(t.get("timeout") for t in attempt_tests):
+            break
+        if max_failures and failures >= max_failures:
+            break
+        done.extend(t["nodeid"] for t in attempt_tests)
+
+    result = {
+        "passed": all(r["passed"] for r in attempts),
+        "stdout": "\n".join(r["stdout"] for r in attempts if r["stdout"]),
+        "stderr": "\n".join(r["stderr"] for r in attempts if r["stderr"]),
+        "tests": tests,
+        "summary": summarize(tests),
+        "coverage": merge_coverage(coverages),
+    }
+    span.set(passed=result["passed"], tests=len(tests), failed=result["summary"]["failed"],
+             errors=result["summary"]["error"], coverage=(result["coverage"] or {}).get("percent"),
+             restarts=len(attempts) - 1)
+    return result
+
+
+def _run_once(targets, pool, timeout, coverage_source, test_timeout, exclude, max_failures=None,
+              coverage_contexts=False, mutants=None, shuffle_seed=None):
+    """One pytest process run: (result, per-test records, coverage record or None)."""
+    fd, results_path = tempfile.mkstemp(prefix="pytestcrew-", suffix=".jsonl")
+    os.close(fd)
+    plugin_args = ["-p", "utils.pytest_plugin", "--pytestcrew-results", results_path]
+    coverage_path = exclude_path = None
+    if coverage_source and importlib.util.find_spec("coverage") is not None:
+        coverage_path = f"{results_path}.cov.json"
+        plugin_args += ["--pytestcrew-cov", coverage_source, "--pytestcrew-cov-report", coverage_path]
+        if coverage_contexts:
+            plugin_args.append("--pytestcrew-cov-contexts")
+    if test_timeout:
+        plugin_args += ["--pytestcrew-timeout", str(test_timeout)]
+    if exclude:
+        exclude_path = f"{results_path}.exclude.json"
+        with open(exclude_path, "w", encoding="utf-8") as f:
+            json.dump(list(exclude), f)
+        plugin_args += ["--pytestcrew-exclude", exclude_path]
+    if max_failures:
+        plugin_args += ["--maxfail", str(max_failures)]
+    if mutants:
+        plugin_args += ["--pytestcrew-mutants", mutants]
+    if shuffle_seed is not None:
+        plugin_args += ["--pytestcrew-shuffle", str(shuffle_seed)]
+    span = current_span()
+
+    reported, stop_tail, tail = set(), threading.Event(), None
+    if is_listening():
+        tail = threading.Thread(target=propagate(_tail_results), args=(results_path, reported, stop_tail),
+                                daemon=True)
+        tail.start()
 
     try:
         # Run pytest quietly (-q)
-        result = subprocess.run(
-            ["pytest", test_code_path, "-q", "--disable-warnings"],
-            capture_output=True,
-            text=True,
-            timeout=20
-        )
-        return {
-            "passed": result.returncode == 0,
-            "stdout": result.stdout,
-            "stderr": result.stderr
-        }
+        queued = time.perf_counter()
+        with _run_slots or nullcontext():
+            span.add("slot_wait", round(time.perf_counter() - queued, 4))
+            if pool is not None:
+                result = pool.run(targets, timeout=timeout, extra_args=plugin_args)
+            else:
+                # The plugin is imported from this repo, whatever directory the tests live in
+                env = dict(os.environ)
+                env["PYTHONPATH"] = os.pathsep.join(p for p in (env.get("PYTHONPATH"), REPO_ROOT) if p)
+                completed = subprocess.run(
+                    ["pytest", *targets, "-q", "--disable-warnings", *plugin_args],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    env=env,
+                )
+                result = {
+                    "passed": completed.returncode == 0,
+                    "stdout": completed.stdout,
+                    "stderr": completed.stderr
+                }
     except subprocess.TimeoutExpired:
-        return {
+        result = {
             "passed": False,
             "stdout": "",
             "stderr": "Timeout expired while running pytest."
         }
     except Exception as e:
-        return {
+        result = {
             "passed": False,
             "stdout": "",
             "stderr": f"Error running pytest: {e}"
         }
+
+    if tail is not None:
+        stop_tail.set()
+        tail.join()
+
+    # Results of tests that finished before a timeout are kept
+    tests = load_results(results_path)
+    for test in tests:
+        if test["nodeid"] not in reported:  # e.g. a test whose process was killed
+            emit("test", **test)
+    os.remove(results_path)
+    coverage = None
+    if coverage_path is not None:
+        coverage = load_coverage(coverage_path, coverage_source)
+        if os.path.exists(coverage_path):
+            os.remove(coverage_path)
+    if exclude_path is not None:
+        os.remove(exclude_path)
+    return result, tests, coverage
+
+
+def _tail_results(path, reported, stop, interval: float = 0.05):
+    """Report each test record appended to a ResultCollector file while its run is in flight."""
+    offset = 0
+    while True:
+        stopping = stop.wait(interval)
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+        except OSError:
+            chunk = b""
+        # Only whole lines: the collector may be halfway through writing the last one
+        lines = chunk[:chunk.rfind(b"\n") + 1]
+        offset += len(lines)
+        for line in lines.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("started"):
+                reported.add(record["nodeid"])
+                emit("test", **record)
+        if stopping:
+            return
@@ -0,0 +1,288 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+_current_span = contextvars.ContextVar("pytestcrew_span", default=None)
+
+
+class Span:
+    """One timed stage. Attributes are free-form (sizes, token counts, cache hits, retries...)."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+        self._lock = threading.Lock()
+
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add(self, key: str, amount=1):
+        """Increment a counter attribute (e.g. retries)."""
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "pid": os.getpid(),
+            "attributes": self.attributes,
+        }
+
+
+class _NullSpan:
+    """Returned when tracing is off, so call sites never need to check."""
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, key: str, amount=1):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished span; safe to share between threads."""
+
+    def __init__(self, path: str = "traces/spans.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OTelExporter:
+    """
+    Mirrors spans into an OpenTelemetry tracer (requires `opentelemetry-sdk`).
+    Each OTel span is started with its parent's OTel span as context when ours
+    starts, so backends show the same stage -> LLM call -> pytest run tree.
+    """
+
+    def __init__(self, service_name: str = "pytestcrew"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self.tracer = trace.get_tracer(service_name)
+        self._open = {}  # span_id -> OTel span, until the span finishes
+        self._lock = threading.Lock()
+
+    def start(self, span: Span):
+        with self._lock:
+            parent = self._open.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self.tracer.start_span(span.name, context=context, start_time=int(span.start * 1e9))
+        otel_span.set_attribute("pytestcrew.span_id", span.span_id)
+        otel_span.set_attribute("pytestcrew.trace_id", span.trace_id)
+        if span.parent_id:
+            otel_span.set_attribute("pytestcrew.parent_id", span.parent_id)
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def export(self, span: Span):
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            self.start(span)
+            with self._lock:
+                otel_span = self._open.pop(span.span_id)
+        otel_span.set_attributes({
+            key: value if isinstance(value, (str, bool, int, float)) else json.dumps(value, default=str)
+            for key, value in span.attributes.items() if value is not None
+        })
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=int(span.start * 1e9) + int((span.duration or 0.0) * 1e9))
+
+
+class Tracer:
+    """
+    Records nested, timed spans for the pipeline stages.
+    The active span is tracked in a context variable, so nesting follows the call
+    stack (and asyncio tasks); use `propagate` to carry it into worker threads.
+    Stages listed in `profile` (or all of them, with True) are also run under
+    cProfile and dumped to `profile_dir/<span name>-<span id>.prof`.
+    """
+
+    def __init__(self, exporter=None, profile=False, profile_dir: str = "traces/profiles"):
+        self.exporter = exporter
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self._profiling = threading.local()
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def _should_profile(self, name: str) -> bool:
+        if not self.profile or getattr(self._profiling, "active", False):
+            return False  # cProfile can't nest within one thread
+        return self.profile is True or name in self.profile
+
+    def span(self, name: str, **attributes):
+        return _SpanContext(self, name, attributes)
+
+    def begin(self, span: Span):
+        """Tell exporters that mirror spans live (OTelExporter) that one started."""
+        start = getattr(self.exporter, "start", None)
+        if start is None:
+            return
+        try:
+            start(span)
+        except Exception as e:
+            print(f"⚠️ Failed to start span {span.name}: {e}")
+
+    def finish(self, span: Span):
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            # Tracing must never break a run
+            print(f"⚠️ Failed to export span {span.name}: {e}")
+
+
+class _SpanContext:
+    def __init__(self, tracer: Tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+        self.profiler = None
+
+    def __enter__(self):
+        if not self.tracer.enabled:
+            return NULL_SPAN
+        parent = _current_span.get()
+        self.span = Span(self.name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None,
+                         self.attributes)
+        self.token = _current_span.set(self.span)
+        self.tracer.begin(self.span)
+
+        if self.tracer._should_profile(self.name):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+                self.tracer._profiling.active = True
+            except ValueError:
+                self.profiler = None  # another profiler is already active
+        self._started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        self.span.duration = time.perf_counter() - self._started
+        if exc is not None:
+            self.span.status = "error"
+            self.span.error = f"{exc_type.__name__}: {exc}"
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.tracer._profiling.active = False
+            os.makedirs(self.tracer.profile_dir, exist_ok=True)
+            path = os.path.join(self.tracer.profile_dir, f"{self.name}-{self.span.span_id}.prof")
+            self.profiler.dump_stats(path)
+            self.span.set(profile=path)
+
+        _current_span.reset(self.token)
+        self.tracer.finish(self.span)
+        return False
+
+
+_tracer = Tracer()
+_tracer_lock = threading.Lock()
+
+
+def configure_tracing(config: dict):
+    """
+    Install the process-wide tracer described by the config:
+    `trace` (off by default), `trace_exporter` ("jsonl" or "otel"), `trace_file`,
+    `trace_profile` (True or a list of span names) and `trace_profile_dir`.
+    """
+    global _tracer
+    with _tracer_lock:
+        if not config.get("trace"):
+            return _tracer
+
+        exporter_name = config.get("trace_exporter", "jsonl")
+        if exporter_name == "otel":
+            try:
+                exporter = OTelExporter()
+            except ImportError:
+                print("⚠️ opentelemetry is not installed; writing spans as JSONL instead.")
+                exporter = JsonlExporter(config.get("trace_file", "traces/spans.jsonl"))
+        else:
+            exporter = JsonlExporter(config.get("trace_file", "traces/spans.jsonl"))
+
+        profile = config.get("trace_profile", False)
+        if isinstance(profile, str):
+            profile = profile.lower() in ("1", "true", "all") or set(filter(None, profile.split(",")))
+        _tracer = Tracer(exporter, profile=profile, profile_dir=config.get("trace_profile_dir", "traces/profiles"))
+        return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Context manager timing a stage on the process-wide tracer."""
+    return _tracer.span(name, **attributes)
+
+
+def current_span():
+    """The innermost active span, or a no-op span when tracing is off."""
+    return _current_span.get() or NULL_SPAN
+
+
+def traced(name: str):
+    """Decorator wrapping every call of a function or method in a span."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn):
+    """Bind fn to the caller's context so spans opened in pool threads nest under the current one."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # A Context can only be entered by one thread at a time, so each call runs in its own copy
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
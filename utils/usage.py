@@ -0,0 +1,53 @@
+import contextlib
+import contextvars
+import threading
+
+_current_meter = contextvars.ContextVar("pytestcrew_usage", default=None)
+
+
+class UsageMeter:
+    """LLM calls and tokens of one run; shared by every thread the run's context is propagated to."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int = 0, response_tokens: int = 0, cache_hit: bool = False,
+               cached_tokens: int = 0):
+        with self._lock:
+            self.calls += 1
+            self.cache_hits += int(cache_hit)
+            self.prompt_tokens += int(prompt_tokens or 0)
+            self.response_tokens += int(response_tokens or 0)
+            self.cached_tokens += int(cached_tokens or 0)
+
+    def to_dict(self):
+        return {"llm_calls": self.calls, "cache_hits": self.cache_hits,
+                "prompt_tokens": self.prompt_tokens, "response_tokens": self.response_tokens,
+                "cached_tokens": self.cached_tokens}
+
+
+@contextlib.contextmanager
+def metering():
+    """Count the LLM usage of everything run inside the block (and in threads given its context)."""
+    meter = UsageMeter()
+    token = _current_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _current_meter.reset(token)
+
+
+def record_llm_call(prompt_tokens: int = 0, response_tokens: int = 0, cache_hit: bool = False,
+                    cached_tokens: int = 0):
+    """
+    Add one LLM call to the current run's meter, if any. cached_tokens is the part
+    of prompt_tokens served from a provider-side context cache.
+    """
+    meter = _current_meter.get()
+    if meter is not None:
+        meter.record(prompt_tokens, response_tokens, cache_hit, cached_tokens)
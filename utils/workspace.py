@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs in one process are still serialized by the thread lock
+    fcntl = None
+
+DEFAULT_ROOT = ".pytestcrew/runs"
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def source_key(source_code: str, module_name: str) -> str:
+    return hashlib.sha256(f"{module_name}\0{source_code}".encode("utf-8")).hexdigest()[:16]
+
+
+class RunWorkspace:
+    """
+    Directory holding what one version of a module's runs produce: the
+    materialized module (so tests can import it), the tests being run and an
+    artifacts/ folder with one JSON record per run. Workspaces are
+    content-addressed (`<module>-<hash of name and source>`), so runs of
+    different code never share these files. What later runs build on (the
+    last accepted tests, their fingerprint manifest and duration history)
+    lives in `state_dir`, keyed by module name only (`<root>/<module>`), so it
+    survives edits to the module. Use it as a context manager: runs of the
+    same workspace are serialized with a lock, runs of different ones proceed
+    in parallel.
+    """
+
+    def __init__(self, path: str, module_name: str = "module_under_test", state_dir: str | None = None):
+        self.path = path
+        self.module_name = module_name
+        self.state_dir = state_dir or path
+        self.key = os.path.basename(os.path.normpath(path))
+        self._lock_file = None
+
+    @classmethod
+    def for_source(cls, source_code: str, module_name: str = "module_under_test", root: str = DEFAULT_ROOT):
+        return cls(os.path.join(root, f"{module_name}-{source_key(source_code, module_name)}"), module_name,
+                   state_dir=os.path.join(root, module_name))
+
+    @property
+    def module_file(self) -> str:
+        return os.path.join(self.path, f"{self.module_name}.py")
+
+    @property
+    def test_prefix(self) -> str:
+        return os.path.join(self.path, f"test_{self.module_name}")
+
+    @property
+    def state_prefix(self) -> str:
+        """Prefix of the accepted tests, manifest and durations that later runs of the module reuse."""
+        return os.path.join(self.state_dir, f"test_{self.module_name}")
+
+    @property
+    def artifacts_dir(self) -> str:
+        return os.path.join(self.path, "artifacts")
+
+    def materialize(self, source_code: str):
+        """Write the module next to its tests so `import <module_name>` works under pytest."""
+        with open(self.module_file, "w", encoding="utf-8") as f:
+            f.write(source_code)
+
+    def save_artifact(self, name: str, data) -> str:
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        path = os.path.join(self.artifacts_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=str)
+        return path
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.abspath(self.path)
+        with _thread_locks_guard:
+            self._thread_lock = _thread_locks.setdefault(path, threading.Lock())
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            # Also excludes runs of the same workspace in other processes
+            self._lock_file = open(os.path.join(self.path, ".lock"), "w")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self._thread_lock.release()
+        return False